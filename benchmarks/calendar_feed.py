@@ -0,0 +1,107 @@
+"""
+calendar.ics: full streamed generation, a conditional 304 poll and a token
+subscription poll (stored body), for a 10k-task feed.
+
+    python -m benchmarks.calendar_feed
+"""
+import time
+from datetime import datetime, timedelta
+from benchmarks.common import benchmark_app, QueryCounter, timed, print_table
+import sqlalchemy as sqla
+from flask import g
+from src import db
+from src.database.models import User, Event, Task, task_assignments
+
+TASK_COUNT = 10_000
+REPEAT = 50
+
+
+class QueryTimer(QueryCounter):
+    """QueryCounter that also sums the time spent inside the DB driver"""
+
+    def __init__(self, engine):
+        super().__init__(engine)
+        self.seconds = 0.0
+        self._started = None
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        super()._on_execute(conn, cursor, statement, parameters, context, executemany)
+        self._started = time.perf_counter()
+
+    def _on_done(self, conn, cursor, statement, parameters, context, executemany):
+        self.seconds += time.perf_counter() - self._started
+
+    def __enter__(self):
+        sqla.event.listen(self.engine, 'after_cursor_execute', self._on_done)
+        return super().__enter__()
+
+    def __exit__(self, *exc):
+        sqla.event.remove(self.engine, 'after_cursor_execute', self._on_done)
+        super().__exit__(*exc)
+
+
+def seed():
+    user = User(username='bench', email='bench@example.com')
+    user.set_password('benchpass')
+    user.verify_email()
+    db.session.add(user)
+    db.session.flush()
+    event = Event(name='Conference', user_id=user.id)
+    db.session.add(event)
+    db.session.flush()
+    start = datetime(2025, 1, 1)
+    db.session.execute(sqla.insert(Task), [
+        {'description': f'Task {i}', 'priority': 1 + i % 3, 'event_id': event.id,
+         'due_date': start + timedelta(hours=i)}
+        for i in range(TASK_COUNT)
+    ])
+    task_ids = db.session.scalars(sqla.select(Task.id)).all()
+    db.session.execute(sqla.insert(task_assignments),
+                       [{'user_id': user.id, 'task_id': task_id} for task_id in task_ids])
+    db.session.commit()
+
+
+def fresh_request_state():
+    """Forget the cached login user and identity map, as a new request would"""
+    g.pop('_login_user', None)
+    db.session.expire_all()
+
+
+def run():
+    rows = []
+    with benchmark_app() as app:
+        seed()
+        client = app.test_client()
+        client.post('/user/login', data={'email': 'bench@example.com', 'password': 'benchpass'})
+
+        fresh_request_state()
+        with QueryTimer(db.engine) as q, timed() as t:
+            response = client.get('/calendar.ics')
+            size = len(response.get_data())
+        etag = response.headers['ETag']
+        rows.append(('full feed', f"{t['ms']:.1f}", q.count, f"{q.seconds * 1000:.2f}", f'{size} bytes'))
+
+        with QueryTimer(db.engine) as q, timed() as t:
+            for _ in range(REPEAT):
+                fresh_request_state()
+                response = client.get('/calendar.ics', headers={'If-None-Match': etag})
+                assert response.status_code == 304
+        rows.append(('304 poll', f"{t['ms'] / REPEAT:.2f}", q.count / REPEAT,
+                     f"{q.seconds * 1000 / REPEAT:.3f}", ''))
+
+        # Subscription URL: stored body, no session and no load_user
+        url = client.get('/calendar/subscription').get_json()['url']
+        client.get('/user/logout')
+        client.get(url)  # first poll renders and stores the body
+        fresh_request_state()
+        with QueryTimer(db.engine) as q, timed() as t:
+            for _ in range(REPEAT):
+                response = client.get(url)
+                assert response.status_code == 200
+        rows.append(('token poll', f"{t['ms'] / REPEAT:.2f}", q.count / REPEAT,
+                     f"{q.seconds * 1000 / REPEAT:.3f}", f'{len(response.get_data())} bytes'))
+    print_table(['request', 'ms/request', 'queries', 'db ms', 'size'], rows)
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,77 @@
+"""
+BLIP execution modes: load/warm-up cost, per-image latency and how often the
+captions agree with the fp32 beam-search reference.
+
+The image set is the sample uploads under src/static (or the directory given
+as the first argument). Needs transformers + torch and the model weights.
+
+    python -m benchmarks.caption_modes [image_dir]
+"""
+import os
+import statistics
+import sys
+from PIL import Image
+from benchmarks.common import timed, print_table
+from config import Config
+from src.captioning import MAX_IMAGE_SIZE, load_blip_captioner
+
+# (mode, num_beams); the first entry is the reference
+CONFIGURATIONS = [
+    ('fp32', 5),
+    ('fp32', 1),
+    ('int8', 5),
+    ('int8', 1),
+    ('compile', 5),
+    ('compile', 1),
+]
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def load_images(directories):
+    images = []
+    for directory in directories:
+        for name in sorted(os.listdir(directory)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                image = Image.open(os.path.join(directory, name)).convert('RGB')
+                image.thumbnail(MAX_IMAGE_SIZE, Image.Resampling.LANCZOS)
+                images.append(image)
+    return images
+
+
+def token_overlap(a, b):
+    a, b = set(a.split()), set(b.split())
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+
+def run(directories):
+    images = load_images(directories)
+    if not images:
+        sys.exit("No images found")
+    rows, reference = [], None
+    for mode, num_beams in CONFIGURATIONS:
+        settings = {'mode': mode, 'num_beams': num_beams, 'warmup': False}
+        with timed() as load:
+            caption_batch = load_blip_captioner(settings)
+        with timed() as warmup:
+            caption_batch(images[:1])
+        latencies, captions = [], []
+        for image in images:
+            with timed() as t:
+                captions.extend(caption_batch([image]))
+            latencies.append(t['ms'])
+        if reference is None:
+            reference = captions
+        exact = sum(c == r for c, r in zip(captions, reference)) / len(images)
+        overlap = statistics.mean(token_overlap(c, r) for c, r in zip(captions, reference))
+        rows.append((mode, 'greedy' if num_beams == 1 else f'beam {num_beams}',
+                     f"{load['ms']:.0f}", f"{warmup['ms']:.0f}",
+                     f"{statistics.mean(latencies):.0f}", f"{max(latencies):.0f}",
+                     f"{exact:.0%}", f"{overlap:.2f}"))
+    print(f"{len(images)} images")
+    print_table(['mode', 'decoding', 'load ms', 'warm-up ms', 'mean ms', 'max ms',
+                 'exact match', 'token overlap'], rows)
+
+
+if __name__ == '__main__':
+    default_dirs = [os.path.join(Config.STATIC_FOLDER, d) for d in ('task_images', 'profile_pics')]
+    run(sys.argv[1:] or default_dirs)
@@ -0,0 +1,48 @@
+"""
+BLIP captioning throughput: one image per generate call vs. batched calls.
+
+Each run pushes IMAGES_PER_RUN images through a single worker process from
+1, 4 and 16 concurrent clients. Needs the real model (transformers + torch);
+the first run also downloads the weights.
+
+    python -m benchmarks.caption_throughput
+"""
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from benchmarks.common import timed, print_table
+from src.captioning import MAX_IMAGE_SIZE, CaptionService, CaptionUnavailable
+
+CONCURRENCY = [1, 4, 16]
+IMAGES_PER_RUN = 32
+BATCH_SIZES = [1, 8, 16]
+
+
+def sample_images(n):
+    """Distinct solid-colour images at the size the route sends"""
+    return [Image.new('RGB', MAX_IMAGE_SIZE, ((i * 37) % 256, (i * 91) % 256, (i * 53) % 256))
+            for i in range(n)]
+
+
+def run():
+    images = sample_images(IMAGES_PER_RUN)
+    rows = []
+    for max_batch_size in BATCH_SIZES:
+        service = CaptionService(processes=1, max_batch_size=max_batch_size, max_wait=0.02).start()
+        try:
+            # Load the model before timing anything
+            service.caption(images[0], timeout=600)
+            for clients in CONCURRENCY:
+                with ThreadPoolExecutor(max_workers=clients) as pool, timed() as t:
+                    list(pool.map(lambda image: service.caption(image, timeout=600), images))
+                rows.append((clients, max_batch_size, f"{t['ms']:.0f}",
+                             f"{IMAGES_PER_RUN / (t['ms'] / 1000):.2f}"))
+        except CaptionUnavailable as e:
+            sys.exit(f"Captioning model unavailable: {e}")
+        finally:
+            service.close()
+    print_table(['clients', 'max batch', 'ms', 'images/s'], rows)
+
+
+if __name__ == '__main__':
+    run()
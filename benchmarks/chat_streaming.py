@@ -0,0 +1,76 @@
+"""
+Streamed vs. blocking checklist generation against the fixture LLM stub:
+time until the client sees the first text or the first saved task, and
+until the response is complete. The prompt cache is disabled so every
+request reaches the model.
+
+    python -m benchmarks.chat_streaming [requests_per_path]
+"""
+import statistics
+import sys
+import time
+from benchmarks.common import BenchmarkConfig, benchmark_app, print_table
+from src import db
+from src.database.models import User, Event
+
+REQUESTS = 5
+STREAM = {'Accept': 'text/event-stream'}
+
+
+class StubConfig(BenchmarkConfig):
+    LLM_BACKEND = 'stub'
+    PROMPT_CACHE_TTL = 0
+
+
+def seed():
+    user = User(username='bench', email='bench@example.com')
+    user.set_password('benchpass')
+    user.verify_email()
+    db.session.add(user)
+    db.session.flush()
+    event = Event(name='Road trip', user_id=user.id)
+    db.session.add(event)
+    db.session.commit()
+    return event.id
+
+
+def timed_post(client, url, payload, headers=None):
+    """Milliseconds until the first response body chunk and until the last"""
+    start = time.perf_counter()
+    response = client.post(url, json=payload, headers=headers, buffered=False)
+    first = None
+    for _ in response.response:
+        if first is None:
+            first = time.perf_counter()
+    end = time.perf_counter()
+    response.close()
+    return (first or end) - start, end - start
+
+
+def run():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else REQUESTS
+    rows = []
+    with benchmark_app(StubConfig) as app:
+        event_id = seed()
+        client = app.test_client()
+        paths = [
+            ('chat (guest, text)', '/chatbot_router/chat', lambda i: {'message': f'a road trip for {i + 2}'}),
+            ('chat (user, JSON)', '/chatbot_router/chat',
+             lambda i: {'message': f'a road trip for {i + 2}', 'event_id': event_id}),
+            ('create_event_and_tasks (checklist)', '/chatbot_router/create_event_and_tasks',
+             lambda i: {'userInput': 'safety', 'event_id': event_id, 'question_index': 2,
+                        'conversation_history': [f'User: a road trip for {i + 2}', 'Bot: Who is coming?']}),
+        ]
+        for label, url, payload in paths:
+            if label != 'chat (guest, text)':
+                client.post('/user/login', data={'email': 'bench@example.com', 'password': 'benchpass'})
+            for mode, headers in (('blocking', None), ('streamed', STREAM)):
+                timings = [timed_post(client, url, payload(i), headers) for i in range(requests)]
+                first = statistics.median(t[0] for t in timings) * 1000
+                total = statistics.median(t[1] for t in timings) * 1000
+                rows.append((label, mode, requests, f'{first:.0f} ms', f'{total:.0f} ms'))
+    print_table(['path', 'mode', 'requests', 'p50 first result', 'p50 complete'], rows)
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,74 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Run a benchmark from the project root, e.g. ``python -m benchmarks.dashboard_queries``.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+
+import sqlalchemy as sqla
+from config import Config
+from src import create_app, db
+
+
+class BenchmarkConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SECRET_KEY = 'benchmark-secret-key'
+    # In-memory SQLite is a single shared connection; rebuild feeds inline instead
+    CALENDAR_FEED_PRECOMPUTE = False
+    # One process, and no entries left on disk between runs
+    CACHE_BACKEND = 'memory'
+    WTF_CSRF_ENABLED = False
+    TESTING = True
+    MAIL_SUPPRESS_SEND = True
+
+
+@contextmanager
+def benchmark_app(config_class=BenchmarkConfig):
+    """Yield an app with a fresh database and a pushed app context"""
+    app = create_app(config_class)
+    with app.app_context():
+        db.create_all()
+        try:
+            yield app
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+class QueryCounter:
+    """Count SQL statements sent through the engine while active"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        sqla.event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        sqla.event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+@contextmanager
+def timed():
+    """Measure wall clock time in milliseconds; read ``result['ms']`` after the block"""
+    result = {}
+    start = time.perf_counter()
+    yield result
+    result['ms'] = (time.perf_counter() - start) * 1000
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    print('  '.join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    print('  '.join('-' * w for w in widths))
+    for row in rows:
+        print('  '.join(str(c).ljust(w) for c, w in zip(row, widths)))
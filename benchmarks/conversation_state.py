@@ -0,0 +1,129 @@
+"""
+create_event_and_tasks: request size and prompt tokens per turn with the
+conversation kept server-side, against the old protocol where the client
+sent the whole history back and it was pasted into the prompt as a Python
+list. Old prompts are rebuilt from the previous templates below; tokens are
+estimated as in src.database.conversations.
+
+Profiles: short typed answers, long dictated answers, and the dictated
+answers again with a 300-token transcript budget to show compaction.
+
+    python -m benchmarks.conversation_state
+"""
+import json
+from benchmarks.common import BenchmarkConfig, benchmark_app, print_table
+from src import db
+from src.database.conversations import estimate_tokens
+from src.database.models import User, Event
+
+EVENT_NAME = 'Ski weekend'
+TYPED = ['a ski weekend in the Alps', 'six friends, two of them beginners', 'safety']
+DICTATED = [
+    "so we're planning a ski weekend in the Alps in late January, we'll drive up on Friday evening "
+    "and stay in a rented chalet near the slopes until Sunday afternoon, and we want to cook most "
+    "meals ourselves because the restaurants up there are really expensive " * 2,
+    "there will be six of us, four who ski every year and two complete beginners who will need "
+    "lessons and rental gear, one person is vegetarian and someone is bringing their dog, and we "
+    "only have two cars so we have to be careful about how much luggage everyone brings " * 2,
+    "I think safety matters most, especially for the beginners, then keeping costs down, and after "
+    "that having fun in the evenings with games and a big dinner on Saturday " * 2,
+]
+
+
+class StubConfig(BenchmarkConfig):
+    LLM_BACKEND = 'stub'
+
+
+class SmallBudgetConfig(StubConfig):
+    CONVERSATION_TOKEN_BUDGET = 300
+
+
+def legacy_prompt(history, question_index, user_input):
+    """The prompts create_event_and_tasks built before conversations were stored server-side"""
+    if not history:
+        return f"""
+        Based on the following event description: "{user_input}", ask ONE clarifying question that will help create a more specific checklist.
+        Do not ask about things already mentioned in "{user_input}".
+        Return ONLY the question.
+        """
+    if question_index < 2:
+        return f"""
+        Based on the following conversation:
+        {history}
+        Ask the user what aspect of the event they want to prioritize most (e.g., fun, efficiency, preparation, safety, etc...).\
+        Create the list of aspect based on their event, not the template. You can guess with "{EVENT_NAME}".
+        Format your response with just the question and a short list of example options. 
+        Format the list into just a normal list, not a markdown list.
+        Do not ask about things already mentioned in the chat: {history}
+        """
+    return f"""
+        Based on the following conversation:
+        {history}
+        Generate a JSON checklist with at least 8 pre-event tasks related to the event "{EVENT_NAME}".
+        Use the priorities expressed in the second question to set 'priority' (1: important, 2: necessary, 3: normal).
+        Each task should include:
+        - 'task': the description of the task.
+        - 'priority': based on how relevant it is to the user's stated priorities.
+        - 'item': the physical item involved. For example:
+            - If the task is "Bring guitar", item = "guitar"
+            - If the task is "Book hotel", item = "none"
+            - Remember the item just be 1 item, not a list of items.
+        
+        Return ONLY the JSON. No explanations. No markdown. Just pure JSON like:
+        [
+            {{"task": "Book hotel", "priority": 1, "item": "none"}},
+            {{"task": "Pack sunscreen", "priority": 2, "item": "sunscreen"}},
+            {{"task": "Buy snacks", "priority": 3, "item": "snacks"}}
+        ]
+        """
+
+
+def run_profile(config, answers):
+    rows = []
+    with benchmark_app(config) as app:
+        user = User(username='bench', email='bench@example.com')
+        user.set_password('benchpass')
+        user.verify_email()
+        db.session.add(user)
+        db.session.flush()
+        event = Event(name=EVENT_NAME, user_id=user.id)
+        db.session.add(event)
+        db.session.commit()
+
+        backend = app.extensions['llm'].backend
+        backend.sleep = lambda seconds: None
+        prompts = []
+        generate = backend.generate
+        backend.generate = lambda prompt, timeout: prompts.append(prompt) or generate(prompt, timeout)
+
+        client = app.test_client()
+        client.post('/user/login', data={'email': 'bench@example.com', 'password': 'benchpass'})
+        history, conversation_id = [], None
+        for turn, answer in enumerate(answers):
+            old_body = {'event_id': event.id, 'userInput': answer, 'question_index': turn}
+            if history:
+                old_body['conversation_history'] = history
+            new_body = {'event_id': event.id, 'userInput': answer, 'conversation_id': conversation_id}
+            data = client.post('/chatbot_router/create_event_and_tasks', json=new_body).get_json()
+            old_tokens = estimate_tokens(legacy_prompt(history, turn, answer))
+            new_tokens = estimate_tokens(prompts[-1])
+            rows.append((turn + 1, len(json.dumps(old_body)), len(json.dumps(new_body)),
+                         old_tokens, new_tokens, f'{1 - new_tokens / old_tokens:.0%}'))
+            if 'question' in data:
+                history = history + [f"User: {answer}", f"Bot: {data['question']}"]
+                conversation_id = data['conversation_id']
+    return rows
+
+
+def run():
+    rows = []
+    for label, config, answers in (('typed', StubConfig, TYPED),
+                                   ('dictated', StubConfig, DICTATED),
+                                   ('dictated, 300-token budget', SmallBudgetConfig, DICTATED)):
+        rows += [(label, *row) for row in run_profile(config, answers)]
+    print_table(['profile', 'turn', 'old request B', 'new request B', 'old prompt tok', 'new prompt tok',
+                 'prompt saved'], rows)
+
+
+if __name__ == '__main__':
+    run()
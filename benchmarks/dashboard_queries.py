@@ -0,0 +1,64 @@
+"""
+Dashboard progress: per-event lazy loading vs. the single summary query.
+
+    python -m benchmarks.dashboard_queries
+"""
+from datetime import datetime, timedelta
+from benchmarks.common import benchmark_app, QueryCounter, timed, print_table
+import sqlalchemy as sqla
+from src import db
+from src.database.models import User, Event, Task, event_participants
+from src.database.queries import dashboard_event_summaries
+
+EVENT_COUNTS = [10, 100, 300, 1000]
+TASKS_PER_EVENT = 20
+
+
+def seed(user, n_events):
+    start = datetime(2025, 1, 1)
+    events = [Event(name=f'Event {i}', date=start + timedelta(days=i), user_id=user.id)
+              for i in range(n_events)]
+    db.session.add_all(events)
+    db.session.flush()
+    db.session.add_all(
+        Task(description=f'Task {j}', priority=3, completed=j % 2 == 0, event_id=e.id)
+        for e in events for j in range(TASKS_PER_EVENT)
+    )
+    db.session.commit()
+
+
+def legacy_dashboard(user_id):
+    """The pre-aggregation implementation of main.index"""
+    user_events = db.session.scalars(
+        sqla.select(Event).where(Event.user_id == user_id).order_by(Event.date.asc())).all()
+    shared_events = db.session.scalars(
+        sqla.select(Event).join(event_participants)
+        .where(event_participants.c.user_id == user_id).order_by(Event.date.asc())).all()
+    all_events = {event.id: event for event in user_events + shared_events}.values()
+    for event in all_events:
+        total_tasks = len(event.tasks)
+        completed_tasks = len([task for task in event.tasks if task.completed])
+        event.progress = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
+    return list(all_events)
+
+
+def run():
+    rows = []
+    for n_events in EVENT_COUNTS:
+        with benchmark_app():
+            user = User(username='bench', email='bench@example.com')
+            db.session.add(user)
+            db.session.commit()
+            seed(user, n_events)
+            user_id = user.id
+
+            for label, fn in (('legacy', legacy_dashboard), ('summary', dashboard_event_summaries)):
+                db.session.expire_all()
+                with QueryCounter(db.engine) as counter, timed() as t:
+                    fn(user_id)
+                rows.append((n_events, label, counter.count, f"{t['ms']:.1f}"))
+    print_table(['events', 'path', 'queries', 'ms'], rows)
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,103 @@
+"""
+Dashboard paging: OFFSET vs. keyset on (date, id), for small and large accounts,
+with and without many other users' events in the same table.
+
+'keyset (OR)' is the earlier single query that filtered ``owner OR
+participant`` along ix_event_date_id; it has to step over other users'
+events until it finds a page. 'keyset (UNION)' is event_summaries_page,
+which reads the user's owned and shared events separately.
+
+    python -m benchmarks.event_pagination
+"""
+from datetime import datetime, timedelta
+from benchmarks.common import benchmark_app, timed, print_table
+import sqlalchemy as sqla
+from src import db
+from src.database.models import User, Event, event_participants
+from src.database.queries import (
+    _summary_query, decode_cursor, encode_cursor, event_progress, event_summaries_page, visible_to,
+)
+
+# (the user's own events, other users' events)
+PROFILES = [(20, 0), (20, 50000), (2000, 0), (2000, 50000)]
+OTHER_USERS = 500
+# Other users' events the benchmarked user participates in
+SHARED_EVENTS = 20
+PAGE_SIZE = 20
+REPEAT = 20
+
+
+def seed(user_id, n_events, other_ids, n_other):
+    start = datetime(2020, 1, 1)
+    db.session.execute(sqla.insert(Event), [
+        {'name': f'Event {i}', 'date': start + timedelta(hours=i), 'user_id': user_id}
+        for i in range(n_events)
+    ])
+    # Other users' events are spread over the same dates, so they interleave with the user's
+    if n_other:
+        db.session.execute(sqla.insert(Event), [
+            {'name': f'Other {i}', 'date': start + timedelta(hours=i * n_events / n_other),
+             'user_id': other_ids[i % len(other_ids)]}
+            for i in range(n_other)
+        ])
+    shared_ids = db.session.scalars(
+        sqla.select(Event.id).where(Event.user_id != user_id).order_by(Event.id)).all()
+    shared_ids = shared_ids[::max(len(shared_ids) // SHARED_EVENTS, 1)][:SHARED_EVENTS]
+    if shared_ids:
+        db.session.execute(sqla.insert(event_participants),
+                           [{'user_id': user_id, 'event_id': event_id} for event_id in shared_ids])
+    db.session.commit()
+
+
+def offset_page(user_id, offset):
+    return db.session.execute(_summary_query(user_id).offset(offset).limit(PAGE_SIZE)).all()
+
+
+def or_keyset_page(user_id, cursor):
+    query = (
+        sqla.select(Event.id, Event.name, Event.date, Event.task_count, Event.completed_count,
+                    event_progress().label('progress'))
+        .where(visible_to(user_id))
+        .order_by(Event.date.asc(), Event.id.asc())
+    )
+    if cursor:
+        query = query.where(sqla.tuple_(Event.date, Event.id) > decode_cursor(cursor))
+    return db.session.execute(query.limit(PAGE_SIZE + 1)).all()
+
+
+def run():
+    rows = []
+    for n_events, n_other in PROFILES:
+        with benchmark_app():
+            user = User(username='bench', email='bench@example.com')
+            others = [User(username=f'other{i}', email=f'other{i}@example.com') for i in range(OTHER_USERS)]
+            db.session.add_all([user] + others)
+            db.session.commit()
+            user_id = user.id
+            seed(user_id, n_events, [other.id for other in others], n_other)
+            visible = len(db.session.execute(_summary_query(user_id)).all())
+
+            # Cursor for the last page, as a client would hold after paging through
+            last_offset = max(0, visible - PAGE_SIZE)
+            before_last = offset_page(user_id, last_offset - 1)[0] if last_offset else None
+            cursor = encode_cursor(before_last) if before_last else None
+            assert ([row.id for row in or_keyset_page(user_id, cursor)][:PAGE_SIZE]
+                    == [row.id for row in event_summaries_page(user_id, PAGE_SIZE, cursor)[0]])
+
+            timings = []
+            for fn in (lambda: offset_page(user_id, last_offset),
+                       lambda: or_keyset_page(user_id, None),
+                       lambda: or_keyset_page(user_id, cursor),
+                       lambda: event_summaries_page(user_id, PAGE_SIZE),
+                       lambda: event_summaries_page(user_id, PAGE_SIZE, cursor)):
+                with timed() as t:
+                    for _ in range(REPEAT):
+                        fn()
+                timings.append(f"{t['ms'] / REPEAT:.2f}")
+            rows.append((n_events, n_other, visible, *timings))
+    print_table(['own', 'others', 'visible', 'offset last ms', 'OR first ms', 'OR last ms',
+                 'UNION first ms', 'UNION last ms'], rows)
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,80 @@
+"""
+Saving an LLM-generated checklist: the old per-object ORM adds against the
+shared ingestion stage (extract_json_array + insert_generated_tasks).
+
+The answer is a fenced JSON array of tasks with priorities and items, as
+the create_event_and_tasks prompt asks for. It has no due dates: the old
+path passed them to the DateTime column as strings, which SQLite rejects.
+Both paths parse the text, write every task and commit; the statement
+count includes the Event counter UPDATE and the calendar bookkeeping.
+
+    python -m benchmarks.generated_tasks
+"""
+import json
+import re
+from benchmarks.common import benchmark_app, QueryCounter, timed, print_table
+from src import db
+from src.database.models import User, Event, Task
+from src.database.tasks import insert_generated_tasks
+from src.streaming import extract_json_array
+
+TASK_COUNTS = [10, 100, 500, 1000]
+REPEATS = 3
+
+
+def answer(n_tasks):
+    tasks = [{"task": f"Task {i}", "priority": i % 3 + 1, "item": f"item {i}" if i % 2 else "none"}
+             for i in range(n_tasks)]
+    return f"```json\n{json.dumps(tasks, indent=2)}\n```"
+
+
+def seed():
+    user = User(username='bench', email='bench@example.com')
+    db.session.add(user)
+    db.session.flush()
+    event = Event(name='Bench', user_id=user.id)
+    db.session.add(event)
+    db.session.commit()
+    return event.id
+
+
+def legacy_save(event_id, response_text):
+    """create_event_and_tasks before the shared ingestion stage"""
+    json_match = re.search(r"```json\s*([\s\S]*?)\s*```", response_text)
+    if json_match:
+        response_text = json_match.group(1).strip()
+    for task_data in json.loads(response_text):
+        db.session.add(Task(
+            description=task_data.get('task', 'No description provided'),
+            priority=task_data.get('priority', 3),
+            due_date=task_data.get('due_date', None),
+            item=task_data.get('item', None),
+            event_id=event_id
+        ))
+    db.session.commit()
+
+
+def bulk_save(event_id, response_text):
+    insert_generated_tasks(event_id, extract_json_array(response_text))
+    db.session.commit()
+
+
+def run():
+    rows = []
+    for n_tasks in TASK_COUNTS:
+        text = answer(n_tasks)
+        for label, fn in (('orm', legacy_save), ('bulk', bulk_save)):
+            timings = []
+            for _ in range(REPEATS):
+                with benchmark_app():
+                    event_id = seed()
+                    with QueryCounter(db.engine) as counter, timed() as t:
+                        fn(event_id, text)
+                    timings.append(t['ms'])
+                    assert db.session.get(Event, event_id).task_count == n_tasks
+            rows.append((n_tasks, label, counter.count, f"{min(timings):.1f}"))
+    print_table(['tasks', 'path', 'statements', 'best ms'], rows)
+
+
+if __name__ == '__main__':
+    run()
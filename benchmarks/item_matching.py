@@ -0,0 +1,87 @@
+"""
+Local item/caption matcher: how many verifications it settles without
+Gemini, how often those answers agree with the expected verdict, and the
+latency that saves.
+
+The pairs are BLIP-style captions labelled with the lenient answer the
+Gemini prompt asks for. Saved latency is (settled calls) x the Gemini
+round trip, given in milliseconds as the first argument (default 700, a
+typical gemini-1.5-flash call from this app's region).
+
+    python -m benchmarks.item_matching [gemini_ms]
+"""
+import sys
+from benchmarks.common import timed, print_table
+from src.item_matching import ItemMatcher
+
+PAIRS = [
+    ('cup', 'a mug on a wooden table', True),
+    ('cup', 'a white coffee cup on a saucer', True),
+    ('cup', 'a glass of water on a table', True),
+    ('cup', 'a dog sitting on a couch', False),
+    ('mug', 'a cup of tea next to a laptop', True),
+    ('car', 'a parking lot with cars', True),
+    ('car', 'a red sedan parked on the street', True),
+    ('car', 'a bicycle leaning against a wall', False),
+    ('bike', 'a man riding a bicycle down a road', True),
+    ('laptop', 'a person using a laptop computer on a desk', True),
+    ('laptop', 'a plate of food on a table', False),
+    ('phone', 'a woman holding a cell phone', True),
+    ('phone', 'a smartphone on a desk', True),
+    ('phone', 'a cat sleeping on a bed', False),
+    ('book', 'a stack of books on a shelf', True),
+    ('book', 'a pen and a notebook on a desk', False),
+    ('notebook', 'a notepad and a pencil', True),
+    ('water bottle', 'a bottle on a desk', True),
+    ('water bottle', 'a pair of shoes on the floor', False),
+    ('backpack', 'a boy wearing a backpack', True),
+    ('backpack', 'a suitcase in a hotel room', False),
+    ('umbrella', 'a man holding an umbrella in the rain', True),
+    ('umbrella', 'a man riding a skateboard', False),
+    ('fruit', 'a bowl of apples and bananas', True),
+    ('apple', 'a bowl of fruit on a counter', True),
+    ('apple', 'a slice of pizza on a plate', False),
+    ('sandwich', 'a sandwich cut in half', True),
+    ('cake', 'a birthday cake with candles', True),
+    ('flowers', 'a bouquet of roses in a vase', True),
+    ('plant', 'a potted plant on a window sill', True),
+    ('keys', 'a set of keys on a table', True),
+    ('wallet', 'a brown leather wallet', True),
+    ('wallet', 'a watch on a wrist', False),
+    ('shoes', 'a pair of sneakers on the grass', True),
+    ('jacket', 'a man wearing a coat in the snow', True),
+    ('hat', 'a girl wearing a cap', True),
+    ('ball', 'a soccer ball on a field', True),
+    ('chair', 'a stool in a kitchen', True),
+    ('chair', 'a sofa in a living room', False),
+    ('stapler', 'a stapler on a desk', True),
+    ('stapler', 'a pile of papers and a pen', False),
+    ('tent', 'a tent in a campground', True),
+    ('tent', 'a group of people at a campsite', True),
+    ('sunscreen', 'a bottle of lotion on a beach towel', True),
+]
+
+
+def run():
+    gemini_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 700.0
+    matcher = ItemMatcher()
+    with timed() as t:
+        decisions = [matcher.match(item, caption) for item, caption, _ in PAIRS]
+    settled = [(decision, expected) for decision, (_, _, expected) in zip(decisions, PAIRS)
+               if decision is not None]
+    correct = sum(decision == expected for decision, expected in settled)
+    rows = [
+        ('pairs', len(PAIRS)),
+        ('settled locally (yes / no)', f"{len(settled)} ({matcher.stats['yes']} / {matcher.stats['no']})"),
+        ('escalation rate', f'{matcher.escalation_rate():.0%}'),
+        ('local answers correct', f'{correct}/{len(settled)}'),
+        ('local time per pair', f"{t['ms'] * 1000 / len(PAIRS):.0f} us"),
+        ('Gemini time without matcher', f'{len(PAIRS) * gemini_ms / 1000:.1f} s'),
+        ('Gemini time with matcher', f"{matcher.stats['escalated'] * gemini_ms / 1000:.1f} s"),
+        ('mean latency saved per verification', f'{len(settled) * gemini_ms / len(PAIRS):.0f} ms'),
+    ]
+    print_table(['metric', 'value'], rows)
+
+
+if __name__ == '__main__':
+    run()
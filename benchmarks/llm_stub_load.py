@@ -0,0 +1,110 @@
+"""
+Offline load test of the LLM-backed routes against the fixture stub
+(LLM_BACKEND='stub', benchmarks/fixtures/llm_stub.json): guest and user
+chat, the three-step create_event_and_tasks conversation and photo
+verification of an ambiguous item. The stub's latency is seeded by the
+prompt, so two runs send the same prompts, get the same answers and
+report the same LLM time; only the app's own overhead varies.
+
+    python -m benchmarks.llm_stub_load [requests_per_scenario]
+"""
+import statistics
+import sys
+import time
+from io import BytesIO
+from PIL import Image
+from benchmarks.common import BenchmarkConfig, benchmark_app, timed, print_table
+from src import db
+from src.database.models import User, Event, Task
+from src.database.verification_cache import image_digest, store_caption
+
+REQUESTS = 5
+
+
+class StubConfig(BenchmarkConfig):
+    LLM_BACKEND = 'stub'
+
+
+def seed():
+    user = User(username='bench', email='bench@example.com')
+    user.set_password('benchpass')
+    user.verify_email()
+    db.session.add(user)
+    db.session.flush()
+    event = Event(name='Beach trip', user_id=user.id)
+    db.session.add(event)
+    db.session.commit()
+    return event.id
+
+
+def guest_chat(client, i):
+    client.get('/user/logout')
+    return client.post('/chatbot_router/chat', json={'message': f'a beach trip for {i + 2} people'})
+
+
+def user_chat(client, i, event_id):
+    return client.post('/chatbot_router/chat',
+                       json={'message': f'a beach trip for {i + 2} people', 'event_id': event_id})
+
+
+def create_event_and_tasks(client, i, event_id):
+    url = '/chatbot_router/create_event_and_tasks'
+    history = []
+    for step, answer in enumerate([f'a beach trip for {i + 2} people', 'outdoors', 'safety']):
+        response = client.post(url, json={'userInput': answer, 'event_id': event_id,
+                                          'conversation_history': history, 'question_index': step})
+        history = history + [{'user': answer, 'bot': response.get_json().get('response')}]
+    return response
+
+
+def verify_photo(client, i, task_id):
+    # A fresh photo and caption each time so neither cache answers; 'cup' vs a glass needs the LLM
+    photo = BytesIO()
+    Image.new('RGB', (64, 48), (i, 100, 200)).save(photo, 'PNG')
+    store_caption(image_digest(photo.getvalue()), f'a glass of water on a table in room {i}')
+    db.session.commit()
+    photo.seek(0)
+    # An extension outside ALLOWED_EXTENSIONS: verified but not saved under static/
+    return client.post(f'/task_router/complete_task_with_image/{task_id}',
+                       data={'file': (photo, 'photo.bin')})
+
+
+def run():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else REQUESTS
+    rows = []
+    with benchmark_app(StubConfig) as app:
+        event_id = seed()
+        task = Task(description='Bring cups', priority=2, event_id=event_id, item='cup')
+        db.session.add(task)
+        db.session.commit()
+        client = app.test_client()
+        stub = app.extensions['llm'].backend
+        scenarios = [
+            ('chat (guest, text)', guest_chat, ()),
+            ('chat (user, JSON)', user_chat, (event_id,)),
+            ('create_event_and_tasks x3', create_event_and_tasks, (event_id,)),
+            ('verify photo (escalated)', verify_photo, (task.id,)),
+        ]
+        for label, scenario, args in scenarios:
+            if label != 'chat (guest, text)':
+                client.post('/user/login', data={'email': 'bench@example.com', 'password': 'benchpass'})
+            slept = []
+            stub.sleep = lambda seconds: (slept.append(seconds), time.sleep(seconds))
+            calls_before = app.extensions['llm'].calls
+            latencies = []
+            for i in range(requests):
+                with timed() as t:
+                    response = scenario(client, i, *args)
+                assert response.status_code in (200, 400), response.get_data(as_text=True)
+                latencies.append(t['ms'])
+            latencies.sort()
+            p95 = latencies[min(len(latencies) - 1, int(round(0.95 * (len(latencies) - 1))))]
+            rows.append((label, requests, app.extensions['llm'].calls - calls_before,
+                         f'{statistics.median(latencies):.0f} ms', f'{p95:.0f} ms',
+                         f'{sum(slept) * 1000 / requests:.0f} ms',
+                         f'{(sum(latencies) - sum(slept) * 1000) / requests:.1f} ms'))
+    print_table(['scenario', 'requests', 'LLM calls', 'p50', 'p95', 'LLM time/req', 'app time/req'], rows)
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,75 @@
+"""
+Prompt cache on chatbot_router.chat: latency of popular checklist requests
+with the cache disabled and enabled, against the fixture LLM stub.
+
+Requests cycle through a few popular events, typed with varying case and
+spacing, on both the guest (plain text) and logged-in (JSON) paths.
+
+    python -m benchmarks.prompt_cache [requests_per_path]
+"""
+import statistics
+import sys
+from benchmarks.common import BenchmarkConfig, benchmark_app, timed, print_table
+from src import db
+from src.database.models import User, Event
+
+REQUESTS = 12
+POPULAR = ['camping trip', 'Birthday party', 'beach  trip', 'WEDDING']
+
+
+class StubConfig(BenchmarkConfig):
+    LLM_BACKEND = 'stub'
+
+
+class NoPromptCacheConfig(StubConfig):
+    PROMPT_CACHE_TTL = 0
+
+
+def message(i):
+    text = POPULAR[i % len(POPULAR)]
+    return text.upper() if i % 3 == 1 else f'  {text.lower()} '
+
+
+def seed():
+    user = User(username='bench', email='bench@example.com')
+    user.set_password('benchpass')
+    user.verify_email()
+    db.session.add(user)
+    db.session.flush()
+    event = Event(name='Bench', user_id=user.id)
+    db.session.add(event)
+    db.session.commit()
+    return event.id
+
+
+def measure(client, requests, payload):
+    latencies = []
+    for i in range(requests):
+        with timed() as t:
+            response = client.post('/chatbot_router/chat', json=payload(i))
+        assert response.status_code == 200, response.get_data(as_text=True)
+        latencies.append(t['ms'])
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(round(0.95 * (len(latencies) - 1)))]
+
+
+def run():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else REQUESTS
+    rows = []
+    for label, config in (('disabled', NoPromptCacheConfig), ('enabled', StubConfig)):
+        with benchmark_app(config) as app:
+            event_id = seed()
+            client = app.test_client()
+            llm_client = app.extensions['llm']
+            guest = measure(client, requests, lambda i: {'message': message(i)})
+            guest_calls = llm_client.calls
+            client.post('/user/login', data={'email': 'bench@example.com', 'password': 'benchpass'})
+            user = measure(client, requests, lambda i: {'message': message(i), 'event_id': event_id})
+            for path, calls, (p50, p95) in (('guest text', guest_calls, guest),
+                                            ('user JSON', llm_client.calls - guest_calls, user)):
+                rows.append((label, path, requests, calls, f'{p50:.1f} ms', f'{p95:.1f} ms'))
+    print_table(['cache', 'path', 'requests', 'LLM calls', 'p50', 'p95'], rows)
+
+
+if __name__ == '__main__':
+    run()
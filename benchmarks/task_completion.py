@@ -0,0 +1,71 @@
+"""
+Checklist completion: per-object ORM updates vs. the set-based UPDATEs.
+
+Half of each event's tasks start completed and the submitted form flips
+every task, so both paths have to write every row. The ORM flush sends its
+per-row UPDATEs as a single executemany, so it shows up as one statement
+here even though SQLite runs one UPDATE per task.
+
+    python -m benchmarks.task_completion
+"""
+from benchmarks.common import benchmark_app, QueryCounter, timed, print_table
+import sqlalchemy as sqla
+from src import db
+from src.database.models import User, Event, Task, recompute_event_counters
+from src.database.tasks import set_task_completion
+
+TASK_COUNTS = [100, 1000, 10000]
+
+
+def seed(n_tasks):
+    user = User(username='bench', email='bench@example.com')
+    db.session.add(user)
+    db.session.flush()
+    event = Event(name='Bench', user_id=user.id)
+    db.session.add(event)
+    db.session.flush()
+    db.session.execute(sqla.insert(Task), [
+        {'description': f'Task {i}', 'priority': 1, 'completed': i % 2 == 0, 'event_id': event.id}
+        for i in range(n_tasks)
+    ])
+    recompute_event_counters()
+    db.session.commit()
+    return event.id
+
+
+def flipped_ids(event_id):
+    return [str(task_id) for task_id in db.session.scalars(
+        sqla.select(Task.id).where(Task.event_id == event_id, Task.completed.is_(False))).all()]
+
+
+def legacy_update_tasks(event_id, checked_task_ids):
+    """The pre-bulk implementation of task_router.update_tasks"""
+    tasks = db.session.scalars(sqla.select(Task).where(Task.event_id == event_id)).all()
+    for task in tasks:
+        task.completed = str(task.id) in checked_task_ids
+    db.session.commit()
+
+
+def bulk_update_tasks(event_id, checked_task_ids):
+    set_task_completion(event_id, [int(task_id) for task_id in checked_task_ids])
+    db.session.commit()
+
+
+def run():
+    rows = []
+    for n_tasks in TASK_COUNTS:
+        for label, fn in (('orm', legacy_update_tasks), ('bulk', bulk_update_tasks)):
+            with benchmark_app():
+                event_id = seed(n_tasks)
+                checked = flipped_ids(event_id)
+                db.session.expire_all()
+                with QueryCounter(db.engine) as counter, timed() as t:
+                    fn(event_id, checked)
+                event = db.session.get(Event, event_id)
+                assert event.completed_count == len(checked)
+                rows.append((n_tasks, label, counter.count, f"{t['ms']:.1f}"))
+    print_table(['tasks', 'path', 'statements', 'ms'], rows)
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,94 @@
+"""
+Peak RSS of preparing one uploaded photo for captioning: the old buffered
+path (read the upload into memory, copy it twice, verify, decode at full
+resolution, LANCZOS thumbnail) vs. the streaming path the route uses now
+(hash the spooled file in chunks, one draft-mode decode to 512px).
+
+Each upload is handled in a fresh interpreter so the peaks do not mix; the
+reported figure is peak RSS minus RSS just before the upload (Linux only).
+
+    python -m benchmarks.upload_memory
+"""
+import os
+import subprocess
+import sys
+import tempfile
+from io import BytesIO
+from PIL import Image
+from benchmarks.common import timed, print_table
+from src.captioning import MAX_IMAGE_SIZE, open_for_captioning
+from src.database.verification_cache import image_digest, stream_digest
+
+# (width, height) of the synthetic phone photos
+PHOTO_SIZES = [(4032, 3024), (8000, 6000)]
+PATHS = ['buffered', 'streaming']
+
+
+def make_photo(path, size):
+    """A noisy JPEG, so it compresses about as badly as a real photo"""
+    bands = [Image.effect_noise(size, sigma) for sigma in (60, 70, 80)]
+    Image.merge('RGB', bands).save(path, 'JPEG', quality=95)
+
+
+def buffered(upload):
+    data = upload.read()
+    for_caption, for_save = BytesIO(data), BytesIO(data)
+    image_digest(data)
+    Image.open(for_caption).verify()
+    for_caption.seek(0)
+    img = Image.open(for_caption).convert('RGB')
+    img.thumbnail(MAX_IMAGE_SIZE, Image.Resampling.LANCZOS)
+    return img, for_save
+
+
+def streaming(upload):
+    stream_digest(upload)
+    return open_for_captioning(upload), upload
+
+
+def proc_status_mb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024
+    raise KeyError(field)
+
+
+def reset_peak_rss():
+    """Restart the peak counter so import-time allocations do not hide the upload's (Linux)"""
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+
+
+def measure(path_name, photo):
+    """Child process: handle one upload and print 'peak_delta_mb ms'"""
+    handler = {'buffered': buffered, 'streaming': streaming}[path_name]
+    with open(photo, 'rb') as upload:
+        reset_peak_rss()
+        baseline = proc_status_mb('VmRSS')
+        with timed() as t:
+            handler(upload)
+        peak = proc_status_mb('VmHWM')
+    print(f"{peak - baseline:.1f} {t['ms']:.0f}")
+
+
+def run():
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in PHOTO_SIZES:
+            photo = os.path.join(directory, f'{size[0]}x{size[1]}.jpg')
+            make_photo(photo, size)
+            megabytes = os.path.getsize(photo) / 2 ** 20
+            for path_name in PATHS:
+                output = subprocess.run(
+                    [sys.executable, '-m', 'benchmarks.upload_memory', path_name, photo],
+                    check=True, capture_output=True, text=True).stdout.split()
+                rows.append((f'{size[0]}x{size[1]}', f'{megabytes:.1f}', path_name, *output))
+    print_table(['photo', 'file MB', 'path', 'peak RSS +MB', 'ms'], rows)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        measure(*sys.argv[1:])
+    else:
+        run()
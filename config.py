@@ -24,4 +24,99 @@ class Config(object):
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER') or os.environ.get('MAIL_USERNAME')
     
     # Admin settings
-    ADMINS = [os.environ.get('MAIL_USERNAME') or 'admin@eventease.com']    
\ No newline at end of file
+    ADMINS = [os.environ.get('MAIL_USERNAME') or 'admin@eventease.com']
+
+    # Dashboard pagination (0 shows every event on one page)
+    DASHBOARD_PAGE_SIZE = int(os.environ.get('DASHBOARD_PAGE_SIZE') or 0)
+
+    # LLM used by the chatbot and photo verification: 'gemini' or 'stub' (offline fixtures)
+    LLM_BACKEND = os.environ.get('LLM_BACKEND') or 'gemini'
+    LLM_MODEL = os.environ.get('LLM_MODEL') or 'gemini-1.5-flash'
+    LLM_TRANSPORT = os.environ.get('LLM_TRANSPORT')  # 'grpc' or 'rest'; unset = SDK default
+    LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT') or 30)  # seconds per attempt
+    LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES') or 2)
+    LLM_RETRY_BASE_DELAY = float(os.environ.get('LLM_RETRY_BASE_DELAY') or 0.5)  # seconds, doubled per retry
+    LLM_RETRY_MAX_DELAY = float(os.environ.get('LLM_RETRY_MAX_DELAY') or 8)
+    LLM_STUB_FIXTURES = os.environ.get('LLM_STUB_FIXTURES') or os.path.join(basedir, 'benchmarks', 'fixtures', 'llm_stub.json')
+    # Answers to popular checklist prompts, per process; 0 disables
+    PROMPT_CACHE_TTL = int(os.environ.get('PROMPT_CACHE_TTL') or 21600)  # seconds
+    PROMPT_CACHE_MAX_ENTRIES = int(os.environ.get('PROMPT_CACHE_MAX_ENTRIES') or 1000)
+    # create_event_and_tasks conversations, stored server-side
+    CONVERSATION_TTL = int(os.environ.get('CONVERSATION_TTL') or 3600)  # seconds after the last reply
+    CONVERSATION_TOKEN_BUDGET = int(os.environ.get('CONVERSATION_TOKEN_BUDGET') or 1000)  # transcript in a prompt
+
+    # Page cache: 'file' (shared directory), 'memory' (per-process LRU; single-process servers only) or 'null'
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND') or 'file'
+    CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL') or 300)
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES') or 1024)
+    CACHE_DIR = os.environ.get('CACHE_DIR') or os.path.join(basedir, 'instance', 'cache')
+    # Deleted keys refuse values computed before the delete for this long (seconds)
+    CACHE_TOMBSTONE_TTL = int(os.environ.get('CACHE_TOMBSTONE_TTL') or 60)
+    # The file backend prunes expired entries and trims to CACHE_MAX_ENTRIES once per this many writes
+    CACHE_PRUNE_EVERY = int(os.environ.get('CACHE_PRUNE_EVERY') or 100)
+
+    # Re-render calendar subscription feeds in a background thread after task writes
+    CALENDAR_FEED_PRECOMPUTE = os.environ.get('CALENDAR_FEED_PRECOMPUTE', 'true').lower() in ['true', 'on', '1']
+    # Writes within this window are rebuilt together
+    CALENDAR_FEED_DEBOUNCE = float(os.environ.get('CALENDAR_FEED_DEBOUNCE') or 0.5)  # seconds
+
+    # Orphaned upload sweep ('flask uploads gc'); a positive interval also runs it in each web process
+    UPLOAD_GC_INTERVAL = int(os.environ.get('UPLOAD_GC_INTERVAL') or 0)  # seconds
+    UPLOAD_GC_MIN_AGE = int(os.environ.get('UPLOAD_GC_MIN_AGE') or 3600)  # never touch newer files
+    UPLOAD_GC_MAX_REMOVALS = int(os.environ.get('UPLOAD_GC_MAX_REMOVALS') or 0)  # per run, 0 = no limit
+    UPLOAD_GC_PAUSE = float(os.environ.get('UPLOAD_GC_PAUSE') or 0)  # seconds between batches
+
+    # BLIP captioning service: worker processes batch concurrent uploads into one generate call
+    CAPTION_MODEL = os.environ.get('CAPTION_MODEL') or 'Salesforce/blip-image-captioning-base'
+    CAPTION_WORKERS = int(os.environ.get('CAPTION_WORKERS') or 1)
+    CAPTION_MAX_BATCH_SIZE = int(os.environ.get('CAPTION_MAX_BATCH_SIZE') or 8)
+    CAPTION_MAX_WAIT_MS = int(os.environ.get('CAPTION_MAX_WAIT_MS') or 20)
+    CAPTION_TIMEOUT = float(os.environ.get('CAPTION_TIMEOUT') or 30)  # seconds a request waits
+    CAPTION_NUM_BEAMS = int(os.environ.get('CAPTION_NUM_BEAMS') or 5)  # 1 = greedy decoding
+    CAPTION_MODE = os.environ.get('CAPTION_MODE') or 'fp32'  # 'fp32', 'int8' or 'compile'
+    CAPTION_TORCH_THREADS = int(os.environ.get('CAPTION_TORCH_THREADS') or 0)  # per worker, 0 = torch default
+    # Start the pool on a web process's first request instead of its first upload
+    CAPTION_PRELOAD = os.environ.get('CAPTION_PRELOAD', 'false').lower() in ['true', 'on', '1']
+    # Each worker runs one inference on a blank image before taking requests
+    CAPTION_WARMUP = os.environ.get('CAPTION_WARMUP', 'true').lower() in ['true', 'on', '1']
+    CAPTION_MAX_LENGTH = int(os.environ.get('CAPTION_MAX_LENGTH') or 50)
+    # 'host:port' of a shared pool started with 'flask caption serve'; unset = pool per process
+    CAPTION_SERVICE_ADDRESS = os.environ.get('CAPTION_SERVICE_ADDRESS')
+    # Shared secret between the app and that pool; required to use it, and must differ from SECRET_KEY
+    CAPTION_SERVICE_KEY = os.environ.get('CAPTION_SERVICE_KEY')
+
+    # Largest photo accepted for item verification (the whole request body), in bytes
+    MAX_IMAGE_UPLOAD_BYTES = int(os.environ.get('MAX_IMAGE_UPLOAD_BYTES') or 25 * 1024 * 1024)
+    # Uploaded files past this size are spooled to a temporary file instead of held in memory
+    UPLOAD_SPOOL_SIZE = int(os.environ.get('UPLOAD_SPOOL_SIZE') or 512 * 1024)
+
+    # Photo verification caches (see src/database/verification_cache.py)
+    CAPTION_CACHE_MAX_ENTRIES = int(os.environ.get('CAPTION_CACHE_MAX_ENTRIES') or 10000)
+    VERDICT_CACHE_MAX_ENTRIES = int(os.environ.get('VERDICT_CACHE_MAX_ENTRIES') or 50000)
+    # Check the caps (a COUNT per table) once per this many writes rather than on every write
+    VERIFICATION_CACHE_EVICT_EVERY = int(os.environ.get('VERIFICATION_CACHE_EVICT_EVERY') or 100)
+    # Also reuse the caption of a visually identical image (same perceptual hash)
+    CAPTION_CACHE_PHASH = os.environ.get('CAPTION_CACHE_PHASH', 'false').lower() in ['true', 'on', '1']
+
+    # Answer clear item/caption matches locally before asking Gemini (see src/item_matching.py)
+    ITEM_MATCHER = os.environ.get('ITEM_MATCHER', 'true').lower() in ['true', 'on', '1']
+    # Optional sentence-transformers model for pairs the synonym table cannot settle
+    ITEM_MATCH_EMBEDDING_MODEL = os.environ.get('ITEM_MATCH_EMBEDDING_MODEL')
+    ITEM_MATCH_YES_SIMILARITY = float(os.environ.get('ITEM_MATCH_YES_SIMILARITY') or 0.75)
+    ITEM_MATCH_NO_SIMILARITY = float(os.environ.get('ITEM_MATCH_NO_SIMILARITY') or 0.25)
+
+    # Background photo verification (see src/verification_jobs.py)
+    # Threads per web process, started by its first request; 0 = only 'flask verify work' runs jobs
+    VERIFY_JOB_WORKERS = int(os.environ.get('VERIFY_JOB_WORKERS') or 2)
+    VERIFY_JOB_DIR = os.environ.get('VERIFY_JOB_DIR')  # unset = <instance folder>/verification_jobs
+    VERIFY_JOB_POLL_INTERVAL = float(os.environ.get('VERIFY_JOB_POLL_INTERVAL') or 5)  # seconds
+    VERIFY_JOB_STALE_AFTER = int(os.environ.get('VERIFY_JOB_STALE_AFTER') or 300)  # requeue a running job after
+    VERIFY_JOB_MAX_ATTEMPTS = int(os.environ.get('VERIFY_JOB_MAX_ATTEMPTS') or 3)
+    VERIFY_JOB_RETRY_DELAY = int(os.environ.get('VERIFY_JOB_RETRY_DELAY') or 30)  # seconds
+    VERIFY_JOB_RETENTION = int(os.environ.get('VERIFY_JOB_RETENTION') or 86400)  # keep finished jobs
+    # Offer job status over Server-Sent Events; each open stream holds a request worker, so off by
+    # default and the checklist polls the status URL instead
+    VERIFY_JOB_EVENTS = os.environ.get('VERIFY_JOB_EVENTS', 'false').lower() in ['true', 'on', '1']
+    VERIFY_JOB_EVENTS_TIMEOUT = int(os.environ.get('VERIFY_JOB_EVENTS_TIMEOUT') or 20)  # longest SSE stream
+    VERIFY_JOB_EVENTS_INTERVAL = float(os.environ.get('VERIFY_JOB_EVENTS_INTERVAL') or 2)  # seconds between reads
+    VERIFY_JOB_MAX_STREAMS = int(os.environ.get('VERIFY_JOB_MAX_STREAMS') or 4)  # per process; others get 503
@@ -0,0 +1,52 @@
+"""add image caption and item verdict caches
+
+Revision ID: 3f8e2d6c9a17
+Revises: e6c0b7a94f15
+Create Date: 2026-10-18 19:05:41.227318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f8e2d6c9a17'
+down_revision = 'e6c0b7a94f15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('image_caption',
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('captioner', sa.String(length=120), nullable=False),
+    sa.Column('phash', sa.String(length=16), nullable=True),
+    sa.Column('caption', sa.String(length=255), nullable=False),
+    sa.Column('last_used_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('sha256', 'captioner')
+    )
+    with op.batch_alter_table('image_caption', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_image_caption_last_used_at'), ['last_used_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_image_caption_phash'), ['phash'], unique=False)
+
+    op.create_table('item_verdict',
+    sa.Column('item', sa.String(length=100), nullable=False),
+    sa.Column('caption', sa.String(length=255), nullable=False),
+    sa.Column('related', sa.Boolean(), nullable=False),
+    sa.Column('last_used_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('item', 'caption')
+    )
+    with op.batch_alter_table('item_verdict', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_item_verdict_last_used_at'), ['last_used_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('item_verdict', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_item_verdict_last_used_at'))
+
+    op.drop_table('item_verdict')
+    with op.batch_alter_table('image_caption', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_image_caption_phash'))
+        batch_op.drop_index(batch_op.f('ix_image_caption_last_used_at'))
+
+    op.drop_table('image_caption')
@@ -0,0 +1,28 @@
+"""add user calendar version stamp
+
+Revision ID: 4e2a9c7b1d38
+Revises: b81f4d2c6e07
+Create Date: 2026-10-18 14:05:47.236904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4e2a9c7b1d38'
+down_revision = 'b81f4d2c6e07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('calendar_version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('calendar_updated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('calendar_updated_at')
+        batch_op.drop_column('calendar_version')
@@ -0,0 +1,26 @@
+"""add owner keyset index on event
+
+Revision ID: 5a7c2e9d4b16
+Revises: c4a8e1f7d362
+Create Date: 2026-10-19 09:12:27.604113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a7c2e9d4b16'
+down_revision = 'c4a8e1f7d362'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.create_index('ix_event_user_date_id', ['user_id', 'date', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_index('ix_event_user_date_id')
@@ -0,0 +1,48 @@
+"""add verification job queue
+
+Revision ID: 7b1d4e9f2c58
+Revises: 3f8e2d6c9a17
+Create Date: 2026-10-18 21:12:09.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b1d4e9f2c58'
+down_revision = '3f8e2d6c9a17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('verification_job',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('task_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('filename', sa.String(length=255), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('caption', sa.String(length=255), nullable=True),
+    sa.Column('related', sa.Boolean(), nullable=True),
+    sa.Column('error', sa.String(length=255), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['task_id'], ['task.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('verification_job', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_verification_job_status'), ['status'], unique=False)
+        batch_op.create_index(batch_op.f('ix_verification_job_task_id'), ['task_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_verification_job_updated_at'), ['updated_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('verification_job', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_verification_job_updated_at'))
+        batch_op.drop_index(batch_op.f('ix_verification_job_task_id'))
+        batch_op.drop_index(batch_op.f('ix_verification_job_status'))
+
+    op.drop_table('verification_job')
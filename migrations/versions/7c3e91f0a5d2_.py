@@ -0,0 +1,35 @@
+"""add event progress counters
+
+Revision ID: 7c3e91f0a5d2
+Revises: 2db532822924
+Create Date: 2026-10-18 09:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c3e91f0a5d2'
+down_revision = '2db532822924'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('task_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('completed_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill from the existing tasks
+    op.execute("""
+        UPDATE event SET
+            task_count = (SELECT COUNT(*) FROM task WHERE task.event_id = event.id),
+            completed_count = (SELECT COUNT(*) FROM task WHERE task.event_id = event.id AND task.completed)
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_column('completed_count')
+        batch_op.drop_column('task_count')
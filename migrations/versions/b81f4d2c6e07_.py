@@ -0,0 +1,28 @@
+"""add event pagination indexes
+
+Revision ID: b81f4d2c6e07
+Revises: 7c3e91f0a5d2
+Create Date: 2026-10-18 11:40:02.518336
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b81f4d2c6e07'
+down_revision = '7c3e91f0a5d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.create_index('ix_event_date_id', ['date', 'id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_event_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('event', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_event_user_id'))
+        batch_op.drop_index('ix_event_date_id')
@@ -0,0 +1,26 @@
+"""index friendships by friend_id
+
+Revision ID: e6c0b7a94f15
+Revises: 9d5f6a3e2b41
+Create Date: 2026-10-18 16:48:55.104729
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6c0b7a94f15'
+down_revision = '9d5f6a3e2b41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('friendships', schema=None) as batch_op:
+        batch_op.create_index('ix_friendships_friend_id', ['friend_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('friendships', schema=None) as batch_op:
+        batch_op.drop_index('ix_friendships_friend_id')
@@ -9,6 +9,8 @@ from flask_bootstrap import Bootstrap
 import os
 from jinja2 import ChoiceLoader, FileSystemLoader
 from flask import Blueprint
+from src.cache import Cache
+from src.llm import LLM
 
 
 db = SQLAlchemy()
@@ -18,11 +20,15 @@ login.login_view = 'auth.login'
 moment = Moment()
 mail = Mail()
 bootstrap = Bootstrap()
+cache = Cache()
+llm = LLM()
 
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
+    from src.uploads import SpooledUploadRequest
+    app.request_class = SpooledUploadRequest
     app.static_folder = config_class.STATIC_FOLDER
     
     # Set up multiple template directories
@@ -42,6 +48,8 @@ def create_app(config_class=Config):
     bootstrap.init_app(app)
     moment.init_app(app)
     mail.init_app(app)
+    cache.init_app(app)
+    llm.init_app(app)
 
     # blueprint registration
     from src.api.routes import bp_main
@@ -65,6 +73,21 @@ def create_app(config_class=Config):
     app.register_blueprint(task_router)
     task_router.template_folder = Config.TEMPLATE_FOLDER_MAIN
 
+    # CLI commands
+    from src.cli import calendar_cli, caption_cli, counters_cli, uploads_cli, verify_cli
+    app.cli.add_command(counters_cli)
+    app.cli.add_command(uploads_cli)
+    app.cli.add_command(caption_cli)
+    app.cli.add_command(verify_cli)
+    app.cli.add_command(calendar_cli)
+
+    # Background jobs
+    from src.uploads import init_upload_gc
+    init_upload_gc(app)
+    from src.verification_jobs import init_verification_jobs
+    init_verification_jobs(app)
+    from src.captioning import init_caption_preload
+    init_caption_preload(app)
 
     return app
 
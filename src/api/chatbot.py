@@ -1,23 +1,119 @@
 import json
-import re
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, current_app, render_template, request, jsonify, stream_with_context
 from flask_login import login_required
-import google.generativeai as genai
-import os
-from src import db
+from src import db, llm
 from flask_login import current_user
-from src.database.models import Event, Task
+from src.database.models import Event
+from src.database.invalidation import invalidate_event
+from src.database.tasks import delete_generated_tasks, insert_generated_tasks
+from src.uploads import schedule_removal
+from src.database.conversations import (
+    compact_transcript, end_conversation, get_conversation, record_exchange, start_conversation,
+    turns_from_history,
+)
+from src.streaming import (
+    JSONArrayParser, event_stream_response, extract_json_array, sse_event, wants_event_stream,
+)
 
 
 chatbot_router = Blueprint('chatbot_router', __name__,
                            url_prefix='/chatbot_router')
 
-# Initialize Gemini API
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    raise ValueError("GEMINI_API_KEY environment variable is not set")
-genai.configure(api_key=api_key)
-model = genai.GenerativeModel(model_name="gemini-1.5-flash")
+# Prompt cache namespaces; bump the version when a prompt's wording changes
+CHAT_JSON_TEMPLATE = 'chat-json:v1'
+CHAT_TEXT_TEMPLATE = 'chat-text:v1'
+NO_TASKS_ERROR = "The generated checklist had no usable tasks."
+
+
+def _answer_chunks(prompt, cache_as):
+    """The cached answer as one chunk, or the model's answer as it is generated"""
+    cached = llm.prompts.get(*cache_as) if cache_as else None
+    return ([cached], True) if cached is not None else (llm.stream(prompt), False)
+
+
+def stream_text(prompt, done, error_message, cache_as=None):
+    """SSE: a 'delta' event per chunk of the answer, then 'done' with done(full_text)"""
+    chunks, cached = _answer_chunks(prompt, cache_as)
+    parts = []
+    try:
+        for chunk in chunks:
+            parts.append(chunk)
+            yield sse_event('delta', {"text": chunk})
+    except Exception as e:
+        yield sse_event('error', {"error": f"{error_message}: {e}"})
+        return
+    text = ''.join(parts).strip()
+    if cache_as and not cached and text:
+        llm.prompts.set(*cache_as, text)
+    yield sse_event('done', done(text))
+
+
+def task_event(row):
+    """The 'task' event for a row returned by insert_generated_tasks"""
+    due_date = row['due_date']
+    return {"id": row['id'], "task": row['description'], "priority": row['priority'],
+            "item": row['item'], "due_date": due_date.isoformat() if due_date else None}
+
+
+def stream_tasks(prompt, event_id, done, cache_as=None, on_done=None):
+    """SSE: save the tasks of the JSON checklist as they parse and send each as a 'task' event.
+
+    The tasks completed by one chunk of the answer are inserted together.
+    ``on_done`` runs once every task is saved; what it changes is committed
+    before the 'done' event. If the answer fails part way (or the client
+    goes away), the tasks already saved are deleted again, so a retry does
+    not add a second copy of them.
+    """
+    chunks, cached = _answer_chunks(prompt, cache_as)
+    parser = JSONArrayParser(of_objects=True)
+    parts, saved, error = [], [], None
+    try:
+        for chunk in chunks:
+            parts.append(chunk)
+            rows = insert_generated_tasks(event_id, parser.feed(chunk))
+            if rows:
+                db.session.commit()
+                saved.extend(row['id'] for row in rows)
+                for row in rows:
+                    yield sse_event('task', task_event(row))
+        parser.close()
+        if not saved:
+            error = NO_TASKS_ERROR
+        elif on_done:
+            on_done()
+            db.session.commit()
+    except json.JSONDecodeError as e:
+        error = f"Invalid JSON response from Gemini API: {e}. The response was: {''.join(parts)}"
+    except Exception as e:
+        error = f"Error saving tasks to the database: {e}"
+    except GeneratorExit:
+        _discard_tasks(event_id, saved)
+        raise
+    if error:
+        _discard_tasks(event_id, saved)
+    if saved:
+        invalidate_event(event_id)
+    if error:
+        yield sse_event('error', {"error": error})
+        return
+    if cache_as and not cached:
+        llm.prompts.set(*cache_as, ''.join(parts).strip())
+    yield sse_event('done', done)
+
+
+def _discard_tasks(event_id, task_ids):
+    """Roll back, then delete the tasks an unfinished stream had already committed"""
+    db.session.rollback()
+    if not task_ids:
+        return
+    try:
+        image_links = delete_generated_tasks(event_id, task_ids)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Could not remove a partial checklist from event {event_id}: {str(e)}")
+        return
+    schedule_removal(image_links)
 
 
 @chatbot_router.route('/chatbot', methods=['GET', 'POST'])
@@ -36,15 +132,35 @@ def create_event_and_tasks():
     data = request.json
     user_input = data.get('userInput')
     event_id = data.get('event_id')
-    conversation_history = data.get('conversation_history', [])
-    question_index = data.get('question_index', 0)
+    conversation_id = data.get('conversation_id')
 
     event = Event.query.get(event_id)
     if not event:
         return jsonify({"error": "Event not found."}), 404
 
+    # The conversation so far is kept server-side; the client only sends its id
+    ttl = current_app.config.get('CONVERSATION_TTL', 3600)
+    if conversation_id:
+        conversation = get_conversation(conversation_id, current_user.id, ttl)
+        if conversation is None or conversation.event_id != event.id:
+            return jsonify({"error": "This conversation has expired. Please start again."}), 404
+    else:
+        # Older clients send the whole history instead; carry on from it
+        conversation = start_conversation(current_user.id, event.id,
+                                          turns_from_history(data.get('conversation_history')),
+                                          data.get('question_index', 0), ttl)
+    question_index = conversation.question_index
+    transcript = compact_transcript(conversation.turns + [{"role": 'user', "text": user_input}],
+                                    current_app.config.get('CONVERSATION_TOKEN_BUDGET', 1000))
+
+    def reply(question):
+        record_exchange(conversation, user_input, question)
+        db.session.commit()
+        return {"question": question, "conversation_id": conversation.id,
+                "question_index": conversation.question_index}
+
     try:
-        if not conversation_history:
+        if not conversation.turns:
             # Initial prompt, ask the first clarifying question
             prompt = f"""
         Based on the following event description: "{user_input}", ask ONE clarifying question that will help create a more specific checklist.
@@ -56,18 +172,18 @@ def create_event_and_tasks():
                 # Ask a follow-up question
                 prompt = f"""
         Based on the following conversation:
-        {conversation_history}
+        {transcript}
         Ask the user what aspect of the event they want to prioritize most (e.g., fun, efficiency, preparation, safety, etc...).\
         Create the list of aspect based on their event, not the template. You can guess with "{event.name}".
         Format your response with just the question and a short list of example options. 
         Format the list into just a normal list, not a markdown list.
-        Do not ask about things already mentioned in the chat: {conversation_history}
+        Do not ask about things already mentioned in the conversation above.
         """
             else:
                 # Generate the checklist after all questions are answered
                 prompt = f"""
         Based on the following conversation:
-        {conversation_history}
+        {transcript}
         Generate a JSON checklist with at least 8 pre-event tasks related to the event "{event.name}".
         Use the priorities expressed in the second question to set 'priority' (1: important, 2: necessary, 3: normal).
         Each task should include:
@@ -86,34 +202,30 @@ def create_event_and_tasks():
         ]
         """
 
-        response = model.generate_content(prompt)
-        response_text = response.text.strip()
+        if wants_event_stream(request):
+            if not conversation.turns or question_index < 2:
+                events = stream_text(prompt, reply, "Error creating tasks")
+            else:
+                events = stream_tasks(prompt, event_id, {"eventId": event_id, "message": "Tasks created successfully!"},
+                                      on_done=lambda: end_conversation(conversation))
+            return event_stream_response(stream_with_context(events))
+
+        response_text = llm.generate(prompt).strip()
 
-        if not conversation_history or question_index < 2:
+        if not conversation.turns or question_index < 2:
             # Return a question
-            return jsonify({"question": response_text, "conversation_history": conversation_history + [f"User: {user_input}", f"Bot: {response_text}"], "question_index": question_index + 1})
+            return jsonify(reply(response_text))
         else:
             # Return tasks - Use transaction for database operations
-            json_match = re.search(
-                r"```json\s*([\s\S]*?)\s*```", response_text)
-            if json_match:
-                response_text = json_match.group(1).strip()
-
-            tasks_data = json.loads(response_text)
+            tasks_data = extract_json_array(response_text)
 
             try:
-                for task_data in tasks_data:
-                    task = Task(
-                        description=task_data.get(
-                            'task', 'No description provided'),
-                        priority=task_data.get('priority', 3),
-                        due_date=task_data.get('due_date', None),
-                        item=task_data.get('item', None),
-                        event_id=event_id
-                    )
-                    db.session.add(task)
+                if not insert_generated_tasks(event_id, tasks_data):
+                    return jsonify({"error": NO_TASKS_ERROR}), 400
 
+                end_conversation(conversation)
                 db.session.commit()
+                invalidate_event(event_id)
                 return jsonify({"eventId": event_id, "message": "Tasks created successfully!"})
             except Exception as e:
                 db.session.rollback()
@@ -157,28 +269,28 @@ def chat():
 
         Return ONLY the JSON. Do not include any other text or explanations, and do not wrap the JSON in markdown code blocks.
         """
-        try:
-            response = model.generate_content(prompt)
-            response_text = response.text.strip()
+        if wants_event_stream(request):
+            events = stream_tasks(prompt, event_id, {"response": "Tasks saved to the database successfully!"},
+                                  cache_as=(CHAT_JSON_TEMPLATE, user_input))
+            return event_stream_response(stream_with_context(events))
 
-            json_match = re.search(
-                r"```json\s*([\s\S]*?)\s*```", response_text)
-            if json_match:
-                response_text = json_match.group(1).strip()
+        try:
+            response_text = llm.prompts.get(CHAT_JSON_TEMPLATE, user_input)
+            cached = response_text is not None
+            if not cached:
+                response_text = llm.generate(prompt).strip()
 
-            tasks_data = json.loads(response_text)
+            tasks_data = extract_json_array(response_text)
 
             try:
-                for task_data in tasks_data:
-                    task = Task(
-                        description=task_data.get(
-                            'task', 'No description provided'),
-                        priority=task_data.get('priority', 3),
-                        event_id=event_id
-                    )
-                    db.session.add(task)
+                if not insert_generated_tasks(event_id, tasks_data):
+                    return jsonify({"error": NO_TASKS_ERROR}), 400
 
                 db.session.commit()
+                # Only answers that gave a checklist are worth serving again
+                if not cached:
+                    llm.prompts.set(CHAT_JSON_TEMPLATE, user_input, response_text)
+                invalidate_event(event_id)
                 return jsonify({"response": "Tasks saved to the database successfully!"})
             except Exception as e:
                 db.session.rollback()
@@ -202,9 +314,17 @@ def chat():
         Buy snacks (Priority: normal)
         Return the checklist as plain text, with each task on a new line.
         """
+        if wants_event_stream(request):
+            events = stream_text(prompt, lambda text: {"response": text}, "Error generating checklist",
+                                 cache_as=(CHAT_TEXT_TEMPLATE, user_input))
+            return event_stream_response(stream_with_context(events))
+
         try:
-            response = model.generate_content(prompt)
-            response_text = response.text.strip()
+            response_text = llm.prompts.get(CHAT_TEXT_TEMPLATE, user_input)
+            if response_text is None:
+                response_text = llm.generate(prompt).strip()
+                if response_text:
+                    llm.prompts.set(CHAT_TEXT_TEMPLATE, user_input, response_text)
 
             # Return the checklist directly as plain text
             return jsonify({"response": response_text})
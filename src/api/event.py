@@ -1,10 +1,15 @@
 
 from flask import Blueprint, request, jsonify, redirect, url_for
 from flask_login import login_required
-import os
 from src import db
 from flask_login import current_user
-from src.database.models import Event, Task, User
+from src.database.models import Event, User
+from src.database.queries import event_summaries_page, MAX_PAGE_SIZE
+from src.database.invalidation import event_audience, invalidate_checklist, invalidate_dashboards, invalidate_event
+from src.database.friendships import friends_among
+from src.database.participants import apply_participant_changes, parse_ids
+from src.database.events import delete_events
+from src.uploads import schedule_removal
 import sqlalchemy as sqla
 from flask import current_app
 from datetime import datetime
@@ -15,6 +20,32 @@ from flask import current_app
 event_router = Blueprint('event_router', __name__, url_prefix='/event_router')
 
 
+@event_router.route('/events', methods=['GET'])
+@login_required
+def list_events():
+    limit = request.args.get('limit', 20, type=int)
+    cursor = request.args.get('cursor')
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        return jsonify({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}."}), 400
+
+    try:
+        rows, next_cursor = event_summaries_page(current_user.id, limit, cursor)
+    except ValueError:
+        return jsonify({"error": "Invalid cursor."}), 400
+
+    return jsonify({
+        "events": [{
+            "id": row.id,
+            "name": row.name,
+            "date": row.date.isoformat(),
+            "task_count": row.task_count,
+            "completed_count": row.completed_count,
+            "progress": row.progress,
+        } for row in rows],
+        "next_cursor": next_cursor,
+    })
+
+
 @event_router.route('/create_event', methods=['POST'])
 @login_required
 def create_event():
@@ -42,6 +73,7 @@ def create_event():
     # Add the current user as a participant
     new_event.participants.append(current_user)
     db.session.commit()
+    invalidate_dashboards([user_id])
 
     return jsonify({"eventId": new_event.id})
 
@@ -59,6 +91,7 @@ def update_event_name(event_id):
 
     event.name = new_name
     db.session.commit()
+    invalidate_event(event_id)
 
     return jsonify({"success": True})
 
@@ -76,6 +109,7 @@ def update_event_date(event_id):
 
     event.date = new_date
     db.session.commit()
+    invalidate_event(event_id)
 
     return jsonify({"success": True})
 
@@ -89,26 +123,13 @@ def delete_event(event_id):
         if not event:
             return jsonify({"error": "Event not found"}), 404
 
-        # Remove all relationships with users (participants)
-        event.participants.clear()
-
-        # Delete all tasks associated with the event
-        tasks = db.session.scalars(sqla.select(
-            Task).where(Task.event_id == event_id)).all()
-        for task in tasks:
-            if task.image_link:
-                image_path = os.path.join(
-                    current_app.static_folder, task.image_link)
-                if os.path.exists(image_path):
-                    try:
-                        os.remove(image_path)
-                    except Exception:
-                        pass  # Continue even if deletion fails
-            db.session.delete(task)
-
-        # Delete the event
-        db.session.delete(event)
+        audience = event_audience(event_id)
+
+        # One DELETE; the database cascades to tasks, assignments and participants
+        image_links = delete_events([event_id])
         db.session.commit()
+        invalidate_event(event_id, audience)
+        schedule_removal(image_links)
 
         return redirect(url_for('main.index'))
 
@@ -121,27 +142,36 @@ def delete_event(event_id):
 @login_required
 def update_event_participants(event_id):
     data = request.get_json()
-    add_ids = data.get('add', [])
-    remove_ids = data.get('remove', [])
+    add_ids, rejected_add = parse_ids(data.get('add', []))
+    remove_ids, rejected_remove = parse_ids(data.get('remove', []))
 
     event = db.session.get(Event, event_id)
     if not event:
         return jsonify({"success": False, "error": "Event not found."}), 404
 
-    # Add users to the event
-    for friend_id in add_ids:
-        friend = db.session.get(User, friend_id)
-        if friend and friend in current_user.friends and friend not in event.participants:
-            event.participants.append(friend)
-
-    # Remove users from the event
-    for friend_id in remove_ids:
-        friend = db.session.get(User, friend_id)
-        if friend and friend in event.participants:
-            event.participants.remove(friend)
-
-    db.session.commit()
-    return jsonify({"success": True, "message": "Event participants updated successfully."})
+    try:
+        results = apply_participant_changes(
+            event_id, add_ids, remove_ids,
+            addable_ids=friends_among(current_user.id, add_ids),
+        )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": str(e)}), 500
+
+    changed_ids = ({uid for uid, status in results["add"].items() if status == "added"}
+                   | {uid for uid, status in results["remove"].items() if status == "removed"})
+    if changed_ids:
+        invalidate_checklist(event_id)
+        invalidate_dashboards(changed_ids)
+    # JSON object keys are strings; malformed ids are reported rather than dropped
+    results = {
+        op: {**{str(uid): status for uid, status in results[op].items()},
+             **{str(value): "invalid_id" for value in rejected}}
+        for op, rejected in (("add", rejected_add), ("remove", rejected_remove))
+    }
+    return jsonify({"success": True, "message": "Event participants updated successfully.",
+                    "results": results})
 
 
 @event_router.route('/edit_event/<int:event_id>', methods=['POST'])
@@ -163,6 +193,8 @@ def edit_event(event_id):
     if not new_owner or new_owner not in event.participants:
         return jsonify({"success": False, "error": "Selected user is not a participant of the event."}), 400
 
+    audience = event_audience(event_id)
+
     # Update the event owner
     event.user_id = new_owner_id
     if new_name:
@@ -170,5 +202,6 @@ def edit_event(event_id):
     if new_date:
         event.date = new_date
     db.session.commit()
+    invalidate_event(event_id, audience | event_audience(event_id))
 
     return jsonify({"success": True, "message": "Event ownership changed successfully."})
@@ -1,17 +1,20 @@
 
-from flask import Response, render_template, request, jsonify, flash, redirect, url_for
+from flask import Response, render_template, request, jsonify, flash, redirect, url_for, stream_with_context
 from flask_login import login_required
 import os
-from ics import Calendar
-from ics import Event as IcsEvent
-from src import db
+from src import db, cache, llm
 from flask_login import current_user
-from src.database.models import Event, Task, User, event_participants
+from src.database.models import Event, Task, User, CalendarFeed, event_participants
+from src.database.queries import dashboard_event_summaries, event_summaries_page, visible_to
+from src.database.invalidation import dashboard_key, invalidate_user_checklists
+from src.database.friendships import is_friend, invalidate_friend_ids
+from src.calendar_feed import (feed_etag, feed_query, iter_feed, parse_range,
+                               build_subscription, subscription_url)
 import sqlalchemy as sqla
 from werkzeug.utils import secure_filename
 from src.form.forms import ProfileForm
 from flask import current_app
-from datetime import  timedelta
+from datetime import timezone
 from flask import current_app
 from flask import Blueprint
 
@@ -36,29 +39,20 @@ def root():
 @bp_main.route('/index', methods=['GET', 'POST'])
 @login_required
 def index():
-    # Fetch events created by the current user
-    user_events = db.session.scalars(
-        sqla.select(Event).where(Event.user_id ==
-                                 current_user.id).order_by(Event.date.asc())
-    ).all()
-
-    # Fetch events shared with the current user
-    shared_events = db.session.scalars(
-        sqla.select(Event)
-        .join(event_participants)
-        .where(event_participants.c.user_id == current_user.id)
-        .order_by(Event.date.asc())
-    ).all()
-
-    # Combine both lists and remove duplicates
-    all_events = {event.id: event for event in user_events +
-                  shared_events}.values()
-
-    # Calculate progress for each event
-    for event in all_events:
-        total_tasks = len(event.tasks)
-        completed_tasks = len([task for task in event.tasks if task.completed])
-        event.progress = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
+    # Paginated mode is enabled by ?limit= or DASHBOARD_PAGE_SIZE
+    page_size = request.args.get('limit', type=int) or current_app.config['DASHBOARD_PAGE_SIZE']
+    if page_size:
+        try:
+            all_events, next_cursor = event_summaries_page(
+                current_user.id, page_size, request.args.get('cursor'))
+        except ValueError:
+            return redirect(url_for('main.index', limit=page_size))
+        return render_template('index.html', events=all_events, next_cursor=next_cursor, page_size=page_size)
+
+    # Owned and shared events with their task progress, in one query
+    all_events = cache.get_or_set(
+        dashboard_key(current_user.id),
+        lambda: [row._asdict() for row in dashboard_event_summaries(current_user.id)])
 
     return render_template('index.html', events=all_events)
 
@@ -93,6 +87,8 @@ def edit_profile():
         current_user.email = form.email.data
         current_user.language = form.language.data
         db.session.commit()
+        # Username and picture are shown on other users' checklists
+        invalidate_user_checklists(current_user.id)
 
         flash("Profile updated successfully!", "success")
         return redirect(url_for('main.display_profile'))
@@ -101,39 +97,109 @@ def edit_profile():
     return render_template('edit_profile.html', form=form, user=current_user)
 
 
+@bp_main.route('/cache_stats', methods=['GET'])
+@login_required
+def cache_stats():
+    if current_user.email not in current_app.config['ADMINS']:
+        return jsonify({"error": "Forbidden"}), 403
+    stats = cache.stats()
+    stats['prompt_cache'] = llm.prompts.as_dict()
+    return jsonify(stats)
+
+
 @bp_main.route('/calendar.ics', methods=['GET'])
 @login_required
 def calendar_feed():
     try:
-        # Fetch tasks assigned to the current user
-        tasks = db.session.scalars(
-            sqla.select(Task).where(
-                Task.assigned_users.any(User.id == current_user.id))
-        ).all()
-
-        calendar = Calendar()  # Create a new calendar
-
-        for task in tasks:
-            if task.due_date is not None:
-                # Create an event for each task
-                e = IcsEvent()
-                e.name = task.description  # Set the name of the event
-                e.begin = task.due_date  # Set the start time of the event
-                # Set the end time (1 day duration)
-                e.end = task.due_date + timedelta(days=1)
-                # Add priority (customize as needed)
-                e.priority = task.priority
-                e.description = task.event.name if task.event else 'No Event Description'  # Add description
-
-                calendar.events.add(e)  # Add the event to the calendar
-
-        # Return the calendar feed as a downloadable response
-        response = Response(str(calendar), mimetype="text/calendar")
-        response.headers["Content-Disposition"] = "attachment; filename=calendar.ics"
-        return response
+        start, end = parse_range(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid date range: {str(e)}"}), 400
+
+    # Validators come from the already loaded user row, so a 304 needs no extra query
+    etag = feed_etag(current_user, start, end)
+    last_modified = current_user.calendar_updated_at
+    if last_modified is not None:
+        last_modified = last_modified.replace(microsecond=0, tzinfo=timezone.utc)
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = (last_modified is not None and request.if_modified_since is not None
+                        and last_modified <= request.if_modified_since)
+
+    if not_modified:
+        response = Response(status=304)
+    else:
+        try:
+            query = feed_query(current_user.id, start, end)
+            response = Response(stream_with_context(iter_feed(query)), mimetype="text/calendar")
+            response.headers["Content-Disposition"] = "attachment; filename=calendar.ics"
+        except Exception as e:
+            return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+@bp_main.route('/calendar/subscription', methods=['GET', 'POST'])
+@login_required
+def calendar_subscription():
+    """Return the secret feed URL for the user (or ?event_id=); POST issues a new token.
+
+    Participants share an event's URL, so only the event owner may rotate it.
+    """
+    event_id = request.args.get('event_id', type=int)
+    if event_id is not None:
+        event = db.session.execute(
+            sqla.select(Event.id, Event.user_id).where(Event.id == event_id, visible_to(current_user.id))
+        ).first()
+        if event is None:
+            return jsonify({"error": "Event not found."}), 404
+        if request.method == 'POST' and event.user_id != current_user.id:
+            return jsonify({"error": "Only the event owner can reset its calendar link."}), 403
+        feed = db.session.scalar(sqla.select(CalendarFeed).where(CalendarFeed.event_id == event_id))
+    else:
+        feed = db.session.scalar(sqla.select(CalendarFeed).where(CalendarFeed.user_id == current_user.id))
+
+    if feed is None:
+        feed = CalendarFeed(token=CalendarFeed.new_token(), event_id=event_id,
+                            user_id=None if event_id is not None else current_user.id)
+        db.session.add(feed)
+    elif request.method == 'POST':
+        # Rotating the token revokes the old URL
+        feed.token = CalendarFeed.new_token()
+    db.session.commit()
+
+    return jsonify({"url": subscription_url(feed), "event_id": event_id})
+
+
+@bp_main.route('/calendar/feed/<token>.ics', methods=['GET'])
+def calendar_subscription_feed(token):
+    # No session or user lookup: the token alone selects the stored feed
+    feed = db.session.execute(
+        sqla.select(CalendarFeed.id, CalendarFeed.body, CalendarFeed.etag, CalendarFeed.generated_at)
+        .where(CalendarFeed.token == token)
+    ).first()
+    if feed is None:
+        return jsonify({"error": "Unknown calendar feed."}), 404
+
+    body, etag, generated_at = feed.body, feed.etag, feed.generated_at
+    if body is None:
+        body, etag, generated_at = build_subscription(feed.id)
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype="text/calendar")
+    response.set_etag(etag)
+    response.last_modified = generated_at.replace(microsecond=0, tzinfo=timezone.utc)
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response
 
-    except Exception as e:
-        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
 @bp_main.route('/add_friend', methods=['POST'])
 @login_required
@@ -149,11 +215,12 @@ def add_friend():
         if not friend:
             return jsonify({"success": False, "error": "User not found."}), 404
 
-        if current_user.is_friend(friend):
+        if is_friend(current_user.id, friend.id):
             return jsonify({"success": False, "error": "User is already your friend."}), 400
 
         current_user.add_friend(friend)
         db.session.commit()
+        invalidate_friend_ids(current_user.id)
         print(f"Friend added successfully: {friend.username}")  # Debugging log
 
         return jsonify({"success": True, "message": f"{friend.username} has been added as a friend."})
@@ -172,11 +239,12 @@ def remove_friend():
     if not friend:
         return jsonify({"success": False, "error": "User not found."}), 404
 
-    if not current_user.is_friend(friend):
+    if not is_friend(current_user.id, friend.id):
         return jsonify({"success": False, "error": "User is not your friend."}), 400
 
     current_user.remove_friend(friend)
     db.session.commit()
+    invalidate_friend_ids(current_user.id)
     return jsonify({"success": True, "message": f"{friend.username} has been removed from your friends list."})
 
 
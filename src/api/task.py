@@ -1,18 +1,26 @@
 
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, send_file, url_for
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, send_file, stream_with_context, url_for
 from flask_login import login_required
-import google.generativeai as genai
 import os
-from src import db
+from src import db, cache
 from flask_login import current_user
-from src.database.models import Event, Task, User, event_participants
+from src.database.models import Event, Task, User, VerificationJob, event_participants
+from src.database.queries import checklist_data, visible_to
+from src.database.invalidation import checklist_key, invalidate_checklist, invalidate_event
+from src.database.tasks import (
+    MAX_BATCH_OPERATIONS, TaskBatchError, apply_task_batch, assign_users, set_task_completion, unassign_users,
+)
+from src.database.participants import parse_ids
+from src.uploads import schedule_removal
+from src.captioning import CaptionUnavailable
+from src.verification import InvalidImage, allowed_file, attach_task_image, caption_upload, judge_relation
+from src.verification_jobs import (close_job_stream, create_job, iter_job_events, job_runner, job_state,
+                                   open_job_stream)
+from src.streaming import event_stream_response
 import sqlalchemy as sqla
-from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 from flask import current_app
 from datetime import datetime
-from PIL import Image
-from io import BytesIO
-from transformers import BlipProcessor, BlipForConditionalGeneration
 from flask import current_app
 from deep_translator import GoogleTranslator  
 from google.cloud import texttospeech  
@@ -20,50 +28,22 @@ import tempfile
 
 task_router = Blueprint('task_router', __name__, url_prefix='/task_router')
 
-# Global variables for lazy loading BLIP models
-_blip_processor = None
-_blip_model = None
-model = genai.GenerativeModel(model_name="gemini-1.5-flash")
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
-
-
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
-
-def get_blip_models():
-    """Lazy load BLIP models only when needed"""
-    global _blip_processor, _blip_model
-    if _blip_processor is None or _blip_model is None:
-        try:
-            _blip_processor = BlipProcessor.from_pretrained(
-                "Salesforce/blip-image-captioning-base",
-                use_fast=True
-            )
-            _blip_model = BlipForConditionalGeneration.from_pretrained(
-                "Salesforce/blip-image-captioning-base"
-            )
-        except Exception as e:
-            raise RuntimeError(f"Failed to load BLIP models: {str(e)}")
-    return _blip_processor, _blip_model
-
-
 @task_router.route('/update_tasks/<int:event_id>', methods=['POST'])
 @login_required
 def update_tasks(event_id):
     # Get the list of task IDs that were checked
     checked_task_ids = request.form.getlist('task_ids')
+    task_ids = [int(task_id) for task_id in checked_task_ids if task_id.isdigit()]
 
-    # Get all tasks for the event
-    tasks = db.session.scalars(sqla.select(
-        Task).where(Task.event_id == event_id)).all()
-
-    # Update the completion status of each task
-    for task in tasks:
-        task.completed = str(task.id) in checked_task_ids
-
-    # Commit the changes to the database
-    db.session.commit()
+    # Two set-based UPDATEs in one transaction instead of one UPDATE per task
+    try:
+        set_task_completion(event_id, task_ids)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        flash("An error occurred while updating the tasks.", "danger")
+        return redirect(url_for('main.index'))
+    invalidate_event(event_id)
 
     flash("Tasks updated successfully!", "success")
     return redirect(url_for('main.index'))
@@ -72,28 +52,18 @@ def update_tasks(event_id):
 @task_router.route('/checklist_detail/<int:event_id>', methods=['GET', 'POST'])
 @login_required
 def checklist_detail(event_id):
-    # Fetch the event and its tasks
-    event = db.session.scalars(sqla.select(
-        Event).where(Event.id == event_id)).first()
-    if not event:
+    # Fetch the event and its tasks (cached until the event or its tasks change)
+    data = cache.get_or_set(checklist_key(event_id), lambda: checklist_data(event_id))
+    if data is None:
         flash("Event not found.", "danger")
         return redirect(url_for('main.index'))
 
-    tasks = db.session.scalars(
-        sqla.select(Task)
-        .where(Task.event_id == event_id)
-        .order_by(Task.priority.asc(), Task.due_date.asc())
-    ).all()
-    users = db.session.scalars(
-        sqla.select(User).join(event_participants).where(
-            event_participants.c.event_id == event_id)
-    ).all()
+    event = data['event']
     current_date = datetime.today()
     friends = current_user.friends.all()  # Fetch the user's friends
 
-    assigned_friend_ids = [int(friend.id) for friend in event.participants]
     # Render the checklist.html template with the event and tasks
-    return render_template('checklist.html', event=event, tasks=tasks, users=users, current_date=current_date, strict_mode=event.strict_mode, friends=friends, assigned_friend_ids=assigned_friend_ids)
+    return render_template('checklist.html', event=event, tasks=data['tasks'], users=event['participants'], current_date=current_date, strict_mode=event['strict_mode'], friends=friends, assigned_friend_ids=data['participant_ids'])
 
 
 @task_router.route('/update_task/<int:task_id>', methods=['POST'])
@@ -109,6 +79,7 @@ def update_task(task_id):
 
     task.completed = completed
     db.session.commit()
+    invalidate_event(task.event_id)
 
     return jsonify({"success": True})
 
@@ -122,20 +93,14 @@ def delete_task(task_id):
         if not task:
             return jsonify({"success": False, "error": "Task not found"}), 404
 
-        # Delete the associated image file if it exists
-        if task.image_link:
-            image_path = os.path.join(
-                current_app.static_folder, task.image_link)
-            if os.path.exists(image_path):
-                try:
-                    os.remove(image_path)
-                except OSError:
-                    pass  # Continue even if file deletion fails
-
         event_id = task.event_id
+        image_link = task.image_link
         # Delete the task
         db.session.delete(task)
         db.session.commit()
+        invalidate_event(event_id)
+        # The associated image file is removed in the background
+        schedule_removal([image_link])
 
         if request.is_json:
             return jsonify({"success": True, "message": "Task deleted successfully"})
@@ -182,6 +147,7 @@ def edit_task(task_id):
             task.item = None
 
         db.session.commit()
+        invalidate_checklist(task.event_id)
         return jsonify({"success": True, "message": "Task updated successfully"})
 
     except Exception as e:
@@ -229,6 +195,7 @@ def add_task():
 
         db.session.add(new_task)
         db.session.commit()
+        invalidate_event(event.id)
 
         return jsonify({"success": True, "message": "Task added successfully"})
 
@@ -237,28 +204,55 @@ def add_task():
         return jsonify({"success": False, "error": f"An error occurred: {str(e)}"}), 500
 
 
+@task_router.route('/batch/<int:event_id>', methods=['POST'])
+@login_required
+def batch_tasks(event_id):
+    """Apply many create/edit/delete/complete operations in one transaction"""
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({"success": False, "error": "operations must be a non-empty list"}), 400
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({"success": False, "error": f"At most {MAX_BATCH_OPERATIONS} operations per batch"}), 400
+
+    if db.session.get(Event, event_id) is None:
+        return jsonify({"success": False, "error": "Event not found"}), 404
+    if not db.session.scalar(sqla.select(sqla.exists().where(Event.id == event_id, visible_to(current_user.id)))):
+        return jsonify({"success": False, "error": "You do not have access to this event"}), 403
+
+    try:
+        results, image_links = apply_task_batch(event_id, operations)
+        db.session.commit()
+    except TaskBatchError as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": str(e), "results": e.results}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": f"An error occurred: {str(e)}"}), 500
+    invalidate_event(event_id)
+    # Files go only after the rows are gone for good
+    schedule_removal(image_links)
+
+    return jsonify({"success": True, "results": results})
+
+
 @task_router.route('/assign_users_to_task/<int:task_id>', methods=['POST'])
 @login_required
 def assign_users_to_task(task_id):
     try:
         # Parse the incoming JSON data
         data = request.json
-        user_ids = data.get('user_ids', [])
+        user_ids, _ = parse_ids(data.get('user_ids', []))
 
-        # Fetch the task
-        task = db.session.get(Task, task_id)
-        if not task:
+        # Fetch the task's event
+        event_id = db.session.scalar(sqla.select(Task.event_id).where(Task.id == task_id))
+        if event_id is None:
             return jsonify({"error": "Task not found"}), 404
 
-        # Fetch the users by their IDs
-        users = db.session.scalars(
-            sqla.select(User).where(User.id.in_(user_ids))
-        ).all()
-
-        for user in users:
-            task.assigned_users.append(user)
-
+        # Users that are already assigned are skipped instead of failing the request
+        assign_users([task_id], user_ids)
         db.session.commit()
+        invalidate_checklist(event_id)
 
         return jsonify({"success": True, "message": "Users assigned to task successfully!"})
     except Exception as e:
@@ -266,6 +260,69 @@ def assign_users_to_task(task_id):
         return jsonify({"error": "An error occurred while assigning users to the task."}), 500
 
 
+def _bulk_assignment(write):
+    data = request.get_json(silent=True) or {}
+    task_ids, _ = parse_ids(data.get('task_ids', []))
+    user_ids, _ = parse_ids(data.get('user_ids', []))
+    if not task_ids or not user_ids:
+        return jsonify({"success": False, "error": "task_ids and user_ids are required"}), 400
+
+    # Only tasks of events the current user can see
+    rows = db.session.execute(
+        sqla.select(Task.id, Task.event_id).join(Event, Event.id == Task.event_id)
+        .where(Task.id.in_(task_ids), visible_to(current_user.id))
+    ).all()
+    found_ids = {row.id for row in rows}
+
+    try:
+        changed = write(found_ids, user_ids)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": f"An error occurred: {str(e)}"}), 500
+    for event_id in {row.event_id for row in rows}:
+        invalidate_checklist(event_id)
+
+    return jsonify({
+        "success": True,
+        "changed": changed,
+        "missing_task_ids": sorted(set(task_ids) - found_ids),
+    })
+
+
+@task_router.route('/bulk_assign', methods=['POST'])
+@login_required
+def bulk_assign():
+    """Assign every listed user to every listed task; repeating a request is harmless"""
+    return _bulk_assignment(assign_users)
+
+
+@task_router.route('/bulk_unassign', methods=['POST'])
+@login_required
+def bulk_unassign():
+    """Remove every listed user from every listed task"""
+    return _bulk_assignment(unassign_users)
+
+
+def _uploaded_photo():
+    """The uploaded 'file' part, or (None, error response)"""
+    # Enforced while the body is parsed, so an oversized upload is never fully read
+    request.max_content_length = current_app.config.get('MAX_IMAGE_UPLOAD_BYTES')
+    try:
+        files = request.files
+    except RequestEntityTooLarge:
+        return None, (jsonify({"error": "The uploaded image is too large."}), 413)
+
+    if 'file' not in files:
+        return None, (jsonify({"error": "No file part"}), 400)
+
+    file = files['file']
+
+    if file.filename == '':
+        return None, (jsonify({"error": "No selected file"}), 400)
+    return file, None
+
+
 @task_router.route('/complete_task_with_image/<int:task_id>', methods=['POST'])
 @login_required
 def complete_task_with_image(task_id):
@@ -277,86 +334,28 @@ def complete_task_with_image(task_id):
         if not task.item:
             return jsonify({"error": "This task does not require an item to be verified."}), 400
 
-        if 'file' not in request.files:
-            return jsonify({"error": "No file part"}), 400
-
-        file = request.files['file']
-
-        if file.filename == '':
-            return jsonify({"error": "No selected file"}), 400
-
-        # Validate the uploaded file as an image
-        original_file_bytes = file.read()
-        file_stream_for_blip = BytesIO(original_file_bytes)
-        file_stream_for_save = BytesIO(original_file_bytes)
+        file, error = _uploaded_photo()
+        if error:
+            return error
 
         try:
-            img = Image.open(file_stream_for_blip)
-            img.verify()  # Verify that the file is a valid image
-        except Exception:
+            caption = caption_upload(file.stream)
+        except InvalidImage:
             return jsonify({"error": "The uploaded file is not a valid image."}), 400
-
-        # Load BLIP models only when needed
-        try:
-            blip_processor, blip_model = get_blip_models()
-        except RuntimeError as e:
+        except CaptionUnavailable as e:
             return jsonify({"error": f"AI model unavailable: {str(e)}"}), 503
-
-        # Reload the image for BLIP processing
-        # Reset the stream position to the beginning
-        file_stream_for_blip.seek(0)
-        img = Image.open(file_stream_for_blip).convert(
-            'RGB')  # Ensure the image is in RGB format
-        max_size = (512, 512)
-        img.thumbnail(max_size, Image.Resampling.LANCZOS)
-
-        # Generate a caption using BLIP
-        inputs = blip_processor(images=img, return_tensors="pt")
-        outputs = blip_model.generate(**inputs, max_length=50, num_beams=5)
-        caption = blip_processor.decode(outputs[0], skip_special_tokens=True)
+        except TimeoutError:
+            return jsonify({"error": "Image captioning timed out. Please try again."}), 503
 
         # Use Google Generative AI to determine if the required item and caption are related
-        required_item = task.item.lower()
-        prompt = f"""
-        Analyze if the following image caption likely describes an image is related to the  required item.
-        Required item: "{required_item}"
-        Caption: "{caption}"
-        Try to be easy with this, and don't be too strict.
-        Consider synonyms, context, and partial matches (e.g., 'mug' for 'cup', 'car' in 'parking lot with cars').
-        Respond with 'true' if the item is likely present, 'false' if not,just "true" or "false".
-        """
-
         try:
-            response = model.generate_content(prompt)
-            relation = response.text.strip().lower()
+            relation = judge_relation(task.item.lower(), caption)
 
             if relation == "true":
                 if allowed_file(file.filename):
-                    # Delete old image if exists
-                    if task.image_link:
-                        old_image_path = os.path.join(
-                            current_app.static_folder, task.image_link)
-                        if os.path.exists(old_image_path):
-                            try:
-                                os.remove(old_image_path)
-                            except Exception:
-                                pass  # Continue even if deletion fails
-
-                    # Save new image
-                    filename = secure_filename(file.filename)
-                    image_folder = os.path.join(
-                        current_app.static_folder, 'task_images')
-                    os.makedirs(image_folder, exist_ok=True)
-                    image_path = os.path.join(image_folder, filename)
-
-                    file_stream_for_save.seek(0)
-                    with open(image_path, 'wb') as f:
-                        f.write(file_stream_for_save.read())
-
-                    # Update task
-                    task.image_link = f'task_images/{filename}'
-                    task.completed = True
+                    attach_task_image(task, file.stream, file.filename)
                     db.session.commit()
+                    invalidate_event(task.event_id)
 
                 return jsonify({
                     "success": True,
@@ -368,6 +367,7 @@ def complete_task_with_image(task_id):
             # Item not found
             task.completed = False
             db.session.commit()
+            invalidate_event(task.event_id)
             return jsonify({
                 "success": False,
                 "message": f"The required item was not found in the image. Please try again",
@@ -384,6 +384,69 @@ def complete_task_with_image(task_id):
         return jsonify({"error": f"An error occurred: {str(e)}"}), 500
 
 
+@task_router.route('/verify_jobs/<int:task_id>', methods=['POST'])
+@login_required
+def submit_verification_job(task_id):
+    """Queue a photo verification and return its job id without waiting for the models"""
+    try:
+        task = db.session.get(Task, task_id)
+        if not task:
+            return jsonify({"error": "Task not found"}), 404
+
+        if not task.item:
+            return jsonify({"error": "This task does not require an item to be verified."}), 400
+
+        file, error = _uploaded_photo()
+        if error:
+            return error
+
+        job = create_job(task, current_user.id, file)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"An error occurred: {str(e)}"}), 500
+
+    job_runner.notify(job.id)
+    data = {
+        "success": True,
+        **job_state(job),
+        "status_url": url_for('task_router.verification_job_status', job_id=job.id),
+    }
+    if current_app.config.get('VERIFY_JOB_EVENTS'):
+        data["events_url"] = url_for('task_router.verification_job_events', job_id=job.id)
+    return jsonify(data), 202
+
+
+def _own_job(job_id):
+    job = db.session.get(VerificationJob, job_id)
+    return job if job is not None and job.user_id == current_user.id else None
+
+
+@task_router.route('/verify_jobs/<job_id>', methods=['GET'])
+@login_required
+def verification_job_status(job_id):
+    job = _own_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({"success": True, **job_state(job)})
+
+
+@task_router.route('/verify_jobs/<job_id>/events', methods=['GET'])
+@login_required
+def verification_job_events(job_id):
+    config = current_app.config
+    if not config.get('VERIFY_JOB_EVENTS') or _own_job(job_id) is None:
+        return jsonify({"error": "Job not found"}), 404
+    # Each stream holds a request worker; past the cap, clients fall back to the status URL
+    if not open_job_stream(config.get('VERIFY_JOB_MAX_STREAMS', 4)):
+        return jsonify({"error": "Too many status streams; poll the status URL instead."}), 503
+    events = iter_job_events(job_id, config.get('VERIFY_JOB_EVENTS_TIMEOUT', 20),
+                             config.get('VERIFY_JOB_EVENTS_INTERVAL', 2.0))
+    response = event_stream_response(stream_with_context(events))
+    response.call_on_close(close_job_stream)
+    return response
+
+
 @task_router.route('/bypass_item/<int:task_id>', methods=['POST'])
 @login_required
 def bypass_item(task_id):
@@ -397,6 +460,7 @@ def bypass_item(task_id):
         task.item = None  # Example: Remove the item requirement
         task.completed = True  # Optionally mark the task as completed
         db.session.commit()
+        invalidate_event(task.event_id)
 
         return jsonify({"success": True, "message": "Task bypassed successfully."})
     except Exception as e:
@@ -424,6 +488,7 @@ def strict_mode(event_id):
         # Update the strict mode status
         event.strict_mode = strict_mode
         db.session.commit()
+        invalidate_checklist(event_id)
 
         return jsonify({
             "success": True,
@@ -451,6 +516,7 @@ def verify_task(task_id):
     task.completed = is_verified
     task.note = note
     db.session.commit()
+    invalidate_event(task.event_id)
 
     if is_verified:
         message = "Task verified successfully!"
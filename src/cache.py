@@ -0,0 +1,314 @@
+"""
+Pluggable cache for read-heavy pages (dashboard summaries, checklist data).
+
+Backends are chosen with CACHE_BACKEND:
+  - 'file':   pickled entries under CACHE_DIR, shared by every worker on the host,
+              pruned to CACHE_MAX_ENTRIES (default)
+  - 'memory': per-process LRU with TTL
+  - 'null':   caching disabled
+
+Writes invalidate cached pages by deleting their keys, which only reaches
+other processes through a shared backend. 'memory' is for a single process
+(the development server, tests); with several workers, the others would
+keep serving stale dashboards and checklists until the TTL runs out.
+
+A page being rebuilt while a write commits may have read the old rows, so
+a delete leaves a tombstone for CACHE_TOMBSTONE_TTL seconds. get_or_set
+passes the time it started computing, and the backend drops the value if
+the key was deleted at or after that time.
+
+Keys and invalidation rules for the app's data live in src.database.invalidation.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+
+class CacheStats:
+    """Hit/miss counters, shared by all backends"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.deletes = 0
+
+    def record(self, field, n=1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + n)
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "sets": self.sets,
+            "deletes": self.deletes,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class NullBackend:
+    name = 'null'
+    clock = staticmethod(time.monotonic)
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl, since=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+    def __len__(self):
+        return 0
+
+
+class MemoryBackend:
+    """Thread-safe LRU with per-entry expiry"""
+    name = 'memory'
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, max_entries=1024, tombstone_ttl=60):
+        self.max_entries = max_entries
+        self.tombstone_ttl = tombstone_ttl
+        self._data = OrderedDict()
+        self._deleted = OrderedDict()  # key -> monotonic delete time, oldest first
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl, since=None):
+        with self._lock:
+            deleted_at = self._deleted.get(key)
+            if since is not None and deleted_at is not None and deleted_at >= since:
+                return
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            now = time.monotonic()
+            self._deleted.pop(key, None)
+            self._deleted[key] = now
+            while next(iter(self._deleted.values())) < now - self.tombstone_ttl:
+                self._deleted.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class FileBackend:
+    """One pickle file per key; writes are atomic so workers can share the directory.
+
+    Each file's mtime is set to its expiry time, so pruning (every
+    ``prune_every`` writes by this process) only needs a directory scan:
+    expired entries and tombstones go first, then the entries closest to
+    expiry until at most ``max_entries`` remain.
+    """
+    name = 'file'
+    clock = staticmethod(time.time)  # shared by processes
+
+    def __init__(self, directory, max_entries=1024, tombstone_ttl=60, prune_every=100):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.tombstone_ttl = tombstone_ttl
+        self.prune_every = max(prune_every, 1)
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, suffix='.cache'):
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + suffix)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                expires_at, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires_at < time.time():
+            self._remove(path)
+            return None
+        return value
+
+    def set(self, key, value, ttl, since=None):
+        path = self._path(key)
+        expires_at = time.time() + ttl
+        if not self._write(path, (expires_at, value), expires_at):
+            return
+        # Checked after the write: a delete stores its tombstone before removing
+        # the entry, so either it removes this file or the tombstone is seen here
+        if since is not None and self._deleted_at(key) >= since:
+            self._remove(path)
+        if self._prune_due():
+            self.prune()
+
+    def delete(self, key):
+        now = time.time()
+        self._write(self._path(key, '.deleted'), now, now + self.tombstone_ttl)
+        self._remove(self._path(key))
+
+    def _deleted_at(self, key):
+        try:
+            with open(self._path(key, '.deleted'), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return float('-inf')
+
+    def _write(self, path, payload, expires_at):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.utime(tmp_path, (expires_at, expires_at))
+            os.replace(tmp_path, path)
+            return True
+        except OSError:
+            self._remove(tmp_path)
+            return False
+
+    def _prune_due(self):
+        with self._writes_lock:
+            self._writes += 1
+            return self._writes % self.prune_every == 0
+
+    def prune(self):
+        """Remove expired entries and tombstones, then the soonest-expiring entries over the cap"""
+        now = time.time()
+        live = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(('.cache', '.deleted')):
+                continue
+            try:
+                expires_at = entry.stat().st_mtime
+            except OSError:
+                continue
+            if expires_at < now:
+                self._remove(entry.path)
+            elif entry.name.endswith('.cache'):
+                live.append((expires_at, entry.path))
+        if len(live) > self.max_entries:
+            live.sort()
+            for _, path in live[:len(live) - self.max_entries]:
+                self._remove(path)
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(('.cache', '.deleted')):
+                self._remove(os.path.join(self.directory, name))
+
+    def __len__(self):
+        return sum(1 for name in os.listdir(self.directory) if name.endswith('.cache'))
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class Cache:
+    """Flask extension wrapping the configured backend"""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend_name = app.config.get('CACHE_BACKEND', 'file')
+        if backend_name == 'memory':
+            backend = MemoryBackend(
+                app.config.get('CACHE_MAX_ENTRIES', 1024),
+                tombstone_ttl=app.config.get('CACHE_TOMBSTONE_TTL', 60))
+        elif backend_name == 'file':
+            backend = FileBackend(
+                app.config['CACHE_DIR'],
+                max_entries=app.config.get('CACHE_MAX_ENTRIES', 1024),
+                tombstone_ttl=app.config.get('CACHE_TOMBSTONE_TTL', 60),
+                prune_every=app.config.get('CACHE_PRUNE_EVERY', 100))
+        elif backend_name == 'null':
+            backend = NullBackend()
+        else:
+            raise ValueError(f"Unknown CACHE_BACKEND: {backend_name!r}")
+        app.extensions['cache'] = {
+            'backend': backend,
+            'stats': CacheStats(),
+            'ttl': app.config.get('CACHE_DEFAULT_TTL', 300),
+        }
+
+    @property
+    def _state(self):
+        return current_app.extensions['cache']
+
+    @property
+    def backend(self):
+        return self._state['backend']
+
+    def get(self, key):
+        value = self.backend.get(key)
+        self._state['stats'].record('hits' if value is not None else 'misses')
+        return value
+
+    def set(self, key, value, ttl=None, since=None):
+        """Store a value; with ``since``, skip it if the key was deleted at or after that time"""
+        self.backend.set(key, value, ttl or self._state['ttl'], since=since)
+        self._state['stats'].record('sets')
+
+    def get_or_set(self, key, factory, ttl=None):
+        """Return the cached value, computing and storing it on a miss.
+
+        A None result is returned but not stored. The value is not stored if
+        the key was deleted while ``factory`` ran (its rows may predate the write).
+        """
+        value = self.get(key)
+        if value is None:
+            since = self.backend.clock()
+            value = factory()
+            if value is not None:
+                self.set(key, value, ttl, since=since)
+        return value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.backend.delete(key)
+        self._state['stats'].record('deletes', len(keys))
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        stats = self._state['stats'].as_dict()
+        stats['backend'] = self.backend.name
+        stats['entries'] = len(self.backend)
+        return stats
+
@@ -0,0 +1,243 @@
+"""
+iCalendar (RFC 5545) feeds of tasks, streamed as text.
+
+Besides the session-authenticated feed, every user and event can have a
+secret-token subscription (CalendarFeed) whose rendered body is stored.
+Task writes mark the affected stored bodies stale in the same transaction
+(see the flush hooks in src.database.models). After commit, the ids of
+those feeds go to a single background worker, which waits
+CALENDAR_FEED_DEBOUNCE seconds so a burst of writes is rebuilt once; a poll
+that still finds a stale row rebuilds it inline.
+"""
+import hashlib
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app, url_for
+import sqlalchemy as sqla
+import sqlalchemy.orm as sqlo
+from src import db
+from src.database.models import CalendarFeed, Event, Task, task_assignments
+
+PRODID = '-//EventEase//Task Calendar//EN'
+FETCH_SIZE = 500
+
+
+def _dated_tasks():
+    return (
+        sqla.select(
+            Task.id,
+            Task.description,
+            Task.priority,
+            Task.due_date,
+            Event.name.label('event_name'),
+        )
+        .outerjoin(Event, Event.id == Task.event_id)
+        .where(Task.due_date.is_not(None))
+        .order_by(Task.due_date.asc(), Task.id.asc())
+    )
+
+
+def event_feed_query(event_id):
+    """Every dated task of one event"""
+    return _dated_tasks().where(Task.event_id == event_id)
+
+
+def feed_query(user_id, start=None, end=None):
+    """One joined query for every dated task assigned to the user"""
+    query = (
+        _dated_tasks()
+        .join(task_assignments, task_assignments.c.task_id == Task.id)
+        .where(task_assignments.c.user_id == user_id)
+    )
+    if start is not None:
+        query = query.where(Task.due_date >= start)
+    if end is not None:
+        query = query.where(Task.due_date < end)
+    return query
+
+
+def escape_text(value):
+    return (value.replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def fold(line):
+    """Fold a content line at 75 octets as required by RFC 5545"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts, limit = [], 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Never split a multi-byte UTF-8 sequence
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+        limit = 74  # continuation lines start with a space
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def format_datetime(value):
+    return value.strftime('%Y%m%dT%H%M%SZ')
+
+
+def vevent(row, stamp):
+    return ''.join((
+        'BEGIN:VEVENT\r\n',
+        fold(f'UID:task-{row.id}@eventease'),
+        f'DTSTAMP:{stamp}\r\n',
+        f'DTSTART:{format_datetime(row.due_date)}\r\n',
+        f'DTEND:{format_datetime(row.due_date + timedelta(days=1))}\r\n',
+        fold(f'SUMMARY:{escape_text(row.description)}'),
+        fold(f"DESCRIPTION:{escape_text(row.event_name or 'No Event Description')}"),
+        f'PRIORITY:{row.priority}\r\n',
+        'END:VEVENT\r\n',
+    ))
+
+
+def iter_feed(query, name='EventEase'):
+    """Yield the calendar in chunks while rows are still being fetched"""
+    stamp = format_datetime(datetime.utcnow())
+    yield ('BEGIN:VCALENDAR\r\nVERSION:2.0\r\n'
+           f'PRODID:{PRODID}\r\n' + fold(f'X-WR-CALNAME:{escape_text(name)}'))
+    result = db.session.execute(query.execution_options(yield_per=FETCH_SIZE))
+    for rows in result.partitions():
+        yield ''.join(vevent(row, stamp) for row in rows)
+    yield 'END:VCALENDAR\r\n'
+
+
+def parse_range(args):
+    """Read the optional ``from``/``to`` dates; raises ValueError when malformed"""
+    start = args.get('from')
+    end = args.get('to')
+    start = datetime.fromisoformat(start) if start else None
+    end = datetime.fromisoformat(end) if end else None
+    if start and end and end < start:
+        raise ValueError("'to' must not be before 'from'")
+    return start, end
+
+
+def feed_etag(user, start, end):
+    """Strong validator: changes only when the user's calendar_version or the range changes"""
+    window = f"{start.isoformat() if start else ''}~{end.isoformat() if end else ''}"
+    return f"cal-{user.id}-{user.calendar_version}-{window}"
+
+
+def build_subscription(feed_id):
+    """Render and store one subscription feed; returns (body, etag, generated_at).
+
+    The body is only stored if the feed was not invalidated again while it
+    was being rendered; the caller still gets the freshly rendered body.
+    """
+    feed = db.session.execute(
+        sqla.select(CalendarFeed.user_id, CalendarFeed.event_id, CalendarFeed.revision)
+        .where(CalendarFeed.id == feed_id)
+    ).one()
+    if feed.event_id is not None:
+        event_name = db.session.scalar(sqla.select(Event.name).where(Event.id == feed.event_id))
+        body = ''.join(iter_feed(event_feed_query(feed.event_id), name=event_name or 'EventEase'))
+    else:
+        body = ''.join(iter_feed(feed_query(feed.user_id)))
+
+    etag = hashlib.sha256(body.encode('utf-8')).hexdigest()[:32]
+    generated_at = datetime.utcnow()
+    db.session.execute(
+        sqla.update(CalendarFeed)
+        .where(CalendarFeed.id == feed_id, CalendarFeed.revision == feed.revision)
+        .values(body=body, etag=etag, generated_at=generated_at)
+    )
+    db.session.commit()
+    return body, etag, generated_at
+
+
+def rebuild_subscriptions(feed_ids=None):
+    """Render those of ``feed_ids`` (default: every feed) that are still stale; returns how many"""
+    query = sqla.select(CalendarFeed.id).where(CalendarFeed.body.is_(None))
+    if feed_ids is not None:
+        query = query.where(CalendarFeed.id.in_(feed_ids))
+    feed_ids = db.session.scalars(query).all()
+    for feed_id in feed_ids:
+        build_subscription(feed_id)
+    return len(feed_ids)
+
+
+def subscription_url(feed):
+    return url_for('main.calendar_subscription_feed', token=feed.token, _external=True)
+
+
+def _rebuild_in_app(app, feed_ids):
+    with app.app_context():
+        try:
+            rebuild_subscriptions(feed_ids)
+        except Exception as e:
+            current_app.logger.error(f"Calendar feed rebuild failed: {str(e)}")
+        finally:
+            db.session.remove()
+
+
+class FeedRebuildWorker:
+    """A single daemon thread that rebuilds the feeds handed to it.
+
+    After the first submission of a burst it waits ``debounce`` seconds,
+    then rebuilds the union of everything submitted meanwhile in one pass.
+    """
+
+    def __init__(self, rebuild=_rebuild_in_app):
+        self.rebuild = rebuild
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, app, feed_ids, debounce=0.0):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._queue.put((app, set(feed_ids), debounce))
+
+    def join(self):
+        """Block until every submitted feed has been processed"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            batches = [self._queue.get()]
+            time.sleep(batches[0][2])
+            while True:
+                try:
+                    batches.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            pending = {}
+            for app, feed_ids, _ in batches:
+                pending.setdefault(app, set()).update(feed_ids)
+            try:
+                for app, feed_ids in pending.items():
+                    self.rebuild(app, feed_ids)
+            except Exception as e:
+                app.logger.error(f"Calendar feed rebuild failed: {str(e)}")
+            finally:
+                for _ in batches:
+                    self._queue.task_done()
+
+
+rebuild_worker = FeedRebuildWorker()
+
+
+@sqla.event.listens_for(sqlo.Session, 'after_commit')
+def schedule_subscription_rebuild(session):
+    feed_ids = session.info.pop('stale_calendar_feeds', None)
+    if not feed_ids:
+        return
+    if not current_app or not current_app.config.get('CALENDAR_FEED_PRECOMPUTE', True):
+        return
+    rebuild_worker.submit(current_app._get_current_object(), feed_ids,
+                          current_app.config.get('CALENDAR_FEED_DEBOUNCE', 0.5))
+
+
+@sqla.event.listens_for(sqlo.Session, 'after_rollback')
+def forget_stale_subscriptions(session):
+    session.info.pop('stale_calendar_feeds', None)
@@ -0,0 +1,456 @@
+"""
+Image captioning service for item verification.
+
+The BLIP model lives in dedicated worker processes instead of on the
+request threads. Requests go into one queue; each worker takes the first
+waiting image, gathers whatever else arrives within CAPTION_MAX_WAIT_MS (up
+to CAPTION_MAX_BATCH_SIZE images) and captions them with a single batched
+``generate`` call. Routes block on a future with CAPTION_TIMEOUT.
+
+By default every Flask process starts its own pool on first use, or on its
+first request with CAPTION_PRELOAD; each worker runs one warm-up inference
+before taking requests. CAPTION_MODE picks fp32, dynamic int8 quantization or
+torch.compile, and CAPTION_NUM_BEAMS the decoding (1 = greedy). Setting
+CAPTION_SERVICE_ADDRESS points the app at a shared pool started with
+``flask caption serve`` instead, so a host runs CAPTION_WORKERS model
+copies in total rather than one per Flask worker.
+
+The shared pool authenticates clients with CAPTION_SERVICE_KEY, which must
+be set and differ from SECRET_KEY, and listens on loopback unless told
+otherwise. Nothing on the wire is pickled: requests carry the image's raw
+RGB pixels and replies are JSON.
+"""
+import ipaddress
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import struct
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Listener
+
+DEFAULT_MODEL = 'Salesforce/blip-image-captioning-base'
+CAPTION_MODES = ('fp32', 'int8', 'compile')
+# The route downsizes images to this before they are queued
+MAX_IMAGE_SIZE = (512, 512)
+
+
+def open_for_captioning(stream, size=MAX_IMAGE_SIZE):
+    """Decode an uploaded image once, upright, in RGB and no larger than ``size``.
+
+    JPEGs use draft mode, so libjpeg scales by 1/2 to 1/8 while decoding and
+    the full-resolution bitmap never exists; other formats use reduce-on-load
+    in ``thumbnail``. Raises OSError (or a subclass) when ``stream`` is not a
+    valid image.
+    """
+    from PIL import Image, ImageOps
+
+    img = Image.open(stream)
+    # Both dimensions stay >= size, so a rotated photo still fills the target
+    img.draft('RGB', size)
+    img = ImageOps.exif_transpose(img)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    img.thumbnail(size, Image.Resampling.LANCZOS)
+    return img
+
+
+class CaptionUnavailable(RuntimeError):
+    """The captioning model could not be loaded or failed on a batch"""
+
+
+def _apply_mode(model, mode):
+    """Return the model prepared for the configured execution mode"""
+    import torch
+
+    if mode == 'fp32':
+        return model
+    if mode == 'int8':
+        # Dynamic quantization: int8 weights for every Linear layer, activations quantized on the fly
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if mode == 'compile':
+        # generate() is not traceable as a whole; compile the two networks it calls
+        model.vision_model = torch.compile(model.vision_model)
+        model.text_decoder = torch.compile(model.text_decoder)
+        return model
+    raise ValueError(f"Unknown CAPTION_MODE: {mode!r}")
+
+
+def load_blip_captioner(settings):
+    """Load BLIP and return a function captioning a list of RGB images in one batch.
+
+    ``settings`` keys: model, mode ('fp32', 'int8' or 'compile'), num_beams
+    (1 = greedy), max_length, threads (torch intra-op threads, 0 = default)
+    and warmup (run one inference before returning).
+    """
+    import torch
+    from PIL import Image
+    from transformers import BlipForConditionalGeneration, BlipProcessor
+
+    if settings.get('threads'):
+        torch.set_num_threads(settings['threads'])
+    model_name = settings.get('model', DEFAULT_MODEL)
+    processor = BlipProcessor.from_pretrained(model_name, use_fast=True)
+    model = BlipForConditionalGeneration.from_pretrained(model_name)
+    model.eval()
+    model = _apply_mode(model, settings.get('mode', 'fp32'))
+    num_beams = settings.get('num_beams', 5)
+    generate_kwargs = {
+        'max_length': settings.get('max_length', 50),
+        'num_beams': num_beams,
+        'do_sample': False,
+    }
+    if num_beams > 1:
+        generate_kwargs['early_stopping'] = True
+
+    def caption_batch(images):
+        inputs = processor(images=images, return_tensors='pt')
+        with torch.inference_mode():
+            outputs = model.generate(**inputs, **generate_kwargs)
+        return processor.batch_decode(outputs, skip_special_tokens=True)
+
+    if settings.get('warmup', True):
+        # The first generate call allocates buffers (and compiles, in 'compile' mode)
+        caption_batch([Image.new('RGB', MAX_IMAGE_SIZE)])
+    return caption_batch
+
+
+def collect_batch(requests, max_batch_size, max_wait):
+    """Block for one request, then take more until the batch is full or ``max_wait`` passes.
+
+    Returns (batch, stop); ``stop`` is set when the shutdown sentinel (None)
+    was read, after any requests that arrived before it.
+    """
+    first = requests.get()
+    if first is None:
+        return [], True
+    batch = [first]
+    deadline = time.monotonic() + max_wait
+    while len(batch) < max_batch_size:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            item = requests.get(timeout=remaining)
+        except queue.Empty:
+            break
+        if item is None:
+            return batch, True
+        batch.append(item)
+    return batch, False
+
+
+def serve_batches(load, settings, requests, results, max_batch_size, max_wait):
+    """Worker loop: load the model once, then caption batches until the sentinel arrives"""
+    try:
+        caption_batch = load(settings)
+        load_error = None
+    except Exception as e:
+        caption_batch = None
+        load_error = f"Failed to load captioning model: {str(e)}"
+
+    stop = False
+    while not stop:
+        batch, stop = collect_batch(requests, max_batch_size, max_wait)
+        if not batch:
+            continue
+        if load_error:
+            for request_id, _ in batch:
+                results.put((request_id, None, load_error))
+            continue
+        try:
+            captions = caption_batch([image for _, image in batch])
+        except Exception as e:
+            for request_id, _ in batch:
+                results.put((request_id, None, f"Captioning failed: {str(e)}"))
+            continue
+        for (request_id, _), caption in zip(batch, captions):
+            results.put((request_id, caption.strip(), None))
+    # Let the next worker see the sentinel too
+    requests.put(None)
+
+
+class CaptionService:
+    """A pool of captioning workers behind a shared request queue.
+
+    Starts ``processes`` worker processes, each loading its own model;
+    ``processes=0`` runs one worker thread in this process instead.
+    """
+
+    def __init__(self, load=load_blip_captioner, settings=None, processes=1,
+                 max_batch_size=8, max_wait=0.02):
+        self.load = load
+        self.settings = settings or {}
+        self.processes = processes
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._futures = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._listener = None
+
+    def start(self):
+        args = (self.load, self.settings)
+        if self.processes:
+            # Forking a process that may hold model threads is unsafe
+            ctx = multiprocessing.get_context('spawn')
+            self._requests, self._results = ctx.Queue(), ctx.Queue()
+            workers = [ctx.Process(target=serve_batches, daemon=True,
+                                   args=(*args, self._requests, self._results,
+                                         self.max_batch_size, self.max_wait))
+                       for _ in range(self.processes)]
+        else:
+            self._requests, self._results = queue.Queue(), queue.Queue()
+            workers = [threading.Thread(target=serve_batches, daemon=True,
+                                        args=(*args, self._requests, self._results,
+                                              self.max_batch_size, self.max_wait))]
+        for worker in workers:
+            worker.start()
+        self._workers = workers
+        self._listener = threading.Thread(target=self._resolve, daemon=True)
+        self._listener.start()
+        return self
+
+    def _resolve(self):
+        while True:
+            message = self._results.get()
+            if message is None:
+                break
+            request_id, caption, error = message
+            with self._lock:
+                future = self._futures.pop(request_id, None)
+            if future is None:
+                continue  # cancelled by close()
+            if error:
+                future.set_exception(CaptionUnavailable(error))
+            else:
+                future.set_result(caption)
+
+    def submit(self, image):
+        """Queue an RGB PIL image; returns a Future resolving to its caption"""
+        future = Future()
+        request_id = next(self._ids)
+        with self._lock:
+            self._futures[request_id] = future
+        self._requests.put((request_id, image))
+        return future
+
+    def caption(self, image, timeout=None):
+        """Caption one image, raising TimeoutError if no worker answers in time"""
+        return self.submit(image).result(timeout=timeout)
+
+    def close(self):
+        self._requests.put(None)
+        for worker in self._workers:
+            worker.join(timeout=5)
+        self._results.put(None)
+        with self._lock:
+            futures, self._futures = list(self._futures.values()), {}
+        for future in futures:
+            future.cancel()
+
+
+def parse_address(address):
+    host, _, port = address.rpartition(':')
+    return host or 'localhost', int(port)
+
+
+def listen_address(address, allow_remote=False):
+    """The (host, port) to serve on; raises ValueError for a non-loopback host unless ``allow_remote``"""
+    host, port = parse_address(address)
+    try:
+        loopback = host == 'localhost' or ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        loopback = False
+    if not loopback and not allow_remote:
+        raise ValueError(f"Refusing to listen on non-loopback address {host!r}; pass --allow-remote to do so")
+    return host, port
+
+
+def service_key(config):
+    """CAPTION_SERVICE_KEY as bytes; raises ValueError unless a dedicated key is set"""
+    key = config.get('CAPTION_SERVICE_KEY')
+    if not key or key == config.get('SECRET_KEY'):
+        raise ValueError("CAPTION_SERVICE_KEY must be set, and differ from SECRET_KEY, "
+                         "to use the shared captioning service")
+    return key.encode()
+
+
+# A request is its id, the image's width and height, then width * height RGB pixels
+REQUEST_HEADER = struct.Struct('>QHH')
+MAX_REQUEST_BYTES = REQUEST_HEADER.size + MAX_IMAGE_SIZE[0] * MAX_IMAGE_SIZE[1] * 3
+
+
+def encode_request(request_id, image):
+    image = image.convert('RGB')
+    return REQUEST_HEADER.pack(request_id, *image.size) + image.tobytes()
+
+
+def decode_request(data):
+    """(request_id, image) from encode_request's bytes; raises ValueError when malformed"""
+    from PIL import Image
+
+    if len(data) < REQUEST_HEADER.size:
+        raise ValueError("Truncated caption request")
+    request_id, width, height = REQUEST_HEADER.unpack_from(data)
+    if not (0 < width <= MAX_IMAGE_SIZE[0] and 0 < height <= MAX_IMAGE_SIZE[1]):
+        raise ValueError(f"Image size {width}x{height} is out of range")
+    if len(data) - REQUEST_HEADER.size != width * height * 3:
+        raise ValueError("Pixel data does not match the image size")
+    return request_id, Image.frombytes('RGB', (width, height), data[REQUEST_HEADER.size:])
+
+
+class RemoteCaptioner:
+    """Client for a pool started with ``flask caption serve``; one connection per process"""
+
+    def __init__(self, address, authkey):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self._connection = None
+        self._futures = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = Client(self.address, authkey=self.authkey)
+            threading.Thread(target=self._resolve, args=(self._connection,), daemon=True).start()
+        return self._connection
+
+    def _resolve(self, connection):
+        try:
+            while True:
+                request_id, caption, error = json.loads(connection.recv_bytes())
+                with self._lock:
+                    future = self._futures.pop(request_id, None)
+                if future is None:
+                    continue
+                if error:
+                    future.set_exception(CaptionUnavailable(error))
+                else:
+                    future.set_result(caption)
+        except (EOFError, OSError):
+            with self._lock:
+                if self._connection is connection:
+                    self._connection = None
+                futures, self._futures = list(self._futures.values()), {}
+            for future in futures:
+                future.set_exception(CaptionUnavailable("Lost connection to the captioning service"))
+
+    def submit(self, image):
+        future = Future()
+        request_id = next(self._ids)
+        with self._lock:
+            try:
+                connection = self._connect()
+                self._futures[request_id] = future
+                connection.send_bytes(encode_request(request_id, image))
+            except (OSError, EOFError, multiprocessing.AuthenticationError) as e:
+                self._futures.pop(request_id, None)
+                self._connection = None
+                future.set_exception(CaptionUnavailable(f"Captioning service unreachable: {str(e)}"))
+        return future
+
+    def caption(self, image, timeout=None):
+        return self.submit(image).result(timeout=timeout)
+
+
+def serve(service, address, authkey, allow_remote=False):
+    """Accept RemoteCaptioner connections and feed their images into ``service`` (blocks)"""
+    with Listener(listen_address(address, allow_remote), authkey=authkey) as listener:
+        while True:
+            try:
+                connection = listener.accept()
+            except (multiprocessing.AuthenticationError, OSError, EOFError):
+                # A client with the wrong key (or one that hung up) must not stop the service
+                continue
+            threading.Thread(target=_serve_connection, args=(service, connection), daemon=True).start()
+
+
+def _serve_connection(service, connection):
+    send_lock = threading.Lock()
+
+    def reply(request_id, future):
+        error = caption = None
+        try:
+            caption = future.result()
+        except Exception as e:
+            error = str(e)
+        with send_lock:
+            try:
+                connection.send_bytes(json.dumps([request_id, caption, error]).encode())
+            except OSError:
+                pass
+
+    try:
+        while True:
+            request_id, image = decode_request(connection.recv_bytes(MAX_REQUEST_BYTES))
+            future = service.submit(image)
+            future.add_done_callback(lambda f, request_id=request_id: reply(request_id, f))
+    except (EOFError, OSError, ValueError):
+        # A malformed or oversized request ends the connection
+        connection.close()
+
+
+_captioner_lock = threading.Lock()
+
+
+def service_settings(config):
+    return {
+        'model': config.get('CAPTION_MODEL', DEFAULT_MODEL),
+        'mode': config.get('CAPTION_MODE', 'fp32'),
+        'num_beams': config.get('CAPTION_NUM_BEAMS', 5),
+        'max_length': config.get('CAPTION_MAX_LENGTH', 50),
+        'threads': config.get('CAPTION_TORCH_THREADS', 0),
+        'warmup': config.get('CAPTION_WARMUP', True),
+    }
+
+
+def create_service(config):
+    if config.get('CAPTION_MODE', 'fp32') not in CAPTION_MODES:
+        raise ValueError(f"CAPTION_MODE must be one of {', '.join(CAPTION_MODES)}")
+    return CaptionService(
+        settings=service_settings(config),
+        processes=config.get('CAPTION_WORKERS', 1),
+        max_batch_size=config.get('CAPTION_MAX_BATCH_SIZE', 8),
+        max_wait=config.get('CAPTION_MAX_WAIT_MS', 20) / 1000,
+    )
+
+
+def set_captioner(app, captioner):
+    app.extensions['captioner'] = {'client': captioner, 'pid': os.getpid()}
+
+
+def get_captioner(app):
+    """The captioner for ``app``: a remote client or a local pool started on first use"""
+    with _captioner_lock:
+        state = app.extensions.get('captioner')
+        # A forked Flask worker must not reuse its parent's queues or connection
+        if state is None or state['pid'] != os.getpid():
+            address = app.config.get('CAPTION_SERVICE_ADDRESS')
+            if address:
+                captioner = RemoteCaptioner(address, service_key(app.config))
+            else:
+                captioner = create_service(app.config).start()
+            set_captioner(app, captioner)
+        return app.extensions['captioner']['client']
+
+
+def init_caption_preload(app):
+    """With CAPTION_PRELOAD, start the pool on the web server's first request instead of its first upload.
+
+    CLI commands never serve a request, so they never load the model
+    ('flask caption serve' starts its own pool).
+    """
+    if not app.config.get('CAPTION_PRELOAD') or app.testing:
+        return
+
+    @app.before_request
+    def preload_captioner():
+        state = app.extensions.get('captioner')
+        if state is None or state['pid'] != os.getpid():
+            get_captioner(app)
@@ -0,0 +1,108 @@
+"""
+Maintenance commands registered on the ``flask`` CLI
+"""
+import time
+import click
+from flask.cli import AppGroup
+from flask import current_app
+from src import db
+from src.database.models import find_counter_drift, recompute_event_counters
+from src.calendar_feed import rebuild_subscriptions
+from src.uploads import collect_orphaned_uploads
+from src.captioning import create_service, listen_address, serve, service_key
+from src.verification_jobs import start_verification_jobs
+
+counters_cli = AppGroup('counters', help='Inspect and repair Event progress counters.')
+uploads_cli = AppGroup('uploads', help='Maintain files uploaded under the static folder.')
+caption_cli = AppGroup('caption', help='Run the image captioning service.')
+verify_cli = AppGroup('verify', help='Run background photo verification jobs.')
+calendar_cli = AppGroup('calendar', help='Maintain stored calendar subscription feeds.')
+
+
+@counters_cli.command('verify')
+def verify_counters():
+    """Compare stored counters against the Task table and list any drift."""
+    drift = find_counter_drift()
+    for event_id, stored, actual in drift:
+        click.echo(f"event {event_id}: stored tasks/completed={stored[0]}/{stored[1]}, "
+                   f"actual={actual[0]}/{actual[1]}")
+    if drift:
+        click.echo(f"{len(drift)} event(s) out of sync. Run 'flask counters rebuild' to repair.")
+        raise SystemExit(1)
+    click.echo("All event counters are in sync.")
+
+
+@counters_cli.command('rebuild')
+def rebuild_counters():
+    """Recompute every event's counters from the Task table."""
+    drifted = len(find_counter_drift())
+    updated = recompute_event_counters()
+    db.session.commit()
+    click.echo(f"Recomputed counters for {updated} event(s); {drifted} had drifted.")
+
+
+@uploads_cli.command('gc')
+@click.option('--dry-run', is_flag=True, help='Report orphans without deleting them.')
+@click.option('--batch-size', default=500, show_default=True, help='Files checked per query.')
+@click.option('--max-removals', type=int, default=None, help='Stop after this many orphans.')
+@click.option('--min-age', type=int, default=None, help='Skip files newer than this many seconds.')
+@click.option('--pause', type=float, default=None, help='Seconds to sleep between batches.')
+def collect_uploads(dry_run, batch_size, max_removals, min_age, pause):
+    """Delete uploaded files that no task or user references."""
+    config = current_app.config
+    report = collect_orphaned_uploads(
+        current_app.static_folder,
+        batch_size=batch_size,
+        max_removals=max_removals if max_removals is not None else (config.get('UPLOAD_GC_MAX_REMOVALS') or None),
+        min_age=min_age if min_age is not None else config.get('UPLOAD_GC_MIN_AGE', 3600),
+        pause=pause if pause is not None else config.get('UPLOAD_GC_PAUSE', 0.0),
+        dry_run=dry_run,
+    )
+    verb = 'Would reclaim' if dry_run else 'Reclaimed'
+    click.echo(f"Scanned {report['scanned']} file(s), {report['orphaned']} orphaned. "
+               f"{verb} {report['reclaimed_bytes']} bytes ({report['removed']} file(s) removed).")
+
+
+@calendar_cli.command('rebuild')
+def rebuild_calendar_feeds():
+    """Render every subscription feed invalidated since it was last stored.
+
+    Run from cron when CALENDAR_FEED_PRECOMPUTE is off, or after a restart
+    dropped rebuilds still queued in a web process.
+    """
+    rebuilt = rebuild_subscriptions()
+    click.echo(f"Rebuilt {rebuilt} calendar feed(s).")
+
+
+@caption_cli.command('serve')
+@click.option('--address', default=None, help="host:port to listen on (default: CAPTION_SERVICE_ADDRESS).")
+@click.option('--allow-remote', is_flag=True, help="Allow listening on a non-loopback address.")
+def serve_captions(address, allow_remote):
+    """Run a shared captioning pool for every Flask worker on this host."""
+    address = address or current_app.config.get('CAPTION_SERVICE_ADDRESS') or 'localhost:6001'
+    try:
+        authkey = service_key(current_app.config)
+        listen_address(address, allow_remote)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    service = create_service(current_app.config).start()
+    click.echo(f"Captioning service with {service.processes} worker(s) listening on {address}")
+    try:
+        serve(service, address, authkey, allow_remote)
+    finally:
+        service.close()
+
+
+@verify_cli.command('work')
+@click.option('--workers', type=int, default=None,
+              help="Worker threads (default: VERIFY_JOB_WORKERS, or 2 when the web server runs none).")
+def work(workers):
+    """Claim and run queued verification jobs until interrupted."""
+    workers = workers or current_app.config.get('VERIFY_JOB_WORKERS') or 2
+    runner = start_verification_jobs(current_app._get_current_object(), workers)
+    click.echo(f"Verification worker running {workers} thread(s); press Ctrl+C to stop")
+    try:
+        while runner.running:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
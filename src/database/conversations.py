@@ -0,0 +1,104 @@
+"""
+Server-side state for the clarifying-question chat in create_event_and_tasks.
+
+The client sends only its latest message and the conversation id it was
+given; the turns are stored in the ``conversation`` table and expire
+CONVERSATION_TTL seconds after the last reply. Prompts get a transcript
+compacted to CONVERSATION_TOKEN_BUDGET estimated tokens: the first message
+(the event description) and the most recent turns are kept, and the turns
+in between are replaced by a note saying how many were left out.
+"""
+from datetime import datetime, timedelta
+import secrets
+import sqlalchemy as sqla
+from src import db
+from src.database.models import Conversation
+
+# Rough size of a token in English text; close enough to budget a prompt without a tokenizer
+CHARS_PER_TOKEN = 4
+SPEAKERS = {'user': 'User', 'bot': 'Bot'}
+# Room left for the "[n earlier message(s) omitted]" line
+NOTE_TOKENS = 8
+
+
+def estimate_tokens(text):
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def turns_from_history(history):
+    """Turns from the ["User: ...", "Bot: ..."] list older clients send with every request"""
+    turns = []
+    for line in history or []:
+        speaker, separator, text = str(line).partition(': ')
+        if not separator:
+            speaker, text = 'User', speaker
+        turns.append({"role": 'bot' if speaker == 'Bot' else 'user', "text": text})
+    return turns
+
+
+def start_conversation(user_id, event_id, turns=(), question_index=0, ttl=3600):
+    """Add a conversation and drop the ones that have expired; the caller commits"""
+    purge_expired_conversations(ttl)
+    conversation = Conversation(id=secrets.token_hex(16), user_id=user_id, event_id=event_id,
+                                turns=list(turns), question_index=question_index)
+    db.session.add(conversation)
+    db.session.flush()
+    return conversation
+
+
+def get_conversation(conversation_id, user_id, ttl):
+    """The user's conversation, or None once it is unknown or has expired"""
+    conversation = db.session.get(Conversation, conversation_id)
+    if conversation is None or conversation.user_id != user_id:
+        return None
+    if conversation.updated_at < datetime.utcnow() - timedelta(seconds=ttl):
+        return None
+    return conversation
+
+
+def record_exchange(conversation, user_text, bot_text):
+    """Append a question and answer and move to the next step; the caller commits"""
+    conversation.turns = conversation.turns + [{"role": 'user', "text": user_text},
+                                               {"role": 'bot', "text": bot_text}]
+    conversation.question_index += 1
+    conversation.updated_at = datetime.utcnow()
+
+
+def end_conversation(conversation):
+    """Delete a conversation once its checklist is saved; the caller commits"""
+    db.session.delete(conversation)
+
+
+def purge_expired_conversations(ttl):
+    """Delete conversations idle for more than ``ttl`` seconds; returns how many"""
+    cutoff = datetime.utcnow() - timedelta(seconds=ttl)
+    return db.session.execute(
+        sqla.delete(Conversation).where(Conversation.updated_at < cutoff)).rowcount
+
+
+def _clip(line, tokens):
+    limit = max(tokens, 1) * CHARS_PER_TOKEN
+    return line if len(line) <= limit else line[:limit - 1].rstrip() + '…'
+
+
+def compact_transcript(turns, budget):
+    """The turns as "Speaker: text" lines, within ``budget`` estimated tokens"""
+    lines = [f"{SPEAKERS.get(turn['role'], 'User')}: {turn['text']}" for turn in turns]
+    if sum(estimate_tokens(line) for line in lines) <= budget:
+        return '\n'.join(lines)
+
+    # The event description always stays, but may use at most half of the budget
+    first = _clip(lines[0], budget // 2)
+    used = estimate_tokens(first) + NOTE_TOKENS
+    recent = []
+    for line in reversed(lines[1:]):
+        if used + estimate_tokens(line) > budget:
+            break
+        recent.insert(0, line)
+        used += estimate_tokens(line)
+    if not recent and len(lines) > 1:
+        # The latest turn matters most; keep as much of it as fits
+        recent = [_clip(lines[-1], budget - used)]
+    omitted = len(lines) - 1 - len(recent)
+    note = [f"[{omitted} earlier message(s) omitted]"] if omitted else []
+    return '\n'.join([first] + note + recent)
@@ -0,0 +1,35 @@
+"""
+Set-based event writes.
+
+Deleting an event is a single DELETE: tasks, task assignments, participant
+rows and the event's calendar subscription go with it through the
+``ON DELETE CASCADE`` foreign keys (enabled for SQLite in
+src.database.models). The caller commits and then removes the image files.
+"""
+import sqlalchemy as sqla
+import sqlalchemy.orm as sqlo
+from src import db
+from src.database.models import Event, Task, assignees_of, record_calendar_changes
+
+
+def delete_events(event_ids):
+    """Delete events and everything hanging off them; returns the image links to clean up"""
+    event_ids = set(event_ids)
+    if not event_ids:
+        return []
+    connection = db.session.connection()
+    # One projection for what the session and the file cleanup need afterwards
+    tasks = db.session.execute(
+        sqla.select(Task.id, Task.image_link).where(Task.event_id.in_(event_ids))).all()
+    # Read while the assignments still exist
+    calendar_user_ids = assignees_of(connection, event_ids=event_ids)
+
+    db.session.execute(sqla.delete(Event).where(Event.id.in_(event_ids)))
+
+    # Loaded tasks were removed by the database, not by the session
+    for task_id, _ in tasks:
+        task = db.session.identity_map.get(sqlo.util.identity_key(Task, task_id))
+        if task is not None:
+            db.session.expunge(task)
+    record_calendar_changes(db.session, calendar_user_ids)
+    return [image_link for _, image_link in tasks if image_link]
@@ -0,0 +1,40 @@
+"""
+Friendship lookups backed by a cached per-user set of friend ids.
+
+Friendships are directed rows in ``friendships`` (user_id -> friend_id).
+The first lookup for a user loads all of their friend ids with one query;
+later ones are answered from the cache. Routes that add or remove friends
+call invalidate_friend_ids after commit, which only reaches other workers
+through a shared CACHE_BACKEND (see src.cache).
+"""
+import sqlalchemy as sqla
+from src import db, cache
+from src.database.models import friendships
+
+
+def friend_ids_key(user_id):
+    return f"friend_ids:{user_id}"
+
+
+def friend_ids(user_id):
+    """All friend ids of a user, loaded once and then served from the cache"""
+    return cache.get_or_set(friend_ids_key(user_id), lambda: frozenset(db.session.scalars(
+        sqla.select(friendships.c.friend_id).where(friendships.c.user_id == user_id)
+    ).all()))
+
+
+def is_friend(user_id, other_id):
+    """Membership in the user's cached friend-id set"""
+    return other_id in friend_ids(user_id)
+
+
+def friends_among(user_id, candidate_ids):
+    """The subset of ``candidate_ids`` that are friends of the user"""
+    candidate_ids = {int(candidate_id) for candidate_id in candidate_ids}
+    if not candidate_ids:
+        return set()
+    return candidate_ids & friend_ids(user_id)
+
+
+def invalidate_friend_ids(*user_ids):
+    cache.delete(*(friend_ids_key(user_id) for user_id in user_ids))
@@ -0,0 +1,61 @@
+"""
+Cache keys for event data and the rules for dropping them.
+
+Routes call these helpers after they commit. A request that read the
+old rows just before the commit may still be rebuilding the same page;
+the delete leaves a tombstone so that request's Cache.get_or_set does not
+store it (see src.cache). Rebuild pages through get_or_set, not get + set.
+"""
+import sqlalchemy as sqla
+from src import db, cache
+from src.database.models import Event, Task, event_participants, task_assignments
+
+
+def dashboard_key(user_id):
+    return f"dashboard:{user_id}"
+
+
+def checklist_key(event_id):
+    return f"checklist:{event_id}"
+
+
+def event_audience(event_id):
+    """Ids of the users whose dashboard shows this event (owner + participants)"""
+    owner = sqla.select(Event.user_id).where(Event.id == event_id, Event.user_id.is_not(None))
+    participants = sqla.select(event_participants.c.user_id).where(
+        event_participants.c.event_id == event_id)
+    return set(db.session.scalars(sqla.union(owner, participants)).all())
+
+
+def invalidate_dashboards(user_ids):
+    cache.delete(*(dashboard_key(user_id) for user_id in user_ids))
+
+
+def invalidate_checklist(event_id):
+    cache.delete(checklist_key(event_id))
+
+
+def invalidate_event(event_id, audience=None):
+    """Drop the checklist and every affected dashboard for an event.
+
+    Pass ``audience`` when it was captured before the write changed it
+    (deleted events, removed participants, ownership transfers).
+    """
+    if audience is None:
+        audience = event_audience(event_id)
+    invalidate_checklist(event_id)
+    invalidate_dashboards(audience)
+
+
+def invalidate_user_checklists(user_id):
+    """Drop the checklists that display this user (participant, owner or assignee)"""
+    owned = sqla.select(Event.id).where(Event.user_id == user_id)
+    shared = sqla.select(event_participants.c.event_id).where(
+        event_participants.c.user_id == user_id)
+    assigned = (
+        sqla.select(Task.event_id)
+        .join(task_assignments, task_assignments.c.task_id == Task.id)
+        .where(task_assignments.c.user_id == user_id)
+    )
+    event_ids = db.session.scalars(sqla.union(owned, shared, assigned)).all()
+    cache.delete(*(checklist_key(event_id) for event_id in event_ids))
@@ -6,8 +6,19 @@ import sqlalchemy.orm as sqlo
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 import secrets
+import sqlite3
 from flask import current_app
 
+
+@sqla.event.listens_for(sqla.engine.Engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    """SQLite ignores ON DELETE CASCADE unless foreign keys are enabled per connection"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+
 # @login.user_loader
 @login.user_loader
 def load_user(id):
@@ -30,7 +41,9 @@ friendships = db.Table(
     'friendships',
     db.metadata,
     sqla.Column('user_id', sqla.Integer, sqla.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True),
-    sqla.Column('friend_id', sqla.Integer, sqla.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    sqla.Column('friend_id', sqla.Integer, sqla.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True),
+    # The primary key covers lookups by user_id; this one serves "who has me as a friend"
+    sqla.Index('ix_friendships_friend_id', 'friend_id')
 )
 # User Model
 class User(UserMixin, db.Model):
@@ -54,6 +67,10 @@ class User(UserMixin, db.Model):
     last_login: sqlo.Mapped[Optional[datetime]] = sqlo.mapped_column(sqla.DateTime, nullable=True)
     failed_login_attempts: sqlo.Mapped[int] = sqlo.mapped_column(sqla.Integer, default=0)
     account_locked_until: sqlo.Mapped[Optional[datetime]] = sqlo.mapped_column(sqla.DateTime, nullable=True)
+
+    # Calendar feed version stamp, bumped whenever one of the user's assigned tasks changes
+    calendar_version: sqlo.Mapped[int] = sqlo.mapped_column(sqla.Integer, default=0, server_default='0')
+    calendar_updated_at: sqlo.Mapped[Optional[datetime]] = sqlo.mapped_column(sqla.DateTime, nullable=True)
     
     events: sqlo.WriteOnlyMapped[list["Event"]] = sqlo.relationship("Event", back_populates="user", cascade="all, delete-orphan")
     tasks: sqlo.Mapped[list["Task"]] = sqlo.relationship(
@@ -74,9 +91,17 @@ class User(UserMixin, db.Model):
         if not self.is_friend(friend):
             self.friends.append(friend)
 
+    def remove_friend(self, friend):
+        """Remove a friend from the user's friends list."""
+        if self.is_friend(friend):
+            self.friends.remove(friend)
+
     def is_friend(self, friend):
         """Check if a user is already a friend."""
-        return self.friends.filter(friendships.c.friend_id == friend.id).count() > 0
+        return db.session.scalar(sqla.select(sqla.exists().where(
+            friendships.c.user_id == self.id,
+            friendships.c.friend_id == friend.id,
+        )))
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -163,14 +188,24 @@ class User(UserMixin, db.Model):
 from sqlalchemy.orm import relationship
 
 class Event(db.Model):
+    # (user_id, date, id) backs keyset pagination of a user's own events on the dashboard
+    __table_args__ = (
+        db.Index('ix_event_date_id', 'date', 'id'),
+        db.Index('ix_event_user_date_id', 'user_id', 'date', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.String(500), nullable=True)
     date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete="CASCADE"))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete="CASCADE"), index=True)
     user = db.relationship("User", back_populates="events")
-    tasks = db.relationship("Task", back_populates="event", cascade="all, delete-orphan")
+    # The database removes unloaded tasks through ON DELETE CASCADE
+    tasks = db.relationship("Task", back_populates="event", cascade="all, delete-orphan", passive_deletes=True)
     strict_mode = db.Column(db.Boolean, default=False,nullable = True)  # New field for strict mode
+    # Denormalized progress counters, kept in sync by maintain_event_counters
+    task_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    completed_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     def __repr__(self):
         return f"<Event id={self.id} name={self.name}>"
@@ -186,10 +221,11 @@ class Task(db.Model):
     id: sqlo.Mapped[int] = sqlo.mapped_column(primary_key=True)
     description: sqlo.Mapped[str] = sqlo.mapped_column(sqla.String(255), nullable=False)
     note: sqlo.Mapped[Optional[str]] = sqlo.mapped_column(sqla.String(500), nullable=True)  # Optional note field
-    completed: sqlo.Mapped[bool] = sqlo.mapped_column(sqla.Boolean, default=False)
+    # active_history so the counter hook can see the previous value even if it was never loaded
+    completed: sqlo.Mapped[bool] = sqlo.mapped_column(sqla.Boolean, default=False, active_history=True)
     priority: sqlo.Mapped[int] = sqlo.mapped_column(sqla.Integer, nullable=False)  # Task priority (e.g., 1=Low, 2=Medium, 3=High)
     due_date: sqlo.Mapped[Optional[datetime]] = sqlo.mapped_column(sqla.DateTime, nullable=True)  # Optional due date
-    event_id: sqlo.Mapped[int] = sqlo.mapped_column(sqla.Integer, sqla.ForeignKey('event.id', ondelete="CASCADE"))
+    event_id: sqlo.Mapped[int] = sqlo.mapped_column(sqla.Integer, sqla.ForeignKey('event.id', ondelete="CASCADE"), active_history=True)
     event: sqlo.Mapped["Event"] = sqlo.relationship("Event", back_populates="tasks")
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     item = db.Column(db.String(100), nullable=True)
@@ -208,3 +244,326 @@ class Task(db.Model):
         return f"<Task id={self.id} description={self.description[:20]} priority={self.priority} due_date={self.due_date} completed={self.completed}>"
 
 
+# Calendar subscription: a secret token for one user's or one event's feed,
+# with the rendered body stored so a poll is a single keyed read
+class CalendarFeed(db.Model):
+    id: sqlo.Mapped[int] = sqlo.mapped_column(primary_key=True)
+    token: sqlo.Mapped[str] = sqlo.mapped_column(sqla.String(64), unique=True, index=True, nullable=False)
+    user_id: sqlo.Mapped[Optional[int]] = sqlo.mapped_column(sqla.ForeignKey('user.id', ondelete='CASCADE'), unique=True, nullable=True)
+    event_id: sqlo.Mapped[Optional[int]] = sqlo.mapped_column(sqla.ForeignKey('event.id', ondelete='CASCADE'), unique=True, nullable=True)
+    body: sqlo.Mapped[Optional[str]] = sqlo.mapped_column(sqla.Text, nullable=True)  # NULL when stale
+    etag: sqlo.Mapped[Optional[str]] = sqlo.mapped_column(sqla.String(64), nullable=True)
+    generated_at: sqlo.Mapped[Optional[datetime]] = sqlo.mapped_column(sqla.DateTime, nullable=True)
+    # Bumped on every invalidation so a slow rebuild cannot store an outdated body
+    revision: sqlo.Mapped[int] = sqlo.mapped_column(sqla.Integer, default=0, server_default='0')
+
+    @staticmethod
+    def new_token():
+        return secrets.token_urlsafe(32)
+
+    def __repr__(self):
+        return f"<CalendarFeed id={self.id} user_id={self.user_id} event_id={self.event_id}>"
+
+
+# Verification caches: a photo's caption by content hash, and the item/caption
+# verdict, so repeated uploads skip both model calls (see src.database.verification_cache)
+class ImageCaption(db.Model):
+    sha256: sqlo.Mapped[str] = sqlo.mapped_column(sqla.String(64), primary_key=True)
+    # Model and decoding settings that produced the caption
+    captioner: sqlo.Mapped[str] = sqlo.mapped_column(sqla.String(120), primary_key=True)
+    phash: sqlo.Mapped[Optional[str]] = sqlo.mapped_column(sqla.String(16), index=True, nullable=True)
+    caption: sqlo.Mapped[str] = sqlo.mapped_column(sqla.String(255), nullable=False)
+    last_used_at: sqlo.Mapped[datetime] = sqlo.mapped_column(sqla.DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f"<ImageCaption {self.sha256[:12]} caption={self.caption!r}>"
+
+
+class ItemVerdict(db.Model):
+    item: sqlo.Mapped[str] = sqlo.mapped_column(sqla.String(100), primary_key=True)
+    caption: sqlo.Mapped[str] = sqlo.mapped_column(sqla.String(255), primary_key=True)
+    related: sqlo.Mapped[bool] = sqlo.mapped_column(sqla.Boolean, nullable=False)
+    last_used_at: sqlo.Mapped[datetime] = sqlo.mapped_column(sqla.DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f"<ItemVerdict item={self.item!r} caption={self.caption!r} related={self.related}>"
+
+
+# Photo verifications run by the background job worker (see src.verification_jobs).
+# The table is the queue: a job outlives the process that accepted it.
+JOB_STATUSES = ('queued', 'running', 'done', 'failed')
+
+
+class VerificationJob(db.Model):
+    id: sqlo.Mapped[str] = sqlo.mapped_column(sqla.String(32), primary_key=True,
+                                              default=lambda: secrets.token_hex(16))
+    task_id: sqlo.Mapped[int] = sqlo.mapped_column(sqla.ForeignKey('task.id', ondelete="CASCADE"), index=True)
+    user_id: sqlo.Mapped[int] = sqlo.mapped_column(sqla.ForeignKey('user.id', ondelete="CASCADE"))
+    status: sqlo.Mapped[str] = sqlo.mapped_column(sqla.String(16), default='queued', index=True)
+    # Name the photo was uploaded as; the photo itself waits in VERIFY_JOB_DIR under the job id
+    filename: sqlo.Mapped[str] = sqlo.mapped_column(sqla.String(255), nullable=False)
+    attempts: sqlo.Mapped[int] = sqlo.mapped_column(sqla.Integer, default=0)
+    caption: sqlo.Mapped[Optional[str]] = sqlo.mapped_column(sqla.String(255), nullable=True)
+    related: sqlo.Mapped[Optional[bool]] = sqlo.mapped_column(sqla.Boolean, nullable=True)
+    error: sqlo.Mapped[Optional[str]] = sqlo.mapped_column(sqla.String(255), nullable=True)
+    created_at: sqlo.Mapped[datetime] = sqlo.mapped_column(sqla.DateTime, default=datetime.utcnow)
+    updated_at: sqlo.Mapped[datetime] = sqlo.mapped_column(sqla.DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f"<VerificationJob id={self.id} task_id={self.task_id} status={self.status}>"
+
+
+class Conversation(db.Model):
+    """The clarifying-question chat behind create_event_and_tasks; see src.database.conversations"""
+    id: sqlo.Mapped[str] = sqlo.mapped_column(sqla.String(32), primary_key=True,
+                                              default=lambda: secrets.token_hex(16))
+    user_id: sqlo.Mapped[int] = sqlo.mapped_column(sqla.ForeignKey('user.id', ondelete="CASCADE"))
+    event_id: sqlo.Mapped[int] = sqlo.mapped_column(sqla.ForeignKey('event.id', ondelete="CASCADE"))
+    question_index: sqlo.Mapped[int] = sqlo.mapped_column(sqla.Integer, default=0)
+    # [{"role": "user" | "bot", "text": ...}]; assign a new list, in-place changes are not saved
+    turns: sqlo.Mapped[list] = sqlo.mapped_column(sqla.JSON, default=list)
+    created_at: sqlo.Mapped[datetime] = sqlo.mapped_column(sqla.DateTime, default=datetime.utcnow)
+    updated_at: sqlo.Mapped[datetime] = sqlo.mapped_column(sqla.DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f"<Conversation id={self.id} event_id={self.event_id} question_index={self.question_index}>"
+
+
+def adjust_event_counters(connection, deltas):
+    """Apply {event_id: (task_delta, completed_delta)} to the Event counters.
+
+    Paths that write tasks with Core statements (bypassing the ORM flush hook)
+    call this with their own deltas, on the same connection/session so the
+    counters commit or roll back together with the tasks.
+    """
+    event_table = Event.__table__
+    for event_id, (task_delta, completed_delta) in deltas.items():
+        if event_id is None or (task_delta == 0 and completed_delta == 0):
+            continue
+        connection.execute(
+            sqla.update(event_table)
+            .where(event_table.c.id == event_id)
+            .values(
+                task_count=event_table.c.task_count + task_delta,
+                completed_count=event_table.c.completed_count + completed_delta,
+            )
+        )
+
+
+def _add_delta(deltas, event_id, task_delta, completed_delta):
+    current = deltas.get(event_id, (0, 0))
+    deltas[event_id] = (current[0] + task_delta, current[1] + completed_delta)
+
+
+@sqla.event.listens_for(sqlo.Session, 'after_flush')
+def maintain_event_counters(session, flush_context):
+    """Keep Event.task_count/completed_count in step with ORM Task writes"""
+    deltas = {}
+    for obj in session.new:
+        if isinstance(obj, Task):
+            _add_delta(deltas, obj.event_id, 1, int(bool(obj.completed)))
+
+    for obj in session.deleted:
+        if isinstance(obj, Task):
+            _add_delta(deltas, obj.event_id, -1, -int(bool(obj.completed)))
+
+    for obj in session.dirty:
+        if not isinstance(obj, Task) or obj in session.deleted:
+            continue
+        state = sqla.inspect(obj)
+        event_history = state.attrs.event_id.history
+        completed_history = state.attrs.completed.history
+        if not event_history.deleted and not completed_history.deleted:
+            continue
+        old_event_id = event_history.deleted[0] if event_history.deleted else obj.event_id
+        old_completed = completed_history.deleted[0] if completed_history.deleted else obj.completed
+        _add_delta(deltas, old_event_id, -1, -int(bool(old_completed)))
+        _add_delta(deltas, obj.event_id, 1, int(bool(obj.completed)))
+
+    if not deltas:
+        return
+    adjust_event_counters(session.connection(), deltas)
+
+    # Events already in the session must not keep serving the old numbers
+    for event_id in deltas:
+        event = session.identity_map.get(sqlo.util.identity_key(Event, event_id))
+        if event is not None:
+            session.expire(event, ['task_count', 'completed_count'])
+
+
+def find_counter_drift():
+    """Return (event_id, stored, actual) for every event whose counters are wrong"""
+    actual = (
+        sqla.select(
+            Event.id.label('event_id'),
+            sqla.func.count(Task.id).label('task_count'),
+            sqla.func.coalesce(
+                sqla.func.sum(sqla.case((Task.completed.is_(True), 1), else_=0)), 0
+            ).label('completed_count'),
+        )
+        .outerjoin(Task, Task.event_id == Event.id)
+        .group_by(Event.id)
+        .subquery()
+    )
+    rows = db.session.execute(
+        sqla.select(
+            Event.id, Event.task_count, Event.completed_count,
+            actual.c.task_count, actual.c.completed_count,
+        )
+        .join(actual, actual.c.event_id == Event.id)
+        .where(sqla.or_(
+            Event.task_count != actual.c.task_count,
+            Event.completed_count != actual.c.completed_count,
+        ))
+        .order_by(Event.id)
+    ).all()
+    return [(row[0], (row[1], row[2]), (row[3], row[4])) for row in rows]
+
+
+def recompute_event_counters():
+    """Rewrite every event's counters from the Task table in one UPDATE"""
+    event_table = Event.__table__
+    total = (
+        sqla.select(sqla.func.count(Task.id))
+        .where(Task.event_id == event_table.c.id)
+        .scalar_subquery()
+    )
+    completed = (
+        sqla.select(sqla.func.count(Task.id))
+        .where(Task.event_id == event_table.c.id, Task.completed.is_(True))
+        .scalar_subquery()
+    )
+    result = db.session.execute(
+        sqla.update(event_table).values(task_count=total, completed_count=completed)
+    )
+    return result.rowcount
+
+
+# Task fields that appear in the calendar feed
+CALENDAR_TASK_FIELDS = ('description', 'priority', 'due_date', 'event_id')
+
+
+def mark_feeds_stale(connection, user_ids=(), event_ids=()):
+    """Drop the stored bodies of the given users' and events' subscription feeds; returns their ids"""
+    conditions = []
+    if user_ids:
+        conditions.append(CalendarFeed.user_id.in_(user_ids))
+    if event_ids:
+        conditions.append(CalendarFeed.event_id.in_(event_ids))
+    if not conditions:
+        return []
+    feed_table = CalendarFeed.__table__
+    result = connection.execute(
+        sqla.update(feed_table)
+        .where(sqla.or_(*conditions))
+        .values(body=None, etag=None, revision=feed_table.c.revision + 1)
+        .returning(feed_table.c.id)
+    )
+    return result.scalars().all()
+
+
+def bump_calendar_versions(connection, user_ids):
+    """Invalidate the calendar feeds of the given users.
+
+    Core-level writers that change assigned tasks call this on their own
+    connection; ORM writes are handled by the flush hooks below. Returns
+    the ids of the subscription feeds marked stale.
+    """
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return []
+    user_table = User.__table__
+    connection.execute(
+        sqla.update(user_table)
+        .where(user_table.c.id.in_(user_ids))
+        .values(
+            calendar_version=user_table.c.calendar_version + 1,
+            calendar_updated_at=datetime.utcnow(),
+        )
+    )
+    return mark_feeds_stale(connection, user_ids=user_ids)
+
+
+def assignees_of(connection, task_ids=(), event_ids=()):
+    """Ids of users assigned to any of the given tasks, or to tasks of the given events"""
+    conditions = []
+    if task_ids:
+        conditions.append(task_assignments.c.task_id.in_(task_ids))
+    if event_ids:
+        conditions.append(task_assignments.c.task_id.in_(
+            sqla.select(Task.id).where(Task.event_id.in_(event_ids))))
+    if not conditions:
+        return set()
+    return set(connection.scalars(
+        sqla.select(task_assignments.c.user_id).where(sqla.or_(*conditions)).distinct()
+    ).all())
+
+
+@sqla.event.listens_for(sqlo.Session, 'before_flush')
+def collect_calendar_changes(session, flush_context, instances):
+    """Work out whose calendar a flush will change, while assignments still exist"""
+    user_ids, task_ids, event_ids = set(), set(), set()
+    # Event feeds list every dated task of the event, assigned or not
+    feed_event_ids = set()
+
+    for obj in session.new:
+        if isinstance(obj, Task):
+            user_ids.update(user.id for user in obj.assigned_users)
+
+    for obj in session.dirty:
+        state = sqla.inspect(obj)
+        if isinstance(obj, Task):
+            if any(state.attrs[field].history.has_changes() for field in CALENDAR_TASK_FIELDS):
+                task_ids.add(obj.id)
+                feed_event_ids.add(obj.event_id)
+                feed_event_ids.update(state.attrs.event_id.history.deleted)
+            history = state.attrs.assigned_users.history
+            user_ids.update(user.id for user in [*history.added, *history.deleted])
+        elif isinstance(obj, User):
+            history = state.attrs.tasks.history
+            if history.added or history.deleted:
+                user_ids.add(obj.id)
+        elif isinstance(obj, Event):
+            if state.attrs.name.history.has_changes():
+                event_ids.add(obj.id)
+
+    for obj in session.deleted:
+        if isinstance(obj, Task):
+            task_ids.add(obj.id)
+            feed_event_ids.add(obj.event_id)
+        elif isinstance(obj, Event):
+            event_ids.add(obj.id)
+
+    if task_ids or event_ids:
+        user_ids |= assignees_of(session.connection(), task_ids, event_ids)
+    session.info['calendar_user_ids'] = user_ids
+    session.info['calendar_event_ids'] = feed_event_ids | event_ids
+
+
+@sqla.event.listens_for(sqlo.Session, 'after_flush')
+def apply_calendar_changes(session, flush_context):
+    user_ids = session.info.pop('calendar_user_ids', None) or set()
+    event_ids = session.info.pop('calendar_event_ids', None) or set()
+    # New tasks only know their event_id once the flush has run
+    event_ids.update(obj.event_id for obj in session.new if isinstance(obj, Task))
+    event_ids.discard(None)
+
+    record_calendar_changes(session, user_ids, event_ids)
+
+
+def record_calendar_changes(session, user_ids=(), event_ids=()):
+    """Invalidate the calendars of the given users and events within the session's transaction.
+
+    Called by the flush hook above and by Core-level bulk writers, which
+    collect the affected ids themselves.
+    """
+    stale_feed_ids = session.info.setdefault('stale_calendar_feeds', set())
+    if event_ids:
+        stale_feed_ids.update(mark_feeds_stale(session.connection(), event_ids=event_ids))
+    if not user_ids:
+        return
+    stale_feed_ids.update(bump_calendar_versions(session.connection(), user_ids))
+    for user_id in user_ids:
+        user = session.identity_map.get(sqlo.util.identity_key(User, user_id))
+        if user is not None:
+            session.expire(user, ['calendar_version', 'calendar_updated_at'])
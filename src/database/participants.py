@@ -0,0 +1,90 @@
+"""
+Set-based changes to the participants of an event.
+
+Adding or removing any number of users costs a fixed number of statements:
+one lookup of the requested users, one of the existing rows, then a bulk
+INSERT and a bulk DELETE on ``event_participants``.
+"""
+import sqlalchemy as sqla
+import sqlalchemy.orm as sqlo
+from src import db
+from src.database.models import Event, User, event_participants
+
+
+def parse_ids(values):
+    """Split raw ids from a request body into (valid int ids, rejected raw values)"""
+    ids, rejected = [], []
+    for value in values or []:
+        try:
+            ids.append(int(value))
+        except (TypeError, ValueError):
+            rejected.append(value)
+    return ids, rejected
+
+
+def _expire_loaded(model, ids, attribute):
+    for pk in ids:
+        instance = db.session.identity_map.get(sqlo.util.identity_key(model, pk))
+        if instance is not None:
+            db.session.expire(instance, [attribute])
+
+
+def apply_participant_changes(event_id, add_ids, remove_ids, addable_ids=None):
+    """Add and remove participants in bulk; returns ``{"add": {...}, "remove": {...}}``.
+
+    Each map goes from user id to one of: ``added``, ``already_participant``,
+    ``not_friend`` (not in ``addable_ids``), ``removed``, ``not_participant``
+    or ``not_found``. An id present in both lists is only removed.
+    The caller commits.
+    """
+    remove_set = set(remove_ids)
+    add_set = set(add_ids) - remove_set
+    requested = add_set | remove_set
+    results = {"add": {}, "remove": {}}
+    if not requested:
+        return results
+
+    existing_users = set(db.session.scalars(
+        sqla.select(User.id).where(User.id.in_(requested))).all())
+    current = set(db.session.scalars(
+        sqla.select(event_participants.c.user_id).where(
+            event_participants.c.event_id == event_id,
+            event_participants.c.user_id.in_(requested),
+        )
+    ).all())
+
+    to_insert = []
+    for user_id in add_set:
+        if user_id not in existing_users:
+            results["add"][user_id] = "not_found"
+        elif addable_ids is not None and user_id not in addable_ids:
+            results["add"][user_id] = "not_friend"
+        elif user_id in current:
+            results["add"][user_id] = "already_participant"
+        else:
+            results["add"][user_id] = "added"
+            to_insert.append({"event_id": event_id, "user_id": user_id})
+
+    to_delete = []
+    for user_id in remove_set:
+        if user_id not in existing_users:
+            results["remove"][user_id] = "not_found"
+        elif user_id not in current:
+            results["remove"][user_id] = "not_participant"
+        else:
+            results["remove"][user_id] = "removed"
+            to_delete.append(user_id)
+
+    if to_insert:
+        db.session.execute(sqla.insert(event_participants), to_insert)
+    if to_delete:
+        db.session.execute(sqla.delete(event_participants).where(
+            event_participants.c.event_id == event_id,
+            event_participants.c.user_id.in_(to_delete),
+        ))
+    changed = [row["user_id"] for row in to_insert] + to_delete
+    if changed:
+        # Collections already loaded in the session no longer match the table
+        _expire_loaded(Event, [event_id], 'participants')
+        _expire_loaded(User, changed, 'participating_events')
+    return results
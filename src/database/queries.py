@@ -0,0 +1,170 @@
+"""
+Read-side queries that return lightweight rows instead of ORM entities
+"""
+import base64
+from datetime import datetime
+import sqlalchemy as sqla
+import sqlalchemy.orm as sqlo
+from src import db
+from src.database.models import Event, Task, event_participants
+
+MAX_PAGE_SIZE = 100
+
+
+def visible_to(user_id):
+    """Predicate for events a user owns or participates in.
+
+    Evaluated per Event row, so an event that is both owned and shared is
+    still returned exactly once. Fine for checking given events; listing a
+    user's events goes through _visible_event_keys instead, since this
+    predicate can only be tested by walking other users' events too.
+    """
+    return sqla.or_(
+        Event.user_id == user_id,
+        sqla.exists().where(
+            event_participants.c.event_id == Event.id,
+            event_participants.c.user_id == user_id,
+        ),
+    )
+
+
+def event_progress():
+    """Completion percentage (0-100) computed from the denormalized counters"""
+    return sqla.case(
+        (Event.task_count > 0, Event.completed_count * 100.0 / Event.task_count),
+        else_=0,
+    )
+
+
+def _visible_event_keys(user_id, after=None, limit=None):
+    """(id, date) of the events a user owns or participates in, after the ``after`` key.
+
+    A UNION of the owned events, read from ix_event_user_date_id, and the
+    shared ones, reached through the user's event_participants rows, so
+    the cost depends on the user's own events rather than the whole table.
+    With ``limit`` each side stops at that many rows; the UNION also drops
+    an event that is both owned and shared.
+    """
+    owned = sqla.select(Event.id, Event.date).where(Event.user_id == user_id)
+    shared = (
+        sqla.select(Event.id, Event.date)
+        .join(event_participants, event_participants.c.event_id == Event.id)
+        .where(event_participants.c.user_id == user_id)
+    )
+    branches = []
+    for branch in (owned, shared):
+        if after is not None:
+            branch = branch.where(sqla.tuple_(Event.date, Event.id) > after)
+        if limit is not None:
+            # Wrapped so each side keeps its own ORDER BY/LIMIT inside the UNION
+            branch = sqla.select(branch.order_by(Event.date.asc(), Event.id.asc()).limit(limit).subquery())
+        branches.append(branch)
+    return sqla.union(*branches).subquery()
+
+
+def _summary_query(user_id, after=None, limit=None):
+    keys = _visible_event_keys(user_id, after, limit)
+    return (
+        sqla.select(
+            Event.id,
+            Event.name,
+            Event.date,
+            Event.task_count,
+            Event.completed_count,
+            event_progress().label('progress'),
+        )
+        .join(keys, keys.c.id == Event.id)
+        .order_by(Event.date.asc(), Event.id.asc())
+    )
+
+
+def dashboard_event_summaries(user_id):
+    """Fetch every visible event with its task totals in a single statement.
+
+    Returns rows exposing ``id``, ``name``, ``date``, ``task_count``,
+    ``completed_count`` and ``progress`` (0-100).
+    """
+    return db.session.execute(_summary_query(user_id)).all()
+
+
+def encode_cursor(row):
+    """Opaque cursor pointing just after ``row`` in (date, id) order"""
+    raw = f"{row.date.isoformat()}|{row.id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        date, event_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(date), int(event_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def event_summaries_page(user_id, limit, cursor=None):
+    """One page of dashboard rows using keyset pagination on (date, id).
+
+    Returns ``(rows, next_cursor)``; ``next_cursor`` is None on the last page.
+    The cost of a page does not depend on how many pages come before it.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    after = decode_cursor(cursor) if cursor else None
+    # Fetch one extra row to learn whether another page exists
+    query = _summary_query(user_id, after, limit + 1)
+    rows = db.session.execute(query.limit(limit + 1)).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def _user_summary(user):
+    return {"id": user.id, "username": user.username, "profile_picture": user.profile_picture}
+
+
+def checklist_data(event_id):
+    """Plain-data snapshot of an event's checklist page, or None if it does not exist.
+
+    Uses a fixed four statements however many tasks or assignees the event
+    has: event, its participants, tasks, and the tasks' assigned users.
+    Only built from dicts/lists/sets so it can be stored in any cache backend.
+    """
+    event = db.session.scalars(
+        sqla.select(Event)
+        .where(Event.id == event_id)
+        .options(sqlo.selectinload(Event.participants))
+    ).first()
+    if event is None:
+        return None
+
+    tasks = db.session.scalars(
+        sqla.select(Task)
+        .where(Task.event_id == event_id)
+        .order_by(Task.priority.asc(), Task.due_date.asc())
+        .options(sqlo.selectinload(Task.assigned_users))
+    ).all()
+    participants = [_user_summary(user) for user in event.participants]
+
+    return {
+        "event": {
+            "id": event.id,
+            "name": event.name,
+            "date": event.date,
+            "user_id": event.user_id,
+            "strict_mode": event.strict_mode,
+            "participants": participants,
+        },
+        "tasks": [{
+            "id": task.id,
+            "description": task.description,
+            "note": task.note,
+            "completed": task.completed,
+            "priority": task.priority,
+            "due_date": task.due_date,
+            "item": task.item,
+            "image_link": task.image_link,
+            "assigned_users": [_user_summary(user) for user in task.assigned_users],
+        } for task in tasks],
+        # Precomputed for O(1) membership checks in the template
+        "participant_ids": {user["id"] for user in participants},
+    }
@@ -0,0 +1,352 @@
+"""
+Set-based task writes.
+
+These bypass the ORM unit of work, so they keep the Event counters
+(adjust_event_counters) and calendar feeds (record_calendar_changes) in step
+themselves inside the caller's transaction, and expire any copies already
+loaded in the session. The caller commits.
+"""
+from datetime import datetime, timezone
+import sqlalchemy as sqla
+import sqlalchemy.orm as sqlo
+from src import db
+from src.database.models import (
+    CALENDAR_TASK_FIELDS, Event, Task, User, adjust_event_counters, assignees_of,
+    record_calendar_changes, task_assignments,
+)
+
+MAX_BATCH_OPERATIONS = 500
+BATCH_OPERATIONS = ('create', 'edit', 'delete', 'complete')
+
+
+def expire_event_counters(event_ids):
+    for event_id in event_ids:
+        event = db.session.identity_map.get(sqlo.util.identity_key(Event, event_id))
+        if event is not None:
+            db.session.expire(event, ['task_count', 'completed_count'])
+
+
+def set_task_completion(event_id, completed_ids):
+    """Mark exactly ``completed_ids`` of the event's tasks as completed.
+
+    Two UPDATEs regardless of the number of tasks; only rows whose value
+    actually changes are written. Returns (newly completed, newly reopened).
+    """
+    completed_ids = list(completed_ids)
+    completed = db.session.execute(
+        sqla.update(Task)
+        .where(Task.event_id == event_id, Task.id.in_(completed_ids), Task.completed.is_not(True))
+        .values(completed=True)
+        .execution_options(synchronize_session='evaluate')
+    ).rowcount
+    reopened = db.session.execute(
+        sqla.update(Task)
+        .where(Task.event_id == event_id, Task.id.not_in(completed_ids), Task.completed.is_(True))
+        .values(completed=False)
+        .execution_options(synchronize_session='evaluate')
+    ).rowcount
+
+    adjust_event_counters(db.session.connection(), {event_id: (0, completed - reopened)})
+    expire_event_counters([event_id])
+    return completed, reopened
+
+
+class TaskBatchError(ValueError):
+    """Raised when a batch has invalid operations; nothing has been written"""
+
+    def __init__(self, results):
+        super().__init__("One or more operations are invalid.")
+        self.results = results
+
+
+def parse_task_fields(op, creating):
+    """Validated column values from a create/edit operation; raises ValueError"""
+    values = {}
+    if creating or 'description' in op:
+        description = (op.get('description') or '').strip()
+        if not description:
+            raise ValueError("description is required")
+        if len(description) > 255:
+            raise ValueError("description is too long")
+        values['description'] = description
+    if creating or 'priority' in op:
+        priority = op.get('priority') or 3  # Default to normal priority
+        try:
+            priority = int(priority)
+        except (TypeError, ValueError):
+            raise ValueError("priority must be 1, 2 or 3")
+        if priority not in (1, 2, 3):
+            raise ValueError("priority must be 1, 2 or 3")
+        values['priority'] = priority
+    if creating or 'due_date' in op:
+        due_date = op.get('due_date')
+        try:
+            values['due_date'] = datetime.strptime(due_date, '%Y-%m-%d') if due_date else None
+        except (TypeError, ValueError):
+            raise ValueError("Invalid due date format")
+    for field in ('note', 'item'):
+        if creating or field in op:
+            values[field] = op.get(field) or None
+    return values
+
+
+PRIORITY_WORDS = {'important': 1, 'very important': 1, 'high': 1, 'urgent': 1,
+                  'necessary': 2, 'medium': 2, 'normal': 3, 'low': 3}
+NO_ITEM = {'', 'none', 'null', 'n/a', 'na', 'no item', 'nothing', '-'}
+
+
+def _generated_priority(value):
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in PRIORITY_WORDS:
+            return PRIORITY_WORDS[value]
+    try:
+        return min(max(int(float(value)), 1), 3)
+    except (TypeError, ValueError, OverflowError):
+        return 3  # Default to normal priority
+
+
+def _generated_item(value):
+    if isinstance(value, list):
+        value = next((v for v in value if isinstance(v, str) and v.strip()), None)
+    if not isinstance(value, str):
+        return None
+    item = ' '.join(value.split())
+    return None if item.lower() in NO_ITEM else item[:Task.item.type.length]
+
+
+def _generated_due_date(value):
+    if not isinstance(value, str) or not value.strip():
+        return None
+    try:
+        due_date = datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+    if due_date.tzinfo is not None:
+        due_date = due_date.astimezone(timezone.utc).replace(tzinfo=None)
+    return due_date
+
+
+def normalize_generated_task(data):
+    """Column values for one checklist entry written by the LLM, or None if it has no description.
+
+    Unlike parse_task_fields this never rejects: unknown priorities become
+    3, "none"-like items become NULL and unreadable due dates are dropped.
+    """
+    if not isinstance(data, dict):
+        return None
+    description = data.get('task') or data.get('description')
+    if not isinstance(description, str) or not description.strip():
+        return None
+    return {
+        'description': ' '.join(description.split())[:Task.description.type.length],
+        'priority': _generated_priority(data.get('priority')),
+        'item': _generated_item(data.get('item')),
+        'due_date': _generated_due_date(data.get('due_date')),
+    }
+
+
+def insert_generated_tasks(event_id, entries):
+    """Add an LLM-generated checklist to an event with one INSERT.
+
+    Entries without a description are skipped. The Event counters and the
+    event's calendar feeds are updated in the same transaction. Returns the
+    new tasks' id, description, priority, item and due_date as dicts, in
+    insertion order. The caller commits.
+    """
+    rows = [dict(values, event_id=event_id, completed=False)
+            for values in map(normalize_generated_task, entries) if values]
+    if not rows:
+        return []
+    # On SQLite, sort_by_parameter_order (and the ORM insert) fall back to one
+    # statement per row; a Core insert without it sends a single multi-row
+    # INSERT, and every returned row carries its own values
+    task_table = Task.__table__
+    inserted = db.session.execute(
+        sqla.insert(task_table).returning(task_table.c.id, task_table.c.description, task_table.c.priority,
+                                          task_table.c.item, task_table.c.due_date), rows)
+    adjust_event_counters(db.session.connection(), {event_id: (len(rows), 0)})
+    expire_event_counters([event_id])
+    record_calendar_changes(db.session, (), [event_id])
+    return sorted((row._asdict() for row in inserted), key=lambda row: row['id'])
+
+
+def delete_generated_tasks(event_id, task_ids):
+    """Remove tasks inserted by insert_generated_tasks, e.g. when the rest of the checklist failed.
+
+    Tasks already deleted are ignored. Returns the image links of the removed
+    tasks, for the caller to schedule once it has committed.
+    """
+    rows = db.session.execute(
+        sqla.select(Task.id, Task.completed, Task.image_link)
+        .where(Task.event_id == event_id, Task.id.in_(task_ids))
+    ).all()
+    if not rows:
+        return []
+    deleted = [row.id for row in rows]
+    calendar_user_ids = assignees_of(db.session.connection(), task_ids=deleted)
+    db.session.execute(sqla.delete(task_assignments).where(task_assignments.c.task_id.in_(deleted)))
+    db.session.execute(sqla.delete(Task).where(Task.id.in_(deleted)))
+    adjust_event_counters(db.session.connection(),
+                          {event_id: (-len(rows), -sum(bool(row.completed) for row in rows))})
+    expire_event_counters([event_id])
+    record_calendar_changes(db.session, calendar_user_ids, [event_id])
+    for task_id in deleted:
+        task = db.session.identity_map.get(sqlo.util.identity_key(Task, task_id))
+        if task is not None:
+            db.session.expunge(task)
+    return [row.image_link for row in rows if row.image_link]
+
+
+def _operation_task_id(op, existing):
+    try:
+        task_id = int(op.get('task_id'))
+    except (TypeError, ValueError):
+        raise ValueError("task_id must be an integer")
+    if task_id not in existing:
+        raise ValueError("Task not found in this event")
+    return task_id
+
+
+def apply_task_batch(event_id, operations):
+    """Apply create/edit/delete/complete operations on one event's tasks.
+
+    Operations are validated first and applied in order of appearance:
+    later edits to the same task win, and nothing may follow a delete.
+    If any operation is invalid, TaskBatchError is raised and nothing is
+    written. Otherwise the batch costs one SELECT of the referenced tasks,
+    one INSERT, one executemany UPDATE and one DELETE, and the result is
+    (per-operation results, image links of the deleted tasks).
+    """
+    referenced = set()
+    for op in operations:
+        try:
+            referenced.add(int(op.get('task_id')))
+        except (AttributeError, TypeError, ValueError):
+            pass
+    existing = {}
+    if referenced:
+        existing = {row.id: row for row in db.session.execute(
+            sqla.select(Task.id, Task.completed, Task.image_link)
+            .where(Task.event_id == event_id, Task.id.in_(referenced))
+        )}
+
+    results, creates, updates, deleted = [], [], {}, set()
+    for index, op in enumerate(operations):
+        kind = op.get('op') if isinstance(op, dict) else None
+        result = {"index": index, "op": kind}
+        results.append(result)
+        try:
+            if kind not in BATCH_OPERATIONS:
+                raise ValueError(f"op must be one of {', '.join(BATCH_OPERATIONS)}")
+            if kind == 'create':
+                values = parse_task_fields(op, creating=True)
+                values.update(event_id=event_id, completed=bool(op.get('completed', False)))
+                creates.append((result, values))
+                continue
+            task_id = result["task_id"] = _operation_task_id(op, existing)
+            if task_id in deleted:
+                raise ValueError("Task is deleted earlier in this batch")
+            if kind == 'edit':
+                updates.setdefault(task_id, {}).update(parse_task_fields(op, creating=False))
+            elif kind == 'complete':
+                updates.setdefault(task_id, {})['completed'] = bool(op.get('completed', True))
+            else:
+                deleted.add(task_id)
+                updates.pop(task_id, None)
+        except ValueError as e:
+            result["error"] = str(e)
+
+    if any("error" in result for result in results):
+        for result in results:
+            result["status"] = "error" if "error" in result else "not_applied"
+        raise TaskBatchError(results)
+
+    # Whose calendars change has to be read while the assignments still exist
+    calendar_task_ids = deleted | {task_id for task_id, values in updates.items()
+                                   if set(values) & set(CALENDAR_TASK_FIELDS)}
+    calendar_user_ids = assignees_of(db.session.connection(), task_ids=calendar_task_ids)
+
+    if deleted:
+        db.session.execute(sqla.delete(task_assignments).where(task_assignments.c.task_id.in_(deleted)))
+        db.session.execute(sqla.delete(Task).where(Task.id.in_(deleted)))
+    if updates:
+        db.session.execute(sqla.update(Task), [{"id": task_id, **values} for task_id, values in updates.items()])
+        for task_id, values in updates.items():
+            task = db.session.identity_map.get(sqlo.util.identity_key(Task, task_id))
+            if task is not None:
+                db.session.expire(task, list(values))
+    if creates:
+        new_ids = db.session.scalars(
+            sqla.insert(Task).returning(Task.id, sort_by_parameter_order=True),
+            [values for _, values in creates],
+        ).all()
+        for (result, _), task_id in zip(creates, new_ids):
+            result["task_id"] = task_id
+
+    task_delta = len(creates) - len(deleted)
+    completed_delta = (sum(values['completed'] for _, values in creates)
+                       - sum(bool(existing[task_id].completed) for task_id in deleted)
+                       + sum(values['completed'] - bool(existing[task_id].completed)
+                             for task_id, values in updates.items() if 'completed' in values))
+    adjust_event_counters(db.session.connection(), {event_id: (task_delta, completed_delta)})
+    expire_event_counters([event_id])
+    if creates or calendar_task_ids:
+        record_calendar_changes(db.session, calendar_user_ids, [event_id])
+
+    for result in results:
+        result["status"] = "applied"
+    return results, [existing[task_id].image_link for task_id in deleted if existing[task_id].image_link]
+
+
+def assign_users(task_ids, user_ids):
+    """Assign every user to every task in one INSERT ... SELECT, skipping existing pairs.
+
+    Ids that do not exist are ignored. Returns the number of rows inserted.
+    """
+    task_ids, user_ids = set(task_ids), set(user_ids)
+    if not task_ids or not user_ids:
+        return 0
+    # Every (user, task) pair: an explicit cross join
+    pairs = (
+        sqla.select(User.id, Task.id)
+        .join(Task, sqla.true())
+        .where(User.id.in_(user_ids), Task.id.in_(task_ids))
+        .where(~sqla.exists().where(
+            task_assignments.c.user_id == User.id,
+            task_assignments.c.task_id == Task.id,
+        ))
+    )
+    inserted = db.session.execute(
+        sqla.insert(task_assignments).from_select(['user_id', 'task_id'], pairs)
+    ).rowcount
+    if inserted:
+        # Bumping a user whose rows already existed only costs one feed re-render
+        record_calendar_changes(db.session, user_ids)
+        _expire_assignments(task_ids, user_ids)
+    return inserted
+
+
+def unassign_users(task_ids, user_ids):
+    """Remove every given user from every given task in one DELETE; returns the rows removed"""
+    task_ids, user_ids = set(task_ids), set(user_ids)
+    if not task_ids or not user_ids:
+        return 0
+    removed = db.session.execute(
+        sqla.delete(task_assignments).where(
+            task_assignments.c.task_id.in_(task_ids),
+            task_assignments.c.user_id.in_(user_ids),
+        )
+    ).rowcount
+    if removed:
+        record_calendar_changes(db.session, user_ids)
+        _expire_assignments(task_ids, user_ids)
+    return removed
+
+
+def _expire_assignments(task_ids, user_ids):
+    for model, ids, attribute in ((Task, task_ids, 'assigned_users'), (User, user_ids, 'tasks')):
+        for pk in ids:
+            instance = db.session.identity_map.get(sqlo.util.identity_key(model, pk))
+            if instance is not None:
+                db.session.expire(instance, [attribute])
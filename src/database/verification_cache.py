@@ -0,0 +1,146 @@
+"""
+Caches for photo verification (complete_task_with_image).
+
+- ImageCaption: caption by SHA-256 of the uploaded bytes, per captioner
+  configuration. With CAPTION_CACHE_PHASH an exact perceptual-hash (dHash)
+  match also counts, so a re-encoded or resized copy of the same photo hits.
+- ItemVerdict: related/not-related by (normalized item, normalized caption).
+
+Both live in the database, so they survive restarts and are shared by every
+worker. Each table is capped: every VERIFICATION_CACHE_EVICT_EVERY writes
+(counted per process), the table is counted and the least recently used rows
+beyond the limit are evicted, so it can overshoot by that many rows per
+worker in between. The caller commits.
+"""
+import hashlib
+import re
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+import sqlalchemy as sqla
+from PIL import Image
+from src import db
+from src.database.models import ImageCaption, ItemVerdict
+
+# Hits refresh last_used_at at most this often, so reads rarely write
+TOUCH_INTERVAL = timedelta(hours=1)
+
+_writes = {}
+_writes_lock = threading.Lock()
+
+
+def image_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def stream_digest(stream, chunk_size=64 * 1024):
+    """SHA-256 of a seekable binary stream, read in chunks and rewound afterwards"""
+    stream.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def perceptual_hash(image):
+    """64-bit difference hash as 16 hex digits; stable across re-encoding and resizing"""
+    pixels = list(image.convert('L').resize((9, 8), Image.Resampling.LANCZOS).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f'{bits:016x}'
+
+
+def normalize_text(text):
+    return re.sub(r'\s+', ' ', text or '').strip().lower()
+
+
+def captioner_id(config):
+    """Identifies the settings a caption was produced with; other settings never share entries"""
+    return (f"{config.get('CAPTION_MODEL')}|{config.get('CAPTION_MODE', 'fp32')}"
+            f"|beams={config.get('CAPTION_NUM_BEAMS', 5)}|len={config.get('CAPTION_MAX_LENGTH', 50)}")[:120]
+
+
+def _touch(model, row, where):
+    now = datetime.utcnow()
+    if row.last_used_at is None or row.last_used_at < now - TOUCH_INTERVAL:
+        db.session.execute(sqla.update(model).where(*where).values(last_used_at=now))
+
+
+def _evict(model, max_entries):
+    """Trim the table back below ``max_entries`` (plus 10% headroom) by least recent use"""
+    count = db.session.scalar(sqla.select(sqla.func.count()).select_from(model))
+    if count <= max_entries:
+        return 0
+    excess = count - max_entries + max_entries // 10
+    cutoff = db.session.scalar(
+        sqla.select(model.last_used_at).order_by(model.last_used_at.asc()).offset(excess - 1).limit(1))
+    return db.session.execute(sqla.delete(model).where(model.last_used_at <= cutoff)).rowcount
+
+
+def _eviction_due(model):
+    every = max(current_app.config.get('VERIFICATION_CACHE_EVICT_EVERY', 100), 1)
+    with _writes_lock:
+        _writes[model] = _writes.get(model, 0) + 1
+        return _writes[model] % every == 0
+
+
+def _store(model, values, max_entries):
+    """Insert or refresh one entry; a concurrent insert of the same key is not an error"""
+    try:
+        with db.session.begin_nested():
+            db.session.merge(model(**values, last_used_at=datetime.utcnow()))
+    except sqla.exc.IntegrityError:
+        return
+    if _eviction_due(model):
+        _evict(model, max_entries)
+
+
+def cached_caption(digest, phash=None):
+    captioner = captioner_id(current_app.config)
+    row = db.session.execute(
+        sqla.select(ImageCaption.sha256, ImageCaption.caption, ImageCaption.last_used_at)
+        .where(ImageCaption.sha256 == digest, ImageCaption.captioner == captioner)
+    ).first()
+    if row is None and phash is not None:
+        row = db.session.execute(
+            sqla.select(ImageCaption.sha256, ImageCaption.caption, ImageCaption.last_used_at)
+            .where(ImageCaption.phash == phash, ImageCaption.captioner == captioner)
+            .order_by(ImageCaption.last_used_at.desc()).limit(1)
+        ).first()
+    if row is None:
+        return None
+    _touch(ImageCaption, row, (ImageCaption.sha256 == row.sha256, ImageCaption.captioner == captioner))
+    return row.caption
+
+
+def store_caption(digest, caption, phash=None):
+    _store(ImageCaption, {
+        'sha256': digest,
+        'captioner': captioner_id(current_app.config),
+        'phash': phash,
+        'caption': caption[:255],
+    }, current_app.config.get('CAPTION_CACHE_MAX_ENTRIES', 10000))
+
+
+def cached_verdict(item, caption):
+    """True/False from an earlier verification of this item against this caption, else None"""
+    item, caption = normalize_text(item)[:100], normalize_text(caption)[:255]
+    row = db.session.execute(
+        sqla.select(ItemVerdict.related, ItemVerdict.last_used_at)
+        .where(ItemVerdict.item == item, ItemVerdict.caption == caption)
+    ).first()
+    if row is None:
+        return None
+    _touch(ItemVerdict, row, (ItemVerdict.item == item, ItemVerdict.caption == caption))
+    return row.related
+
+
+def store_verdict(item, caption, related):
+    _store(ItemVerdict, {
+        'item': normalize_text(item)[:100],
+        'caption': normalize_text(caption)[:255],
+        'related': related,
+    }, current_app.config.get('VERDICT_CACHE_MAX_ENTRIES', 50000))
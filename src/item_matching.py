@@ -0,0 +1,268 @@
+"""
+Local item/caption matching for photo verification.
+
+Most verifications are easy: the caption names the item ("a mug on a
+table" for "cup") or plainly shows something else. ItemMatcher answers
+those locally from token overlap, a small lemmatizer and a
+synonym/hypernym table, and returns None for anything it is not sure of;
+only those calls go on to Gemini. With ITEM_MATCH_EMBEDDING_MODEL set (and
+sentence-transformers installed), a cosine similarity between item and
+caption settles the cases the table does not cover.
+"""
+import re
+import threading
+from collections import Counter
+
+# Synonym groups; the first word of each group is its canonical form. Only
+# words with one common sense belong here: a caption's "cap" may be a bottle
+# cap and its "coach" a sports coach, so such words are left out and stay
+# unknown, which sends the pair to the LLM instead of deciding it locally.
+SYNONYMS = [
+    ('cup', 'mug', 'teacup', 'coffee cup'),
+    ('glass', 'tumbler', 'wine glass'),
+    ('bottle', 'water bottle', 'flask'),
+    ('plate', 'dish', 'platter'),
+    ('bowl',),
+    ('fork',), ('knife',), ('spoon',),
+    ('pan', 'frying pan', 'skillet'), ('pot', 'saucepan'),
+    ('car', 'automobile', 'sedan', 'hatchback'),
+    ('truck', 'lorry', 'pickup truck'),
+    ('bus',),
+    ('bicycle', 'bike'),
+    ('motorcycle', 'motorbike', 'scooter'),
+    ('dog', 'puppy', 'hound'),
+    ('cat', 'kitten', 'kitty'),
+    ('bird',), ('horse', 'pony'),
+    ('chair', 'stool'),
+    ('table', 'desk'),
+    ('sofa', 'couch', 'settee'),
+    ('bed',), ('shelf', 'bookshelf', 'bookcase'),
+    ('laptop', 'notebook computer', 'macbook'),
+    ('phone', 'cellphone', 'cell phone', 'smartphone', 'mobile phone', 'iphone', 'telephone'),
+    ('television', 'tv'),
+    ('keyboard',), ('mouse',), ('camera',),
+    ('book', 'novel', 'textbook'),
+    ('notebook', 'notepad', 'journal'),
+    ('pen', 'ballpoint'), ('pencil',),
+    ('paper', 'document'),
+    ('bag', 'handbag', 'purse', 'tote'),
+    ('backpack', 'rucksack', 'knapsack'),
+    ('suitcase', 'luggage'),
+    ('umbrella',),
+    ('shirt', 'tshirt', 't shirt', 'blouse'),
+    ('jacket', 'coat', 'hoodie'),
+    ('shoe', 'sneaker', 'boot'),
+    ('hat', 'beanie'),
+    ('ball', 'football', 'soccer ball', 'basketball'),
+    ('apple',), ('banana',), ('orange',), ('lemon',),
+    ('sandwich',), ('pizza',), ('cake', 'cupcake'), ('bread', 'loaf'),
+    ('flower', 'rose', 'tulip', 'bouquet'),
+    ('plant', 'houseplant'),
+    ('tree',),
+    ('person', 'people'),
+    ('man', 'guy'), ('woman', 'lady'), ('child', 'kid'), ('boy',), ('girl',),
+    ('key',), ('wallet',), ('watch', 'wristwatch'), ('clock',),
+    ('lamp',), ('candle',), ('box', 'carton', 'package', 'parcel'),
+]
+
+# Canonical word -> broader canonical word ('fruit' is satisfied by an apple)
+HYPERNYMS = {
+    'cup': 'drinkware', 'glass': 'drinkware', 'bottle': 'container',
+    'drinkware': 'container', 'bowl': 'dishware', 'plate': 'dishware',
+    'fork': 'cutlery', 'knife': 'cutlery', 'spoon': 'cutlery',
+    'pan': 'cookware', 'pot': 'cookware',
+    'car': 'vehicle', 'truck': 'vehicle', 'bus': 'vehicle',
+    'bicycle': 'vehicle', 'motorcycle': 'vehicle',
+    'dog': 'animal', 'cat': 'animal', 'bird': 'animal', 'horse': 'animal',
+    'chair': 'furniture', 'table': 'furniture', 'sofa': 'furniture',
+    'bed': 'furniture', 'shelf': 'furniture',
+    'laptop': 'electronics', 'phone': 'electronics', 'television': 'electronics',
+    'keyboard': 'electronics', 'mouse': 'electronics', 'camera': 'electronics',
+    'book': 'stationery', 'notebook': 'stationery', 'pen': 'stationery',
+    'pencil': 'stationery', 'paper': 'stationery',
+    'bag': 'luggage', 'backpack': 'luggage', 'suitcase': 'luggage',
+    'shirt': 'clothing', 'jacket': 'clothing', 'shoe': 'clothing', 'hat': 'clothing',
+    'apple': 'fruit', 'banana': 'fruit', 'orange': 'fruit', 'lemon': 'fruit',
+    'fruit': 'food', 'sandwich': 'food', 'pizza': 'food', 'cake': 'food', 'bread': 'food',
+    'flower': 'plant', 'tree': 'plant',
+    # Siblings under 'person' never match each other: a kid is not a man
+    'man': 'person', 'woman': 'person', 'child': 'person', 'boy': 'person', 'girl': 'person',
+    'watch': 'accessory', 'wallet': 'accessory', 'umbrella': 'accessory', 'key': 'accessory',
+}
+
+# Scene words a caption may contain that name neither the item nor a rival object
+SCENE_WORDS = {
+    'room', 'kitchen', 'office', 'floor', 'wall', 'window', 'door', 'street', 'road',
+    'grass', 'field', 'park', 'beach', 'sky', 'water', 'ground', 'counter', 'background',
+    'building', 'house', 'sidewalk', 'lot', 'parking', 'yard', 'garden', 'hand', 'top',
+    'front', 'side', 'corner', 'middle', 'sun', 'snow', 'wood', 'tile', 'bedroom',
+    'living', 'hotel', 'restaurant', 'store', 'shop', 'city', 'rain', 'wrist', 'arm',
+}
+
+# Words that never decide a match
+STOPWORDS = {
+    'a', 'an', 'the', 'of', 'on', 'in', 'at', 'with', 'and', 'or', 'to', 'is', 'are',
+    'there', 'it', 'its', 'this', 'that', 'some', 'two', 'three', 'one', 'several', 'many',
+    'his', 'her', 'their', 'next', 'near', 'by', 'from', 'for', 'up', 'down', 'over',
+    'under', 'close', 'closeup', 'photo', 'picture', 'image', 'shot', 'view', 'other',
+    'sitting', 'standing', 'holding', 'lying', 'laying', 'using', 'looking', 'being',
+    'has', 'have', 'full', 'empty', 'small', 'large', 'big', 'little', 'old', 'new',
+    'white', 'black', 'red', 'blue', 'green', 'yellow', 'brown', 'gray', 'grey', 'pink',
+    'purple', 'silver', 'gold', 'wooden', 'metal', 'plastic', 'dark', 'bright',
+    'sleeping', 'leaning', 'parked', 'wearing', 'riding', 'walking', 'eating', 'playing',
+    'pair', 'set', 'stack', 'pile', 'bunch', 'group', 'slice', 'piece', 'cut', 'half',
+}
+
+IRREGULAR_PLURALS = {
+    'people': 'people', 'men': 'man', 'women': 'woman', 'children': 'child',
+    'knives': 'knife', 'leaves': 'leaf', 'feet': 'foot', 'mice': 'mouse',
+    'teeth': 'tooth', 'buses': 'bus', 'shelves': 'shelf', 'loaves': 'loaf',
+}
+
+
+def lemmatize(word):
+    """Singular form of an English noun; good enough for caption vocabulary"""
+    if word in IRREGULAR_PLURALS:
+        return IRREGULAR_PLURALS[word]
+    if len(word) <= 3 or word.endswith(('ss', 'us', 'is')):
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith(('ches', 'shes', 'xes', 'zes', 'sses')):
+        return word[:-2]
+    if word.endswith('s'):
+        return word[:-1]
+    return word
+
+
+def _tokens(text):
+    return [lemmatize(word) for word in re.findall(r"[a-z]+", (text or '').lower())]
+
+
+def _terms(tokens):
+    """Lemmas plus adjacent pairs, so 'cell phone' and 'water bottle' are looked up whole"""
+    return tokens + [f'{a} {b}' for a, b in zip(tokens, tokens[1:])]
+
+
+class ItemMatcher:
+    """Decides locally whether a caption shows an item: True, False or None (ask the LLM).
+
+    ``embed`` optionally maps a list of strings to normalized vectors; its
+    cosine similarity answers True at or above ``yes_similarity`` and False
+    at or below ``no_similarity`` when the table cannot decide.
+    """
+
+    def __init__(self, synonyms=SYNONYMS, hypernyms=HYPERNYMS, embed=None,
+                 yes_similarity=0.75, no_similarity=0.25):
+        self.canonical = {}
+        for group in synonyms:
+            for word in group:
+                self.canonical[' '.join(_tokens(word))] = group[0]
+        self.hypernyms = hypernyms
+        self.categories = set(hypernyms.values())
+        self.embed = embed
+        self.yes_similarity = yes_similarity
+        self.no_similarity = no_similarity
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    def _ancestors(self, concept):
+        seen = []
+        while concept in self.hypernyms and concept not in seen:
+            concept = self.hypernyms[concept]
+            seen.append(concept)
+        return seen
+
+    def _concepts(self, terms):
+        """Known concepts among ``terms``, plus whether any content word is unknown"""
+        concepts, unknown = set(), False
+        for term in terms:
+            concept = self.canonical.get(term)
+            if concept is None and term in self.categories:
+                concept = term
+            if concept is not None:
+                concepts.add(concept)
+            elif ' ' not in term and term not in STOPWORDS and term not in SCENE_WORDS:
+                unknown = True
+        return concepts, unknown
+
+    def _match_table(self, item, caption):
+        item_tokens = [t for t in _tokens(item) if t not in STOPWORDS]
+        if not item_tokens:
+            return None
+        caption_terms = _terms(_tokens(caption))
+        if ' '.join(item_tokens) in caption_terms:
+            return True
+
+        # The whole item ('coffee mug') or else its head noun ('mug') names the concept
+        target = self.canonical.get(' '.join(item_tokens)) or self.canonical.get(item_tokens[-1])
+        if target is None and item_tokens[-1] in self.categories:
+            target = item_tokens[-1]
+        if target is None:
+            return True if item_tokens[-1] in caption_terms else None
+
+        seen, unknown = self._concepts(caption_terms)
+        if any(concept == target or target in self._ancestors(concept) for concept in seen):
+            return True
+        # Something broader ('fruit' for 'apple') or a sibling ('glass' for 'cup') is a judgement call
+        ancestors = self._ancestors(target)
+        if seen & set(ancestors) or any(ancestors and self._ancestors(concept)[:1] == ancestors[:1]
+                                        for concept in seen):
+            return None
+        # Every content word is understood and none of them is the item
+        if seen and not unknown:
+            return False
+        return None
+
+    def _match_embedding(self, item, caption):
+        item_vector, caption_vector = self.embed([item, caption])
+        similarity = float(sum(a * b for a, b in zip(item_vector, caption_vector)))
+        if similarity >= self.yes_similarity:
+            return True
+        if similarity <= self.no_similarity:
+            return False
+        return None
+
+    def match(self, item, caption):
+        decision = self._match_table(item, caption)
+        if decision is None and self.embed is not None:
+            decision = self._match_embedding(item, caption)
+        with self._lock:
+            self.stats['escalated' if decision is None else ('yes' if decision else 'no')] += 1
+        return decision
+
+    def escalation_rate(self):
+        total = sum(self.stats.values())
+        return self.stats['escalated'] / total if total else 0.0
+
+
+def load_embedder(model_name):
+    """Normalized sentence embeddings from a local sentence-transformers model"""
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name)
+    return lambda texts: model.encode(texts, normalize_embeddings=True)
+
+
+_matcher_lock = threading.Lock()
+
+
+def get_item_matcher(app):
+    """The app's ItemMatcher, or None when ITEM_MATCHER is off"""
+    if not app.config.get('ITEM_MATCHER', True):
+        return None
+    with _matcher_lock:
+        matcher = app.extensions.get('item_matcher')
+        if matcher is None:
+            embed = None
+            model_name = app.config.get('ITEM_MATCH_EMBEDDING_MODEL')
+            if model_name:
+                try:
+                    embed = load_embedder(model_name)
+                except Exception as e:
+                    app.logger.warning(f"Item matching without embeddings: {str(e)}")
+            matcher = ItemMatcher(embed=embed,
+                                  yes_similarity=app.config.get('ITEM_MATCH_YES_SIMILARITY', 0.75),
+                                  no_similarity=app.config.get('ITEM_MATCH_NO_SIMILARITY', 0.25))
+            app.extensions['item_matcher'] = matcher
+        return matcher
@@ -0,0 +1,267 @@
+"""
+LLM access shared by the chatbot and photo verification.
+
+Backends are chosen with LLM_BACKEND:
+  - 'gemini': Google Gemini (LLM_MODEL); one client per process, so every
+              route shares its connection
+  - 'stub':   deterministic answers from the JSON fixtures in
+              LLM_STUB_FIXTURES, with simulated latency, for offline load tests
+
+Every call gets LLM_TIMEOUT seconds. Timeouts, rate limiting and server
+errors are retried up to LLM_MAX_RETRIES times with exponential backoff and
+full jitter; other errors are raised at once. stream() yields the answer as
+it is generated; it only retries until the first chunk has arrived.
+
+Answers to templated prompts can be kept in the prompt cache
+(PROMPT_CACHE_TTL, PROMPT_CACHE_MAX_ENTRIES), keyed by the template's
+version and the user's input lowercased with whitespace collapsed, so
+"Camping  trip" and "camping trip" share one entry.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from flask import current_app
+from src.cache import CacheStats, MemoryBackend, NullBackend
+
+
+class LLMUnavailable(RuntimeError):
+    """The LLM did not answer, even after retrying"""
+
+
+def is_transient(error):
+    """Whether retrying ``error`` could succeed"""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    try:
+        from google.api_core import exceptions
+    except ImportError:
+        return False
+    return isinstance(error, (exceptions.DeadlineExceeded, exceptions.ServiceUnavailable,
+                              exceptions.TooManyRequests, exceptions.InternalServerError))
+
+
+class GeminiBackend:
+    name = 'gemini'
+
+    def __init__(self, api_key, model_name, transport=None):
+        import google.generativeai as genai
+
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY environment variable is not set")
+        genai.configure(api_key=api_key, transport=transport)
+        self.model = genai.GenerativeModel(model_name=model_name)
+
+    def generate(self, prompt, timeout):
+        return self.model.generate_content(prompt, request_options={"timeout": timeout}).text
+
+    def stream(self, prompt, timeout):
+        for chunk in self.model.generate_content(prompt, stream=True, request_options={"timeout": timeout}):
+            yield chunk.text
+
+
+class StubBackend:
+    """Answers from fixtures: the first rule whose regex matches the prompt wins.
+
+    Fixture format::
+
+        {"default": {"response": "...", "latency_ms": 50},
+         "rules": [{"match": "Required item: \\"(?P<item>[^\\"]*)\\"",
+                    "response": "true", "latency_ms": 400, "jitter_ms": 100,
+                    "first_token_ms": 200}]}
+
+    ``response`` may be a string (formatted with the match's named groups) or
+    any JSON value, which is returned serialized. Latency jitter is seeded by
+    the prompt, so the same prompt always takes the same time. When streamed,
+    the first ``chunk_chars`` characters arrive after ``first_token_ms`` (by
+    default the whole latency) and the rest evenly over the remaining time.
+    """
+    name = 'stub'
+
+    def __init__(self, fixtures, sleep=time.sleep):
+        self.rules = [(re.compile(rule['match'], re.S), rule) for rule in fixtures.get('rules', [])]
+        self.default = fixtures.get('default', {"response": ""})
+        self.sleep = sleep
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        with open(path) as f:
+            return cls(json.load(f), **kwargs)
+
+    def _answer(self, prompt):
+        for pattern, rule in self.rules:
+            match = pattern.search(prompt)
+            if match:
+                return rule, match.groupdict()
+        return self.default, {}
+
+    def _plan(self, prompt):
+        """The answer, its total latency and its first-token latency in seconds"""
+        rule, groups = self._answer(prompt)
+        latency = rule.get('latency_ms', 0)
+        first_token = rule.get('first_token_ms', latency)
+        if rule.get('jitter_ms'):
+            seed = int.from_bytes(hashlib.sha256(prompt.encode()).digest()[:8], 'big')
+            scale = 1 + random.Random(seed).uniform(-rule['jitter_ms'], rule['jitter_ms']) / max(latency, 1)
+            latency, first_token = latency * scale, first_token * scale
+        response = rule.get('response', '')
+        text = response.format(**groups) if isinstance(response, str) else json.dumps(response)
+        return text, max(latency, 0) / 1000, max(first_token, 0) / 1000, rule.get('chunk_chars', 32)
+
+    def _wait(self, seconds, timeout):
+        if seconds > timeout:
+            self.sleep(timeout)
+            raise TimeoutError(f"Stub answer took longer than {timeout}s")
+        self.sleep(seconds)
+
+    def generate(self, prompt, timeout):
+        text, latency, _, _ = self._plan(prompt)
+        self._wait(latency, timeout)
+        return text
+
+    def stream(self, prompt, timeout):
+        text, latency, first_token, chunk_chars = self._plan(prompt)
+        chunks = [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)] or ['']
+        self._wait(first_token, timeout)
+        yield chunks[0]
+        step = max(latency - first_token, 0) / max(len(chunks) - 1, 1)
+        for chunk in chunks[1:]:
+            self.sleep(step)
+            yield chunk
+
+
+class LLMClient:
+    """Calls a backend with a per-call timeout and bounded, jittered retries"""
+
+    def __init__(self, backend, timeout=30.0, max_retries=2, base_delay=0.5, max_delay=8.0,
+                 sleep=time.sleep):
+        self.backend = backend
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self.calls = self.retries = self.failures = 0
+
+    def _count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def generate(self, prompt):
+        """The model's text answer to ``prompt``; raises LLMUnavailable once retries run out"""
+        self._count('calls')
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.backend.generate(prompt, self.timeout)
+            except Exception as e:
+                if not is_transient(e):
+                    raise
+                if attempt == self.max_retries:
+                    self._count('failures')
+                    raise LLMUnavailable(f"LLM request failed after {attempt + 1} attempt(s): {str(e)}") from e
+            self._backoff(attempt)
+
+    def stream(self, prompt):
+        """Yield the answer to ``prompt`` in chunks as the model produces them.
+
+        Failures before the first chunk are retried like generate(); once text
+        has been yielded, an error is raised to the caller as is.
+        """
+        self._count('calls')
+        for attempt in range(self.max_retries + 1):
+            started = False
+            try:
+                for chunk in self.backend.stream(prompt, self.timeout):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                if started or not is_transient(e):
+                    raise
+                if attempt == self.max_retries:
+                    self._count('failures')
+                    raise LLMUnavailable(f"LLM request failed after {attempt + 1} attempt(s): {str(e)}") from e
+            self._backoff(attempt)
+
+    def _backoff(self, attempt):
+        self._count('retries')
+        # Full jitter: concurrent callers hitting the same outage do not retry in step
+        self.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+
+
+def prompt_key(template, user_input):
+    """``template`` names the prompt and its version; bump the version whenever its wording changes"""
+    normalized = ' '.join((user_input or '').lower().split())
+    return f"{template}:{normalized}"
+
+
+class PromptCache:
+    """LRU of model answers with expiry; a TTL or size of 0 disables it"""
+
+    def __init__(self, max_entries=1000, ttl=21600):
+        self.backend = MemoryBackend(max_entries) if max_entries and ttl else NullBackend()
+        self.ttl = ttl
+        self.stats = CacheStats()
+
+    def get(self, template, user_input):
+        value = self.backend.get(prompt_key(template, user_input))
+        self.stats.record('hits' if value is not None else 'misses')
+        return value
+
+    def set(self, template, user_input, response):
+        self.backend.set(prompt_key(template, user_input), response, self.ttl)
+        self.stats.record('sets')
+
+    def as_dict(self):
+        stats = self.stats.as_dict()
+        stats['entries'] = len(self.backend)
+        return stats
+
+
+def create_backend(config):
+    backend_name = config.get('LLM_BACKEND', 'gemini')
+    if backend_name == 'gemini':
+        return GeminiBackend(config.get('GEMINI_API_KEY') or os.getenv("GEMINI_API_KEY"),
+                             config.get('LLM_MODEL', 'gemini-1.5-flash'), config.get('LLM_TRANSPORT'))
+    if backend_name == 'stub':
+        return StubBackend.from_file(config['LLM_STUB_FIXTURES'])
+    raise ValueError(f"Unknown LLM_BACKEND: {backend_name!r}")
+
+
+class LLM:
+    """Flask extension holding the app's LLMClient"""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['llm'] = LLMClient(
+            create_backend(app.config),
+            timeout=app.config.get('LLM_TIMEOUT', 30),
+            max_retries=app.config.get('LLM_MAX_RETRIES', 2),
+            base_delay=app.config.get('LLM_RETRY_BASE_DELAY', 0.5),
+            max_delay=app.config.get('LLM_RETRY_MAX_DELAY', 8.0),
+        )
+        app.extensions['prompt_cache'] = PromptCache(
+            app.config.get('PROMPT_CACHE_MAX_ENTRIES', 1000),
+            app.config.get('PROMPT_CACHE_TTL', 21600),
+        )
+
+    @property
+    def client(self):
+        return current_app.extensions['llm']
+
+    @property
+    def prompts(self):
+        return current_app.extensions['prompt_cache']
+
+    def generate(self, prompt):
+        return self.client.generate(prompt)
+
+    def stream(self, prompt):
+        return self.client.stream(prompt)
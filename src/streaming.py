@@ -0,0 +1,112 @@
+"""
+Server-Sent Events helpers and an incremental parser for JSON arrays that
+arrive a few characters at a time, as model output does when streamed.
+"""
+import json
+from flask import Response
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def event_stream_response(events):
+    """A text/event-stream response for a generator of encoded events; wrap it in stream_with_context"""
+    response = Response(events, mimetype="text/event-stream")
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def wants_event_stream(request):
+    """Whether the client asked for Server-Sent Events rather than one JSON body"""
+    return request.accept_mimetypes.best_match(
+        ['application/json', 'text/event-stream'], default='application/json') == 'text/event-stream'
+
+
+class JSONArrayParser:
+    """Yields the elements of a JSON array as soon as each one is complete.
+
+    Text before the opening ``[`` (a markdown fence, a sentence) and after
+    the closing ``]`` is ignored. With ``of_objects``, only a ``[`` followed
+    by ``{`` or ``]`` opens the array, so brackets in the prose around it
+    ("here are [8] tasks") are skipped too. Only nesting depth and string
+    state are tracked as text arrives; each element is decoded with
+    json.loads once it is whole, so a malformed element raises
+    json.JSONDecodeError.
+    """
+
+    def __init__(self, of_objects=False):
+        self.of_objects = of_objects
+        self._element = []
+        self._depth = 0
+        self._opening = self._started = self.finished = False
+        self._in_string = self._escaped = False
+
+    def feed(self, text):
+        """The elements completed by ``text``"""
+        elements = []
+        for char in text:
+            if self.finished:
+                break
+            if not self._started:
+                if self._opening and not char.isspace():
+                    self._opening = False
+                    self._started = not self.of_objects or char in '{]'
+                if not self._started:
+                    self._opening = self._opening or char == '['
+                    continue
+            if self._in_string:
+                self._element.append(char)
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+                self._element.append(char)
+            elif char in '[{':
+                self._depth += 1
+                self._element.append(char)
+            elif char in ']}' and self._depth:
+                self._depth -= 1
+                self._element.append(char)
+                if not self._depth:
+                    self._emit(elements)
+            elif char == ']':
+                self._emit(elements)
+                self.finished = True
+            elif char == ',' and not self._depth:
+                self._emit(elements)
+            else:
+                self._element.append(char)
+        return elements
+
+    def close(self):
+        """Raise json.JSONDecodeError unless a whole array was read"""
+        if not self.finished:
+            pending = ''.join(self._element)
+            message = "Unterminated JSON array" if self._started else "Expecting '['"
+            raise json.JSONDecodeError(message, pending, len(pending))
+
+    def _emit(self, elements):
+        text = ''.join(self._element).strip()
+        self._element = []
+        if text:
+            elements.append(json.loads(text))
+
+
+def iter_json_array(chunks, of_objects=False):
+    """Elements of the JSON array spread over ``chunks``, as each completes"""
+    parser = JSONArrayParser(of_objects)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    parser.close()
+
+
+def extract_json_array(text, of_objects=True):
+    """The elements of the JSON array in a complete model answer, wherever it sits in the text"""
+    return list(iter_json_array([text], of_objects))
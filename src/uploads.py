@@ -0,0 +1,209 @@
+"""
+Files uploaded under the static folder (task_images/, profile_pics/).
+
+Rows store paths relative to the static folder. Deleting rows never waits
+on the disk: routes commit first and then hand the paths to
+schedule_removal, which a background worker drains. Files whose removal is
+lost (e.g. the process exits first), replaced uploads and uploads of failed
+requests are reclaimed by collect_orphaned_uploads, run from
+``flask uploads gc`` (e.g. cron) or, when UPLOAD_GC_INTERVAL is set, by a
+thread in each web process started with its first request.
+"""
+import os
+import queue
+import tempfile
+import threading
+import time
+from itertools import islice
+import sqlalchemy as sqla
+from flask import Request, current_app
+from src import db
+from src.database.models import Task, User
+
+# Directories under the static folder that hold user uploads
+UPLOAD_DIRS = ('task_images', 'profile_pics')
+
+
+class SpooledUploadRequest(Request):
+    """Request whose file parts stay in memory only up to UPLOAD_SPOOL_SIZE bytes.
+
+    Werkzeug buffers uploads under 500 KB entirely in memory and larger ones
+    on disk; spooling makes the threshold per-file and configurable.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(
+            max_size=current_app.config.get('UPLOAD_SPOOL_SIZE', 512 * 1024), mode='w+b')
+
+
+def static_path(relative_path, root):
+    """Absolute path of a stored link, or None if it points outside ``root``"""
+    root = os.path.abspath(root)
+    path = os.path.abspath(os.path.join(root, relative_path))
+    if os.path.commonpath([root, path]) != root or path == root:
+        return None
+    return path
+
+
+def remove_files(paths):
+    """Delete files, skipping any that are already gone; returns (files removed, bytes freed)"""
+    removed = freed = 0
+    for path in paths:
+        try:
+            size = os.stat(path).st_size
+            os.remove(path)
+        except OSError:
+            continue
+        removed += 1
+        freed += size
+    return removed, freed
+
+
+class CleanupWorker:
+    """A single daemon thread that removes files handed to it"""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, app, paths):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._queue.put((app, paths))
+
+    def join(self):
+        """Block until every submitted path has been processed"""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            app, paths = self._queue.get()
+            try:
+                removed, freed = remove_files(paths)
+                app.logger.info(f"Removed {removed} uploaded file(s), {freed} bytes")
+            except Exception as e:
+                app.logger.error(f"Upload cleanup failed: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+
+cleanup_worker = CleanupWorker()
+
+
+def schedule_removal(relative_paths):
+    """Queue stored upload links for deletion once the current request has committed"""
+    root = current_app.static_folder
+    paths = [path for path in (static_path(link, root) for link in relative_paths if link) if path]
+    if paths:
+        cleanup_worker.submit(current_app._get_current_object(), paths)
+
+
+def iter_upload_files(root, directories=UPLOAD_DIRS):
+    """Stream (link, path, size, mtime) for every upload without listing a directory into memory"""
+    for directory in directories:
+        try:
+            entries = os.scandir(os.path.join(root, directory))
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.name.startswith('.') or not entry.is_file(follow_symlinks=False):
+                    continue
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                yield f'{directory}/{entry.name}', entry.path, stat.st_size, stat.st_mtime
+
+
+def referenced_links(links):
+    """The subset of ``links`` still stored on a task or a user, in one query"""
+    if not links:
+        return set()
+    return set(db.session.scalars(sqla.union(
+        sqla.select(Task.image_link).where(Task.image_link.in_(links)),
+        sqla.select(User.profile_picture).where(User.profile_picture.in_(links)),
+    )).all())
+
+
+def collect_orphaned_uploads(root, batch_size=500, max_removals=None, min_age=3600,
+                             pause=0.0, dry_run=False):
+    """Delete uploads no row references, one batch of files at a time.
+
+    Files younger than ``min_age`` seconds are skipped, since their row may
+    not be committed yet. ``max_removals`` and ``pause`` (seconds between
+    batches) bound the disk work of a single run; later runs pick up where
+    the limits stopped this one. Returns a report dict.
+    """
+    report = {"scanned": 0, "orphaned": 0, "removed": 0, "reclaimed_bytes": 0}
+    cutoff = time.time() - min_age
+    files = iter_upload_files(root)
+    while max_removals is None or report["orphaned"] < max_removals:
+        batch = list(islice(files, batch_size))
+        if not batch:
+            break
+        report["scanned"] += len(batch)
+        candidates = {link: (path, size) for link, path, size, mtime in batch if mtime <= cutoff}
+        referenced = referenced_links(list(candidates))
+        orphans = [candidates[link] for link in candidates if link not in referenced]
+        if max_removals is not None:
+            orphans = orphans[:max_removals - report["orphaned"]]
+        report["orphaned"] += len(orphans)
+        if dry_run:
+            report["reclaimed_bytes"] += sum(size for _, size in orphans)
+        else:
+            removed, freed = remove_files(path for path, _ in orphans)
+            report["removed"] += removed
+            report["reclaimed_bytes"] += freed
+        if pause:
+            time.sleep(pause)
+    return report
+
+
+def _collect_periodically(app, interval):
+    while True:
+        time.sleep(interval)
+        with app.app_context():
+            try:
+                report = collect_orphaned_uploads(
+                    app.static_folder, min_age=app.config.get('UPLOAD_GC_MIN_AGE', 3600),
+                    max_removals=app.config.get('UPLOAD_GC_MAX_REMOVALS') or None,
+                    pause=app.config.get('UPLOAD_GC_PAUSE', 0.0))
+                app.logger.info(f"Upload GC: {report}")
+            except Exception as e:
+                app.logger.error(f"Upload GC failed: {str(e)}")
+            finally:
+                db.session.remove()
+
+
+_gc_lock = threading.Lock()
+_gc_thread = None
+
+
+def start_upload_gc(app, interval):
+    """Run the orphan sweep every ``interval`` seconds in a daemon thread (one per process)"""
+    global _gc_thread
+    with _gc_lock:
+        if _gc_thread is None or not _gc_thread.is_alive():
+            _gc_thread = threading.Thread(target=_collect_periodically, args=(app, interval), daemon=True)
+            _gc_thread.start()
+    return _gc_thread
+
+
+def init_upload_gc(app):
+    """Sweep every UPLOAD_GC_INTERVAL seconds in the web server, starting with its first request.
+
+    CLI commands (and 'flask uploads gc' itself) never serve a request, so
+    they never start a second sweeper.
+    """
+    interval = app.config.get('UPLOAD_GC_INTERVAL', 0)
+    if not interval or app.testing:
+        return
+
+    @app.before_request
+    def start_upload_sweeper():
+        if _gc_thread is None:
+            start_upload_gc(app, interval)
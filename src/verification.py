@@ -0,0 +1,108 @@
+"""
+Photo verification for tasks that require an item: caption the upload,
+decide whether the caption shows the item, and attach the photo.
+
+complete_task_with_image runs these steps inside the request; verification
+jobs (src/verification_jobs.py) run the same steps in a background worker.
+"""
+import os
+import shutil
+from flask import current_app
+from werkzeug.utils import secure_filename
+from src import db, llm
+from src.captioning import CaptionUnavailable, get_captioner, open_for_captioning
+from src.database.verification_cache import (
+    cached_caption, cached_verdict, perceptual_hash, store_caption, store_verdict, stream_digest,
+)
+from src.item_matching import get_item_matcher
+
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+
+
+class InvalidImage(ValueError):
+    """The upload could not be decoded as an image"""
+
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def caption_upload(stream):
+    """Caption a seekable upload stream, reusing the cached caption of identical bytes.
+
+    Raises InvalidImage, CaptionUnavailable or TimeoutError. Commits the
+    caption cache entry.
+    """
+    # Identical bytes were validated and captioned before
+    digest = stream_digest(stream)
+    caption = cached_caption(digest)
+    if caption is None:
+        # Validate and decode in one pass, straight to the captioning size
+        try:
+            img = open_for_captioning(stream)
+        except Exception as e:
+            raise InvalidImage(str(e)) from e
+
+        phash = perceptual_hash(img) if current_app.config.get('CAPTION_CACHE_PHASH') else None
+        if phash is not None:
+            caption = cached_caption(digest, phash)
+
+        if caption is None:
+            # Generate a caption in the captioning service, batched with concurrent uploads
+            caption = get_captioner(current_app).caption(
+                img, timeout=current_app.config.get('CAPTION_TIMEOUT', 30))
+        store_caption(digest, caption, phash)
+    db.session.commit()
+    return caption
+
+
+def relation_prompt(required_item, caption):
+    return f"""
+        Analyze if the following image caption likely describes an image is related to the  required item.
+        Required item: "{required_item}"
+        Caption: "{caption}"
+        Try to be easy with this, and don't be too strict.
+        Consider synonyms, context, and partial matches (e.g., 'mug' for 'cup', 'car' in 'parking lot with cars').
+        Respond with 'true' if the item is likely present, 'false' if not,just "true" or "false".
+        """
+
+
+def judge_relation(required_item, caption):
+    """"true", "false", or Gemini's raw answer when it gave neither"""
+    # Clear matches and misses are settled locally; only ambiguous pairs reach Gemini
+    matcher = get_item_matcher(current_app)
+    related = matcher.match(required_item, caption) if matcher else None
+    if related is None:
+        related = cached_verdict(required_item, caption)
+    if related is not None:
+        return "true" if related else "false"
+
+    relation = llm.generate(relation_prompt(required_item, caption)).strip().lower()
+    # Only a clean answer is worth remembering
+    if relation in ("true", "false"):
+        store_verdict(required_item, caption, relation == "true")
+        db.session.commit()
+    return relation
+
+
+def attach_task_image(task, stream, filename):
+    """Replace the task's photo with the upload and mark it completed; the caller commits"""
+    # Delete old image if exists
+    if task.image_link:
+        old_image_path = os.path.join(current_app.static_folder, task.image_link)
+        if os.path.exists(old_image_path):
+            try:
+                os.remove(old_image_path)
+            except Exception:
+                pass  # Continue even if deletion fails
+
+    # Save new image
+    filename = secure_filename(filename)
+    image_folder = os.path.join(current_app.static_folder, 'task_images')
+    os.makedirs(image_folder, exist_ok=True)
+    stream.seek(0)
+    with open(os.path.join(image_folder, filename), 'wb') as f:
+        shutil.copyfileobj(stream, f)
+
+    task.image_link = f'task_images/{filename}'
+    task.completed = True
@@ -0,0 +1,294 @@
+"""
+Background photo verification.
+
+POST /task_router/verify_jobs/<task_id> stores the photo under
+VERIFY_JOB_DIR, inserts a queued VerificationJob and returns its id at
+once. Jobs are run by VERIFY_JOB_WORKERS threads (2 by default) inside
+each web process, started by its first request, and/or by ``flask verify
+work``, a worker process started next to the web server with access to the
+same VERIFY_JOB_DIR; set VERIFY_JOB_WORKERS=0 to leave them all to it.
+Other CLI commands (``flask db upgrade``, ``flask shell``, ...) never start
+workers. Workers claim queued rows with a conditional UPDATE, so several
+processes can share the table without running a job twice. They caption
+the photo, ask for a verdict and update the task exactly as
+complete_task_with_image does. Clients poll the job; with
+VERIFY_JOB_EVENTS they may follow it over Server-Sent Events instead, up
+to VERIFY_JOB_MAX_STREAMS streams per process.
+
+The table, not the in-process queue, is the source of truth: a job whose
+process died is put back in the queue once it has been running longer
+than VERIFY_JOB_STALE_AFTER, and idle workers check the table every
+VERIFY_JOB_POLL_INTERVAL seconds for jobs accepted elsewhere.
+"""
+import os
+import queue
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+import sqlalchemy as sqla
+from flask import current_app
+from src import db
+from src.captioning import CaptionUnavailable
+from src.database.invalidation import invalidate_event
+from src.database.models import Task, VerificationJob
+from src.uploads import remove_files
+from src.streaming import sse_event
+from src.verification import InvalidImage, allowed_file, attach_task_image, caption_upload, judge_relation
+
+FINISHED = ('done', 'failed')
+
+
+def job_dir(app):
+    return app.config.get('VERIFY_JOB_DIR') or os.path.join(app.instance_path, 'verification_jobs')
+
+
+def upload_path(app, job_id):
+    return os.path.join(job_dir(app), job_id)
+
+
+def create_job(task, user_id, file):
+    """Store the upload and add a queued job; the caller commits, then calls job_runner.notify"""
+    job = VerificationJob(id=secrets.token_hex(16), task_id=task.id, user_id=user_id,
+                          filename=file.filename, status='queued', attempts=0)
+    os.makedirs(job_dir(current_app), exist_ok=True)
+    file.stream.seek(0)
+    file.save(upload_path(current_app, job.id))
+    db.session.add(job)
+    return job
+
+
+def job_message(job):
+    if job.status == 'done':
+        if job.related:
+            return "Task completed successfully! Great job!!"
+        return "The required item was not found in the image. Please try again"
+    if job.status == 'failed':
+        return job.error
+    return "Verifying your photo..."
+
+
+def job_state(job):
+    return {
+        "job_id": job.id,
+        "task_id": job.task_id,
+        "status": job.status,
+        "caption": job.caption,
+        "related": job.related,
+        "message": job_message(job),
+    }
+
+
+_streams_lock = threading.Lock()
+_open_streams = 0
+
+
+def open_job_stream(limit):
+    """Reserve one of ``limit`` event streams in this process; False when all are taken"""
+    global _open_streams
+    with _streams_lock:
+        if _open_streams >= limit:
+            return False
+        _open_streams += 1
+        return True
+
+
+def close_job_stream():
+    global _open_streams
+    with _streams_lock:
+        _open_streams -= 1
+
+
+def iter_job_events(job_id, timeout, interval=2.0, heartbeat=15):
+    """Server-Sent Events for a job: a 'status' event per change, ending once it has finished.
+
+    The stream also ends after ``timeout`` seconds; EventSource reconnects on its own.
+    """
+    last, started = None, time.monotonic()
+    quiet_since = started
+    while True:
+        job = db.session.get(VerificationJob, job_id, populate_existing=True)
+        state = job_state(job) if job is not None else None
+        # Do not hold a read transaction open while sleeping; it would block the worker's commit
+        db.session.rollback()
+        if state is None:
+            return
+        now = time.monotonic()
+        if state != last:
+            yield sse_event('status', state)
+            last, quiet_since = state, now
+        elif now - quiet_since >= heartbeat:
+            yield ": keep-alive\n\n"
+            quiet_since = now
+        if state['status'] in FINISHED or now - started >= timeout:
+            return
+        time.sleep(interval)
+
+
+def claim_job(job_id=None):
+    """Mark one queued job (``job_id``, else the oldest due) running; returns its id, or None if taken.
+
+    A job that failed before is only due again VERIFY_JOB_RETRY_DELAY seconds later.
+    """
+    if job_id is None:
+        retry_cutoff = datetime.utcnow() - timedelta(seconds=current_app.config.get('VERIFY_JOB_RETRY_DELAY', 30))
+        job_id = db.session.scalar(
+            sqla.select(VerificationJob.id)
+            .where(VerificationJob.status == 'queued',
+                   sqla.or_(VerificationJob.attempts == 0, VerificationJob.updated_at <= retry_cutoff))
+            .order_by(VerificationJob.created_at).limit(1))
+        if job_id is None:
+            return None
+    claimed = db.session.execute(
+        sqla.update(VerificationJob)
+        .where(VerificationJob.id == job_id, VerificationJob.status == 'queued')
+        .values(status='running', attempts=VerificationJob.attempts + 1, updated_at=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    return job_id if claimed else None
+
+
+def _finish(job, status, error=None):
+    job.status = status
+    job.error = error
+    job.updated_at = datetime.utcnow()
+    db.session.commit()
+    if status in FINISHED:
+        remove_files([upload_path(current_app, job.id)])
+
+
+def run_job(job_id):
+    """Verify a claimed job's photo and apply the verdict to its task"""
+    job = db.session.get(VerificationJob, job_id)
+    if job is None:
+        return
+    task = db.session.get(Task, job.task_id)
+    if task is None or not task.item:
+        _finish(job, 'failed', "Task not found" if task is None else
+                "This task does not require an item to be verified.")
+        return
+    try:
+        with open(upload_path(current_app, job.id), 'rb') as stream:
+            job.caption = caption_upload(stream)
+            relation = judge_relation(task.item.lower(), job.caption)
+            job.related = relation == "true"
+            if job.related:
+                if allowed_file(job.filename):
+                    attach_task_image(task, stream, job.filename)
+            else:
+                task.completed = False
+            _finish(job, 'done')
+        invalidate_event(task.event_id)
+    except InvalidImage:
+        db.session.rollback()
+        _finish(job, 'failed', "The uploaded file is not a valid image.")
+    except FileNotFoundError:
+        db.session.rollback()
+        _finish(job, 'failed', "The uploaded photo is no longer available. Please upload it again.")
+    except Exception as e:
+        db.session.rollback()
+        if isinstance(e, TimeoutError):
+            error = "Image captioning timed out. Please try again."
+        elif isinstance(e, CaptionUnavailable):
+            error = f"AI model unavailable: {str(e)}"
+        else:
+            error = f"An error occurred while using Generative AI: {str(e)}"
+        # Model and network failures are usually transient; try again later
+        retry = job.attempts < current_app.config.get('VERIFY_JOB_MAX_ATTEMPTS', 3)
+        _finish(job, 'queued' if retry else 'failed', error[:255])
+
+
+def requeue_stale_jobs(stale_after):
+    """Put back jobs left running by a process that stopped; returns how many"""
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_after)
+    count = db.session.execute(
+        sqla.update(VerificationJob)
+        .where(VerificationJob.status == 'running', VerificationJob.updated_at < cutoff)
+        .values(status='queued', updated_at=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    return count
+
+
+def purge_finished_jobs(retention):
+    """Delete finished jobs older than ``retention`` seconds; returns how many"""
+    cutoff = datetime.utcnow() - timedelta(seconds=retention)
+    count = db.session.execute(
+        sqla.delete(VerificationJob)
+        .where(VerificationJob.status.in_(FINISHED), VerificationJob.updated_at < cutoff)
+    ).rowcount
+    db.session.commit()
+    return count
+
+
+class JobRunner:
+    """Worker threads draining the verification_job table; notify() wakes one up"""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._threads = []
+
+    @property
+    def running(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def start(self, app, workers, poll_interval):
+        for _ in range(workers):
+            thread = threading.Thread(target=self._run, args=(app, poll_interval), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def notify(self, job_id):
+        if self.running:
+            self._queue.put(job_id)
+
+    def _run(self, app, poll_interval):
+        while True:
+            try:
+                job_id = self._queue.get(timeout=poll_interval)
+            except queue.Empty:
+                job_id = None
+            with app.app_context():
+                try:
+                    if job_id is None:
+                        requeue_stale_jobs(app.config.get('VERIFY_JOB_STALE_AFTER', 300))
+                        purge_finished_jobs(app.config.get('VERIFY_JOB_RETENTION', 86400))
+                    # Keep going while the table has work, including jobs accepted by other processes
+                    claimed = claim_job(job_id) or claim_job()
+                    while claimed:
+                        run_job(claimed)
+                        claimed = claim_job()
+                except Exception as e:
+                    app.logger.error(f"Verification job worker failed: {str(e)}")
+                finally:
+                    db.session.remove()
+
+
+job_runner = JobRunner()
+
+
+_start_lock = threading.Lock()
+
+
+def start_verification_jobs(app, workers):
+    """Start ``workers`` worker threads; queued jobs left from a previous run are resumed"""
+    with _start_lock:
+        if not job_runner.running:
+            job_runner.start(app, workers, app.config.get('VERIFY_JOB_POLL_INTERVAL', 5))
+    return job_runner
+
+
+def init_verification_jobs(app):
+    """Run VERIFY_JOB_WORKERS threads in the web server, started by its first request.
+
+    CLI commands never serve a request, so they never claim jobs or poll a
+    schema that is only partly migrated.
+    """
+    workers = app.config.get('VERIFY_JOB_WORKERS', 0)
+    if not workers or app.testing:
+        return
+
+    @app.before_request
+    def start_job_workers():
+        if not job_runner.running:
+            start_verification_jobs(app, workers)
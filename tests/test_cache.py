@@ -0,0 +1,79 @@
+import warnings
+warnings.filterwarnings("ignore")
+
+import tempfile
+import time
+import unittest
+from src.cache import MemoryBackend, FileBackend, CacheStats
+
+
+class TestCacheBackends(unittest.TestCase):
+    def test_memory_lru_eviction(self):
+        """Test the least recently used entry is evicted first"""
+        backend = MemoryBackend(max_entries=2)
+        backend.set('a', 1, 60)
+        backend.set('b', 2, 60)
+        self.assertEqual(backend.get('a'), 1)  # 'b' is now least recent
+        backend.set('c', 3, 60)
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(backend.get('a'), 1)
+        self.assertEqual(backend.get('c'), 3)
+        self.assertEqual(len(backend), 2)
+
+    def test_memory_ttl_expiry(self):
+        """Test entries disappear once their TTL has passed"""
+        backend = MemoryBackend()
+        backend.set('short', 'x', 0.01)
+        backend.set('long', 'y', 60)
+        time.sleep(0.02)
+        self.assertIsNone(backend.get('short'))
+        self.assertEqual(backend.get('long'), 'y')
+
+    def test_file_backend_roundtrip(self):
+        """Test the file backend stores, expires and deletes entries"""
+        with tempfile.TemporaryDirectory() as directory:
+            backend = FileBackend(directory)
+            backend.set('dashboard:1', [{'id': 1}], 60)
+            # A second instance (another worker) sees the same entry
+            self.assertEqual(FileBackend(directory).get('dashboard:1'), [{'id': 1}])
+            backend.delete('dashboard:1')
+            self.assertIsNone(backend.get('dashboard:1'))
+
+            backend.set('old', 1, -1)
+            self.assertIsNone(backend.get('old'))
+            self.assertEqual(len(backend), 0)
+
+    def test_delete_refuses_older_values(self):
+        """Test a value computed before a delete is not stored after it"""
+        with tempfile.TemporaryDirectory() as directory:
+            for backend in (MemoryBackend(), FileBackend(directory)):
+                since = backend.clock()
+                backend.delete('checklist:1')  # a write commits while the page is rebuilt
+                backend.set('checklist:1', 'stale', 60, since=since)
+                self.assertIsNone(backend.get('checklist:1'))
+
+                backend.set('checklist:1', 'fresh', 60, since=backend.clock())
+                self.assertEqual(backend.get('checklist:1'), 'fresh')
+
+    def test_file_backend_pruned_to_max_entries(self):
+        """Test the file backend drops expired entries, then the soonest to expire"""
+        with tempfile.TemporaryDirectory() as directory:
+            backend = FileBackend(directory, max_entries=3, prune_every=5)
+            backend.set('expired', 0, -1)
+            for i in range(4):
+                backend.set(f'page:{i}', i, 60 + i)
+            self.assertEqual(len(backend), 3)  # fifth write pruned
+            self.assertIsNone(backend.get('page:0'))
+            self.assertEqual(backend.get('page:3'), 3)
+
+    def test_stats_hit_ratio(self):
+        """Test hit ratio is derived from the recorded counters"""
+        stats = CacheStats()
+        self.assertEqual(stats.as_dict()['hit_ratio'], 0.0)
+        stats.record('hits', 3)
+        stats.record('misses')
+        self.assertEqual(stats.as_dict()['hit_ratio'], 0.75)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=1)
@@ -0,0 +1,158 @@
+import warnings
+warnings.filterwarnings("ignore")
+
+import queue
+import threading
+import unittest
+from concurrent.futures import wait
+from io import BytesIO
+from PIL import Image
+from src.captioning import (
+    MAX_IMAGE_SIZE, CaptionService, CaptionUnavailable, RemoteCaptioner, collect_batch, decode_request,
+    encode_request, listen_address, open_for_captioning, serve, service_key,
+)
+
+
+def recording_loader(batches, delay=None, busy=None):
+    """A load() whose captioner names each image and records the batch sizes it was given"""
+    def load(settings):
+        def caption_batch(images):
+            if busy is not None:
+                busy.set()
+            if delay is not None:
+                delay.wait(1)
+            batches.append(len(images))
+            return [f"a photo of {image}" for image in images]
+        return caption_batch
+    return load
+
+
+class TestCaptionBatching(unittest.TestCase):
+    def test_collect_batch_limits(self):
+        """Test a batch stops at the max size and at the shutdown sentinel"""
+        requests = queue.Queue()
+        for i in range(5):
+            requests.put((i, f'img{i}'))
+        requests.put(None)
+        batch, stop = collect_batch(requests, max_batch_size=3, max_wait=0.05)
+        self.assertEqual([request_id for request_id, _ in batch], [0, 1, 2])
+        self.assertFalse(stop)
+        batch, stop = collect_batch(requests, max_batch_size=3, max_wait=0.05)
+        self.assertEqual([request_id for request_id, _ in batch], [3, 4])
+        self.assertTrue(stop)
+
+    def test_concurrent_requests_share_a_batch(self):
+        """Test images queued while the worker is busy are captioned in one call"""
+        batches, release, busy = [], threading.Event(), threading.Event()
+        service = CaptionService(load=recording_loader(batches, delay=release, busy=busy), processes=0,
+                                 max_batch_size=8, max_wait=0.01).start()
+        try:
+            first = service.submit('cat')
+            self.assertTrue(busy.wait(5))
+            # The worker is now blocked on the first batch; these pile up behind it
+            rest = [service.submit(f'dog{i}') for i in range(5)]
+            release.set()
+            wait([first, *rest], timeout=5)
+            self.assertEqual(first.result(), 'a photo of cat')
+            self.assertEqual([f.result() for f in rest], [f'a photo of dog{i}' for i in range(5)])
+            self.assertEqual(batches, [1, 5])
+        finally:
+            service.close()
+
+    def test_load_failure_and_timeout(self):
+        """Test a model that fails to load answers every request with CaptionUnavailable"""
+        def broken(settings):
+            raise OSError("weights missing")
+
+        service = CaptionService(load=broken, processes=0).start()
+        try:
+            with self.assertRaises(CaptionUnavailable):
+                service.caption('cat', timeout=5)
+        finally:
+            service.close()
+
+        release = threading.Event()
+        service = CaptionService(load=recording_loader([], delay=release), processes=0).start()
+        try:
+            with self.assertRaises(TimeoutError):
+                service.caption('slow', timeout=0.05)
+        finally:
+            release.set()
+            service.close()
+
+
+class TestCaptionServer(unittest.TestCase):
+    def test_requests_are_raw_pixels(self):
+        """Test a request round-trips as pixels and malformed or oversized ones are rejected"""
+        image = Image.new('RGB', (3, 2), (1, 2, 3))
+        request_id, decoded = decode_request(encode_request(7, image))
+        self.assertEqual(request_id, 7)
+        self.assertEqual(decoded.tobytes(), image.tobytes())
+        data = encode_request(7, image)
+        for bad in (data[:5], data[:-1], encode_request(7, Image.new('RGB', (MAX_IMAGE_SIZE[0] + 1, 1)))):
+            with self.assertRaises(ValueError):
+                decode_request(bad)
+
+    def test_key_and_address_checks(self):
+        """Test the service needs its own key and only listens on loopback unless allowed"""
+        for config in ({}, {'CAPTION_SERVICE_KEY': ''}, {'CAPTION_SERVICE_KEY': 's', 'SECRET_KEY': 's'}):
+            with self.assertRaises(ValueError):
+                service_key(config)
+        self.assertEqual(service_key({'CAPTION_SERVICE_KEY': 'k', 'SECRET_KEY': 's'}), b'k')
+        self.assertEqual(listen_address(':6001'), ('localhost', 6001))
+        self.assertEqual(listen_address('127.0.0.1:6001'), ('127.0.0.1', 6001))
+        with self.assertRaises(ValueError):
+            listen_address('0.0.0.0:6001')
+        self.assertEqual(listen_address('0.0.0.0:6001', allow_remote=True), ('0.0.0.0', 6001))
+
+    def test_remote_captioner(self):
+        """Test a client captions through serve() and a wrong key is turned away"""
+        import socket
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        address = f'127.0.0.1:{port}'
+        service = CaptionService(load=lambda settings: lambda images: [f"{image.size}" for image in images],
+                                 processes=0).start()
+        threading.Thread(target=serve, args=(service, address, b'key'), daemon=True).start()
+        try:
+            for _ in range(50):
+                try:
+                    captioner = RemoteCaptioner(address, b'key')
+                    self.assertEqual(captioner.caption(Image.new('RGB', (4, 3)), timeout=5), '(4, 3)')
+                    break
+                except CaptionUnavailable:
+                    threading.Event().wait(0.05)
+            else:
+                self.fail("captioning service did not start")
+            with self.assertRaises(CaptionUnavailable):
+                RemoteCaptioner(address, b'wrong').caption(Image.new('RGB', (4, 3)), timeout=5)
+        finally:
+            service.close()
+
+
+class TestImageDecoding(unittest.TestCase):
+    def test_open_for_captioning(self):
+        """Test a large JPEG is decoded small, upright and in RGB in one call"""
+        photo = Image.new('RGB', (2400, 1200), (10, 200, 10))
+        photo.paste((200, 10, 10), (0, 0, 1200, 1200))
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise to display
+        data = BytesIO()
+        photo.save(data, 'JPEG', exif=exif)
+
+        img = open_for_captioning(BytesIO(data.getvalue()))
+        self.assertEqual(img.mode, 'RGB')
+        self.assertEqual(img.size, (256, 512))
+        self.assertLessEqual(max(img.size), max(MAX_IMAGE_SIZE))
+        # The red half was on the left; after rotating clockwise it is on top
+        red, green = img.getpixel((128, 100)), img.getpixel((128, 400))
+        self.assertGreater(red[0], red[1])
+        self.assertGreater(green[1], green[0])
+
+        with self.assertRaises(OSError):
+            open_for_captioning(BytesIO(b'not an image'))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=1)
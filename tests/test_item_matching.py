@@ -0,0 +1,54 @@
+import unittest
+from src.item_matching import ItemMatcher, lemmatize
+
+
+class TestItemMatcher(unittest.TestCase):
+    def setUp(self):
+        self.matcher = ItemMatcher()
+
+    def test_lemmatize(self):
+        """Test plurals found in captions are reduced to the table's singular forms"""
+        for word, lemma in [('cars', 'car'), ('glasses', 'glass'), ('knives', 'knife'),
+                            ('boxes', 'box'), ('berries', 'berry'), ('bus', 'bus'), ('men', 'man')]:
+            self.assertEqual(lemmatize(word), lemma)
+
+    def test_confident_answers(self):
+        """Test synonyms, plurals, compounds and hyponyms match and unrelated scenes do not"""
+        self.assertTrue(self.matcher.match('cup', 'a mug on a table'))
+        self.assertTrue(self.matcher.match('car', 'a parking lot with cars'))
+        self.assertTrue(self.matcher.match('phone', 'a person holding a cell phone'))
+        self.assertTrue(self.matcher.match('Coffee Mug', 'a cup of coffee on a desk'))
+        self.assertTrue(self.matcher.match('fruit', 'a red apple on a table'))
+        self.assertIs(self.matcher.match('cup', 'a dog sitting on a couch'), False)
+
+    def test_ambiguous_pairs_escalate(self):
+        """Test siblings, broader captions and unknown words are left to the LLM"""
+        self.assertIsNone(self.matcher.match('cup', 'a glass of water on a table'))
+        self.assertIsNone(self.matcher.match('apple', 'a bowl of fruit'))
+        self.assertIsNone(self.matcher.match('umbrella', 'a man riding a skateboard'))
+        self.assertEqual(self.matcher.stats['escalated'], 3)
+        self.assertEqual(self.matcher.escalation_rate(), 1.0)
+
+    def test_no_false_yes_for_other_senses(self):
+        """Test sibling people and words with another common sense are never a confident yes"""
+        for item, caption in [('child', 'a woman sitting on a bench'), ('kid', 'a man standing in a park'),
+                              ('hat', 'a bottle cap on a table'), ('bus', 'a coach on the field'),
+                              ('lamp', 'a street light'), ('paper', 'a sheet on a bed'),
+                              ('light', 'a candle on a table'), ('shoe', 'a trainer talking to a player'),
+                              ('television', 'a computer monitor on a desk')]:
+            self.assertIsNone(self.matcher.match(item, caption), (item, caption))
+        # A subtype still satisfies the broader item
+        self.assertTrue(self.matcher.match('person', 'a woman sitting on a bench'))
+        self.assertTrue(self.matcher.match('child', 'a kid playing in a park'))
+
+    def test_embedding_fallback(self):
+        """Test the optional embedder settles what the table cannot"""
+        vectors = {'umbrella': (1.0, 0.0), 'a man riding a skateboard': (0.0, 1.0),
+                   'parasol': (1.0, 0.0), 'a parasol on a beach': (0.8, 0.6)}
+        matcher = ItemMatcher(embed=lambda texts: [vectors[text] for text in texts])
+        self.assertIs(matcher.match('umbrella', 'a man riding a skateboard'), False)
+        self.assertTrue(matcher.match('parasol', 'a parasol on a beach'))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=1)
@@ -0,0 +1,138 @@
+import time
+import unittest
+from src.llm import LLMClient, LLMUnavailable, PromptCache, StubBackend, prompt_key
+
+FIXTURES = {
+    "default": {"response": "no rule", "latency_ms": 10},
+    "rules": [
+        {"match": "Required item: \"(?P<item>[^\"]*)\"", "response": "{item} is there",
+         "latency_ms": 400, "jitter_ms": 100},
+        {"match": "JSON", "response": [{"task": "Book hotel", "priority": 1}], "latency_ms": 50},
+    ],
+}
+
+
+class FlakyBackend:
+    """Fails with ``error`` for the first ``failures`` calls, then answers; streams can also fail midway"""
+
+    def __init__(self, error, failures, error_midway=None):
+        self.error = error
+        self.failures = failures
+        self.error_midway = error_midway
+        self.calls = 0
+
+    def generate(self, prompt, timeout):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return "ok"
+
+    def stream(self, prompt, timeout):
+        yield self.generate(prompt, timeout)
+        yield " then"
+        if self.error_midway:
+            raise self.error_midway
+
+
+class TestStubBackend(unittest.TestCase):
+    def test_deterministic_answers_and_latency(self):
+        """Test the same prompt always gets the same answer after the same simulated delay"""
+        sleeps = []
+        stub = StubBackend(FIXTURES, sleep=sleeps.append)
+        prompt = 'Required item: "mug"\nCaption: "a mug"'
+        self.assertEqual(stub.generate(prompt, 30), 'mug is there')
+        self.assertEqual(stub.generate(prompt, 30), 'mug is there')
+        self.assertEqual(sleeps[0], sleeps[1])
+        self.assertTrue(0.3 <= sleeps[0] <= 0.5)
+        self.assertEqual(stub.generate('Return JSON', 30), '[{"task": "Book hotel", "priority": 1}]')
+        self.assertEqual(stub.generate('anything else', 30), 'no rule')
+
+        with self.assertRaises(TimeoutError):
+            stub.generate(prompt, 0.1)
+
+    def test_streamed_answer(self):
+        """Test a streamed answer arrives in chunks after the first-token latency and adds up to the whole"""
+        fixtures = {"rules": [{"match": ".", "response": "abcdefghij", "latency_ms": 1000,
+                               "first_token_ms": 200, "chunk_chars": 4}]}
+        sleeps = []
+        stub = StubBackend(fixtures, sleep=sleeps.append)
+        self.assertEqual(list(stub.stream('x', 30)), ['abcd', 'efgh', 'ij'])
+        self.assertEqual(sleeps, [0.2, 0.4, 0.4])
+        self.assertEqual(stub.generate('x', 30), 'abcdefghij')
+
+
+class TestLLMClient(unittest.TestCase):
+    def test_transient_errors_are_retried_with_jitter(self):
+        """Test timeouts are retried within the backoff bound and then succeed"""
+        sleeps = []
+        backend = FlakyBackend(TimeoutError("slow"), failures=2)
+        client = LLMClient(backend, max_retries=2, base_delay=1.0, max_delay=1.5, sleep=sleeps.append)
+        self.assertEqual(client.generate("hi"), "ok")
+        self.assertEqual(backend.calls, 3)
+        self.assertEqual(client.retries, 2)
+        self.assertTrue(0 <= sleeps[0] <= 1.0)
+        self.assertTrue(0 <= sleeps[1] <= 1.5)
+
+    def test_retries_are_bounded(self):
+        """Test a persistent outage raises LLMUnavailable after max_retries + 1 attempts"""
+        backend = FlakyBackend(ConnectionError("down"), failures=10)
+        client = LLMClient(backend, max_retries=2, sleep=lambda delay: None)
+        with self.assertRaises(LLMUnavailable):
+            client.generate("hi")
+        self.assertEqual(backend.calls, 3)
+        self.assertEqual(client.failures, 1)
+
+    def test_stream_retries_only_before_the_first_chunk(self):
+        """Test a stream that fails before any text is retried and one that fails midway is not"""
+        backend = FlakyBackend(TimeoutError("slow"), failures=1)
+        client = LLMClient(backend, sleep=lambda delay: None)
+        self.assertEqual(''.join(client.stream("hi")), "ok then")
+        self.assertEqual(backend.calls, 2)
+
+        backend = FlakyBackend(TimeoutError("slow"), failures=0, error_midway=ConnectionError("reset"))
+        client = LLMClient(backend, sleep=lambda delay: None)
+        chunks = []
+        with self.assertRaises(ConnectionError):
+            for chunk in client.stream("hi"):
+                chunks.append(chunk)
+        self.assertEqual(chunks, ["ok", " then"])
+        self.assertEqual(backend.calls, 1)
+
+    def test_other_errors_are_not_retried(self):
+        """Test errors retrying cannot fix are raised on the first attempt"""
+        backend = FlakyBackend(ValueError("bad request"), failures=1)
+        client = LLMClient(backend, sleep=lambda delay: None)
+        with self.assertRaises(ValueError):
+            client.generate("hi")
+        self.assertEqual(backend.calls, 1)
+
+
+class TestPromptCache(unittest.TestCase):
+    def test_normalized_keys(self):
+        """Test case and whitespace differences share an entry and template versions do not"""
+        self.assertEqual(prompt_key('chat-text:v1', '  Camping\n  Trip '), 'chat-text:v1:camping trip')
+        cache = PromptCache(max_entries=10, ttl=60)
+        cache.set('chat-text:v1', 'Camping trip', 'Pack a tent')
+        self.assertEqual(cache.get('chat-text:v1', 'camping   TRIP'), 'Pack a tent')
+        self.assertIsNone(cache.get('chat-text:v2', 'camping trip'))
+        self.assertEqual(cache.as_dict()['hits'], 1)
+
+    def test_expiry_and_eviction(self):
+        """Test entries expire after the TTL and the least recently used entry goes first"""
+        cache = PromptCache(max_entries=2, ttl=60)
+        cache.set('t', 'a', '1')
+        cache.set('t', 'b', '2')
+        cache.get('t', 'a')
+        cache.set('t', 'c', '3')
+        self.assertIsNone(cache.get('t', 'b'))
+        self.assertEqual(cache.get('t', 'a'), '1')
+
+        cache = PromptCache(max_entries=2, ttl=0.01)
+        cache.set('t', 'a', '1')
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('t', 'a'))
+        self.assertIsNone(PromptCache(ttl=0).get('t', 'a'))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=1)
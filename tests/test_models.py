@@ -2,10 +2,28 @@ import warnings
 warnings.filterwarnings("ignore")
 
 from datetime import datetime, timedelta
+import os
+import shutil
+import tempfile
+import time
 import unittest
 from src import create_app, db
-from src.database.models import User, Event, Task
+from src.database.models import (
+    User, Event, Task, CalendarFeed, ImageCaption, ItemVerdict, find_counter_drift, recompute_event_counters,
+)
+from src.calendar_feed import FeedRebuildWorker, build_subscription, rebuild_subscriptions
+from src.database.queries import dashboard_event_summaries, event_summaries_page
+from src.database.tasks import insert_generated_tasks, normalize_generated_task, set_task_completion
+from src.uploads import collect_orphaned_uploads
+from src.database.verification_cache import (
+    cached_caption, cached_verdict, image_digest, perceptual_hash, store_caption, store_verdict,
+)
+from src.database.conversations import (
+    compact_transcript, estimate_tokens, get_conversation, record_exchange, start_conversation, turns_from_history,
+)
+from PIL import Image
 from config import Config
+import sqlalchemy as sqla
 
 
 class TestConfig(Config):
@@ -13,6 +31,10 @@ class TestConfig(Config):
     SQLALCHEMY_DATABASE_URI = 'sqlite://'
     WTF_CSRF_ENABLED = False
     SECRET_KEY = 'test-secret-key'
+    # In-memory SQLite is a single shared connection; rebuild feeds inline instead
+    CALENDAR_FEED_PRECOMPUTE = False
+    # One process, and no entries left on disk between runs
+    CACHE_BACKEND = 'memory'
     
 class TestModels(unittest.TestCase):
     def setUp(self):
@@ -230,6 +252,406 @@ class TestModels(unittest.TestCase):
         self.assertEqual(u.failed_login_attempts, 0)
         self.assertIsNotNone(u.last_login)
 
+    def test_dashboard_event_summaries(self):
+        """Test dashboard rows merge owned and shared events and count tasks"""
+        owner = User(username='owner', email='owner@example.com')
+        guest = User(username='guest', email='guest@example.com')
+        db.session.add_all([owner, guest])
+        db.session.commit()
+
+        owned = Event(name='Owned', date=datetime(2024, 1, 1), user_id=owner.id)
+        shared = Event(name='Shared', date=datetime(2024, 2, 1), user_id=guest.id)
+        hidden = Event(name='Hidden', date=datetime(2024, 3, 1), user_id=guest.id)
+        db.session.add_all([owned, shared, hidden])
+        db.session.commit()
+        # Owner is also a participant of their own event: must not appear twice
+        owned.participants.append(owner)
+        shared.participants.append(owner)
+        db.session.add_all([
+            Task(description='a', priority=1, completed=True, event_id=owned.id),
+            Task(description='b', priority=1, completed=False, event_id=owned.id),
+            Task(description='c', priority=1, completed=True, event_id=hidden.id),
+        ])
+        db.session.commit()
+
+        rows = dashboard_event_summaries(owner.id)
+        self.assertEqual([row.name for row in rows], ['Owned', 'Shared'])
+        self.assertEqual((rows[0].task_count, rows[0].completed_count), (2, 1))
+        self.assertEqual(rows[0].progress, 50)
+        self.assertEqual((rows[1].task_count, rows[1].completed_count), (0, 0))
+        self.assertEqual(rows[1].progress, 0)
+
+    def test_dashboard_query_count_is_constant(self):
+        """Test the dashboard issues the same number of queries regardless of event count"""
+        u = User(username='busy', email='busy@example.com')
+        db.session.add(u)
+        db.session.commit()
+        user_id = u.id
+
+        def count_queries():
+            statements = []
+            listener = lambda *args: statements.append(args[2])
+            sqla.event.listen(db.engine, 'before_cursor_execute', listener)
+            try:
+                dashboard_event_summaries(user_id)
+            finally:
+                sqla.event.remove(db.engine, 'before_cursor_execute', listener)
+            return len(statements)
+
+        counts = []
+        for _ in range(2):
+            for i in range(25):
+                e = Event(name=f'Event {i}', user_id=user_id)
+                db.session.add(e)
+                db.session.flush()
+                db.session.add(Task(description='t', priority=3, event_id=e.id))
+            db.session.commit()
+            counts.append(count_queries())
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(counts[0], 1)
+
+    def test_event_counters_follow_task_writes(self):
+        """Test task_count/completed_count track inserts, updates, moves and deletes"""
+        u = User(username='counter', email='counter@example.com')
+        db.session.add(u)
+        db.session.commit()
+        e1 = Event(name='One', user_id=u.id)
+        e2 = Event(name='Two', user_id=u.id)
+        db.session.add_all([e1, e2])
+        db.session.commit()
+
+        t1 = Task(description='a', priority=1, event_id=e1.id)
+        t2 = Task(description='b', priority=1, completed=True, event_id=e1.id)
+        db.session.add_all([t1, t2])
+        db.session.commit()
+        self.assertEqual((e1.task_count, e1.completed_count), (2, 1))
+
+        t1.completed = True
+        db.session.commit()
+        self.assertEqual((e1.task_count, e1.completed_count), (2, 2))
+
+        t2.event_id = e2.id
+        db.session.commit()
+        self.assertEqual((e1.task_count, e1.completed_count), (1, 1))
+        self.assertEqual((e2.task_count, e2.completed_count), (1, 1))
+
+        db.session.delete(t1)
+        db.session.commit()
+        self.assertEqual((e1.task_count, e1.completed_count), (0, 0))
+        self.assertEqual(find_counter_drift(), [])
+
+    def test_set_task_completion(self):
+        """Test bulk completion touches only changed rows and keeps counters exact"""
+        u = User(username='bulk', email='bulk@example.com')
+        db.session.add(u)
+        db.session.commit()
+        e = Event(name='Bulk', user_id=u.id)
+        other = Event(name='Other', user_id=u.id)
+        db.session.add_all([e, other])
+        db.session.commit()
+        tasks = [Task(description=f't{i}', priority=1, completed=i < 2, event_id=e.id) for i in range(5)]
+        foreign = Task(description='foreign', priority=1, event_id=other.id)
+        db.session.add_all(tasks + [foreign])
+        db.session.commit()
+
+        # t0 stays, t1 is reopened, t3/t4 are completed; the foreign id is ignored
+        result = set_task_completion(e.id, [tasks[0].id, tasks[3].id, tasks[4].id, foreign.id])
+        db.session.commit()
+        self.assertEqual(result, (2, 1))
+        self.assertEqual([t.completed for t in tasks], [True, False, False, True, True])
+        self.assertFalse(foreign.completed)
+        self.assertEqual((e.task_count, e.completed_count), (5, 3))
+
+        self.assertEqual(set_task_completion(e.id, []), (0, 3))
+        db.session.commit()
+        self.assertEqual(e.completed_count, 0)
+        self.assertEqual(find_counter_drift(), [])
+
+    def test_insert_generated_tasks(self):
+        """Test an LLM checklist is normalized and inserted with one INSERT, counters included"""
+        self.assertEqual(normalize_generated_task({"task": "  Pack\n sunscreen ", "priority": "Important",
+                                                   "item": ["sunscreen", "hat"], "due_date": "2030-05-01T10:00:00+02:00"}),
+                         {"description": "Pack sunscreen", "priority": 1, "item": "sunscreen",
+                          "due_date": datetime(2030, 5, 1, 8, 0)})
+        self.assertEqual(normalize_generated_task({"description": "Book hotel", "priority": 9, "item": "none",
+                                                   "due_date": "next week"}),
+                         {"description": "Book hotel", "priority": 3, "item": None, "due_date": None})
+        self.assertIsNone(normalize_generated_task({"priority": 1}))
+        self.assertIsNone(normalize_generated_task("Book hotel"))
+
+        u = User(username='generated', email='generated@example.com')
+        db.session.add(u)
+        db.session.commit()
+        e = Event(name='Trip', user_id=u.id)
+        db.session.add(e)
+        db.session.commit()
+        entries = [{"task": f"Task {i}", "priority": i % 3 + 1} for i in range(300)] + [{"item": "orphan"}]
+
+        inserts = []
+        listener = lambda conn, cursor, statement, *args: inserts.append(statement) if statement.startswith('INSERT INTO task') else None
+        sqla.event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            rows = insert_generated_tasks(e.id, entries)
+            db.session.commit()
+        finally:
+            sqla.event.remove(db.engine, 'before_cursor_execute', listener)
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(len(rows), 300)
+        self.assertEqual([db.session.get(Task, row['id']).description for row in rows[:3]], ['Task 0', 'Task 1', 'Task 2'])
+        self.assertEqual((e.task_count, e.completed_count), (300, 0))
+        self.assertEqual(insert_generated_tasks(e.id, [{"task": ""}]), [])
+        self.assertEqual(find_counter_drift(), [])
+
+    def test_orphaned_upload_collection(self):
+        """Test only old, unreferenced uploads are removed and reclaimed bytes are reported"""
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.app.static_folder = root
+        for directory in ('task_images', 'profile_pics'):
+            os.makedirs(os.path.join(root, directory))
+
+        def upload(link, size, age):
+            path = os.path.join(root, link)
+            with open(path, 'wb') as f:
+                f.write(b'x' * size)
+            os.utime(path, (time.time() - age, time.time() - age))
+            return path
+
+        kept_task = upload('task_images/kept.jpg', 10, 7200)
+        kept_profile = upload('profile_pics/me.png', 20, 7200)
+        orphans = [upload(f'task_images/orphan{i}.jpg', 100, 7200) for i in range(3)]
+        fresh = upload('profile_pics/uploading.png', 40, 10)
+
+        u = User(username='uploader', email='up@example.com', profile_picture='profile_pics/me.png')
+        db.session.add(u)
+        db.session.flush()
+        e = Event(name='Photos', user_id=u.id)
+        db.session.add(e)
+        db.session.flush()
+        db.session.add(Task(description='t', priority=1, event_id=e.id, image_link='task_images/kept.jpg'))
+        db.session.commit()
+
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(args=['uploads', 'gc', '--dry-run', '--batch-size', '2'])
+        self.assertIn('Scanned 6 file(s), 3 orphaned. Would reclaim 300 bytes', result.output)
+        self.assertTrue(all(os.path.exists(path) for path in orphans))
+
+        report = collect_orphaned_uploads(root, batch_size=2, max_removals=2)
+        self.assertEqual((report['removed'], report['reclaimed_bytes']), (2, 200))
+        report = collect_orphaned_uploads(root, batch_size=2)
+        self.assertEqual((report['removed'], report['reclaimed_bytes']), (1, 100))
+        self.assertFalse(any(os.path.exists(path) for path in orphans))
+        self.assertTrue(all(os.path.exists(path) for path in (kept_task, kept_profile, fresh)))
+
+    def test_counter_drift_repair(self):
+        """Test drift is detected and repaired by recompute and the CLI"""
+        u = User(username='drift', email='drift@example.com')
+        db.session.add(u)
+        db.session.commit()
+        e = Event(name='Drifty', user_id=u.id)
+        db.session.add(e)
+        db.session.commit()
+        db.session.add(Task(description='a', priority=1, completed=True, event_id=e.id))
+        db.session.commit()
+
+        db.session.execute(sqla.update(Event).values(task_count=7, completed_count=0))
+        db.session.commit()
+        self.assertEqual(find_counter_drift(), [(e.id, (7, 0), (1, 1))])
+
+        runner = self.app.test_cli_runner()
+        result = runner.invoke(args=['counters', 'verify'])
+        self.assertEqual(result.exit_code, 1)
+        result = runner.invoke(args=['counters', 'rebuild'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(find_counter_drift(), [])
+        self.assertEqual(runner.invoke(args=['counters', 'verify']).exit_code, 0)
+        db.session.refresh(e)
+        self.assertEqual((e.task_count, e.completed_count), (1, 1))
+
+        db.session.execute(sqla.update(Event).values(task_count=0))
+        recompute_event_counters()
+        db.session.commit()
+        self.assertEqual(find_counter_drift(), [])
+
+    def test_event_summaries_keyset_pagination(self):
+        """Test keyset pages walk (date, id) order without gaps or duplicates"""
+        owner = User(username='pager', email='pager@example.com')
+        db.session.add(owner)
+        db.session.commit()
+        same_day = datetime(2024, 5, 1)
+        events = [Event(name=f'E{i}', date=same_day if i < 3 else datetime(2024, 5, i), user_id=owner.id)
+                  for i in range(7)]
+        db.session.add_all(events)
+        db.session.commit()
+        # Owned and shared at the same time must still come back once
+        events[0].participants.append(owner)
+        db.session.commit()
+
+        seen, cursor = [], None
+        while True:
+            rows, cursor = event_summaries_page(owner.id, 3, cursor)
+            seen.extend(row.id for row in rows)
+            if cursor is None:
+                break
+        expected = [row.id for row in dashboard_event_summaries(owner.id)]
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(seen), 7)
+
+        with self.assertRaises(ValueError):
+            event_summaries_page(owner.id, 3, 'not-a-cursor')
+
+    def test_subscription_feeds_marked_stale_and_rebuilt(self):
+        """Test task writes invalidate stored feeds and a rebuild restores them"""
+        u = User(username='subscriber', email='sub@example.com')
+        db.session.add(u)
+        db.session.commit()
+        e = Event(name='Launch', user_id=u.id)
+        db.session.add(e)
+        db.session.commit()
+        user_feed = CalendarFeed(token=CalendarFeed.new_token(), user_id=u.id)
+        event_feed = CalendarFeed(token=CalendarFeed.new_token(), event_id=e.id)
+        db.session.add_all([user_feed, event_feed])
+        db.session.commit()
+        self.assertEqual(rebuild_subscriptions(), 2)
+
+        # An unassigned task only changes the event feed
+        t = Task(description='Ship it', priority=1, event_id=e.id, due_date=datetime(2025, 1, 2))
+        db.session.add(t)
+        db.session.commit()
+        self.assertIsNone(event_feed.body)
+        self.assertIsNotNone(user_feed.body)
+
+        t.assigned_users.append(u)
+        db.session.commit()
+        self.assertIsNone(user_feed.body)
+        self.assertEqual(rebuild_subscriptions(), 2)
+        self.assertIn('SUMMARY:Ship it', user_feed.body)
+        self.assertIn('SUMMARY:Ship it', event_feed.body)
+
+        # A body rendered before a newer invalidation is not stored
+        revision = event_feed.revision
+        t.description = 'Ship it now'
+        db.session.commit()
+        self.assertGreater(event_feed.revision, revision)
+        body, _, _ = build_subscription(event_feed.id)
+        self.assertIn('Ship it now', body)
+        self.assertEqual(event_feed.body, body)
+
+    def test_feed_rebuilds_coalesced(self):
+        """Test a burst of commits is rebuilt once, for only the feeds they marked stale"""
+        u = User(username='burst', email='burst@example.com')
+        db.session.add(u)
+        db.session.commit()
+        e = Event(name='Burst', user_id=u.id)
+        db.session.add(e)
+        db.session.commit()
+        event_feed = CalendarFeed(token=CalendarFeed.new_token(), event_id=e.id)
+        user_feed = CalendarFeed(token=CalendarFeed.new_token(), user_id=u.id)
+        db.session.add_all([event_feed, user_feed])
+        db.session.commit()
+        rebuild_subscriptions()
+
+        t = Task(description='Draft', priority=1, event_id=e.id)
+        db.session.add(t)
+        db.session.flush()
+        self.assertEqual(db.session.info['stale_calendar_feeds'], {event_feed.id})
+        db.session.commit()
+        self.assertNotIn('stale_calendar_feeds', db.session.info)
+
+        calls = []
+        worker = FeedRebuildWorker(rebuild=lambda app, feed_ids: calls.append(feed_ids))
+        for feed_ids in ([1], [2, 3], [1]):
+            worker.submit(self.app, feed_ids, debounce=0.2)
+        worker.join()
+        self.assertEqual(calls, [{1, 2, 3}])
+
+    def test_verification_caches(self):
+        """Test captions and verdicts are reused by content, bounded and evicted by last use"""
+        image = Image.new('RGB', (64, 64), (200, 30, 30))
+        image.paste((20, 20, 200), (0, 0, 32, 64))
+        digest = image_digest(b'original bytes')
+        phash = perceptual_hash(image)
+        self.assertEqual(perceptual_hash(image.resize((128, 128))), phash)
+        self.assertIsNone(cached_caption(digest))
+
+        store_caption(digest, 'a red and blue flag', phash)
+        db.session.commit()
+        self.assertEqual(cached_caption(digest), 'a red and blue flag')
+        # Re-encoded copy: different bytes, same picture
+        self.assertIsNone(cached_caption(image_digest(b'other bytes')))
+        self.assertEqual(cached_caption(image_digest(b'other bytes'), phash), 'a red and blue flag')
+        # A differently configured captioner does not share entries
+        self.app.config['CAPTION_NUM_BEAMS'] = 1
+        self.assertIsNone(cached_caption(digest))
+        self.app.config['CAPTION_NUM_BEAMS'] = 5
+
+        store_verdict('  Coffee Mug ', 'a mug on a desk', True)
+        db.session.commit()
+        self.assertTrue(cached_verdict('coffee   mug', 'A mug on a desk'))
+        self.assertIsNone(cached_verdict('coffee mug', 'a cat'))
+        store_verdict('coffee mug', 'a mug on a desk', False)
+        db.session.commit()
+        self.assertIs(cached_verdict('coffee mug', 'a mug on a desk'), False)
+
+        # The cap is only checked every VERIFICATION_CACHE_EVICT_EVERY writes
+        self.app.config['VERIFICATION_CACHE_EVICT_EVERY'] = 1000
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        sqla.event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            store_verdict('kettle', 'a kettle', True)
+        finally:
+            sqla.event.remove(db.engine, 'before_cursor_execute', listener)
+        self.assertFalse([s for s in statements if 'count(' in s.lower()])
+
+        # Over the limit, the least recently used entries go first
+        self.app.config['VERDICT_CACHE_MAX_ENTRIES'] = 10
+        self.app.config['VERIFICATION_CACHE_EVICT_EVERY'] = 1
+        db.session.execute(sqla.update(ItemVerdict).values(last_used_at=datetime.utcnow() - timedelta(days=1)))
+        for i in range(10):
+            store_verdict(f'item {i}', 'caption', True)
+        db.session.commit()
+        self.assertLessEqual(db.session.scalar(sqla.select(sqla.func.count()).select_from(ItemVerdict)), 10)
+        self.assertIsNone(cached_verdict('coffee mug', 'a mug on a desk'))
+        self.assertTrue(cached_verdict('item 9', 'caption'))
+        self.assertEqual(db.session.scalar(sqla.select(sqla.func.count()).select_from(ImageCaption)), 1)
+
+    def test_conversation_state(self):
+        """Test conversations are stored per user, expire after the TTL and are compacted to the token budget"""
+        u = User(username='planner', email='planner@example.com')
+        db.session.add(u)
+        db.session.flush()
+        e = Event(name='Beach trip', user_id=u.id)
+        db.session.add(e)
+        db.session.flush()
+
+        legacy = turns_from_history(['User: a beach trip', 'Bot: Who is coming?'])
+        self.assertEqual(legacy, [{"role": 'user', "text": 'a beach trip'}, {"role": 'bot', "text": 'Who is coming?'}])
+        conversation = start_conversation(u.id, e.id, legacy, 1)
+        record_exchange(conversation, 'Four friends', 'What matters most?')
+        db.session.commit()
+        self.assertEqual(get_conversation(conversation.id, u.id, 3600).question_index, 2)
+        self.assertEqual(len(get_conversation(conversation.id, u.id, 3600).turns), 4)
+        self.assertIsNone(get_conversation(conversation.id, u.id + 1, 3600))
+
+        # Idle past the TTL: gone for the client, and purged when the next one starts
+        conversation.updated_at = datetime.utcnow() - timedelta(hours=2)
+        db.session.commit()
+        self.assertIsNone(get_conversation(conversation.id, u.id, 3600))
+        start_conversation(u.id, e.id)
+        db.session.commit()
+        self.assertIsNone(db.session.get(type(conversation), conversation.id))
+
+        turns = [{"role": 'user', "text": 'a beach trip for the whole team'}]
+        turns += [{"role": 'bot' if i % 2 else 'user', "text": f'message {i} ' * 30} for i in range(10)]
+        self.assertEqual(compact_transcript(turns[:2], 1000).split('\n')[0], 'User: a beach trip for the whole team')
+        transcript = compact_transcript(turns, 200)
+        self.assertLessEqual(estimate_tokens(transcript), 200)
+        lines = transcript.split('\n')
+        self.assertEqual(lines[0], 'User: a beach trip for the whole team')
+        self.assertRegex(lines[1], r'\[\d+ earlier message\(s\) omitted\]')
+        self.assertEqual(lines[-1], f"Bot: {turns[-1]['text']}")
+
 
 if __name__ == '__main__':
     unittest.main(verbosity=1)
\ No newline at end of file
@@ -4,8 +4,9 @@ These tests use GETs and POSTs to different URLs to check for the proper behavio
 """
 import os
 import pytest
-from src import create_app, db
-from src.database.models import User, Event, Task
+from flask import g
+from src import create_app, db, cache
+from src.database.models import User, Event, Task, CalendarFeed, event_participants, task_assignments
 from config import Config
 import sqlalchemy as sqla
 from datetime import datetime, timedelta
@@ -14,6 +15,10 @@ from datetime import datetime, timedelta
 class TestConfig(Config):
     SQLALCHEMY_DATABASE_URI = 'sqlite://'
     SECRET_KEY = 'test-secret-key'
+    # In-memory SQLite is a single shared connection; rebuild feeds inline instead
+    CALENDAR_FEED_PRECOMPUTE = False
+    # One process, and no entries left on disk between runs
+    CACHE_BACKEND = 'memory'
     WTF_CSRF_ENABLED = False
     DEBUG = True
     TESTING = True
@@ -47,6 +52,9 @@ def new_user(uname, uemail, passwd):
 @pytest.fixture
 def init_database():
     """Initialize database for testing"""
+    # The app context is shared by the whole module, so drop the user
+    # Flask-Login cached in g by a previous test
+    g.pop('_login_user', None)
     db.create_all()
     
     # Add a test user
@@ -322,3 +330,800 @@ def test_register_duplicate_email(test_client, init_database):
                           follow_redirects=True)
     assert response2.status_code == 200
     # Should show some validation error or stay on registration page
+
+
+def test_list_events_api(test_client, init_database):
+    """
+    GIVEN a logged in user with several events
+    WHEN '/event_router/events' is paged through with a cursor
+    THEN check that every event is returned once, in date order
+    """
+    do_login(test_client)
+    user = db.session.scalars(sqla.select(User).where(User.email == 'test@example.com')).first()
+    for day in range(1, 6):
+        db.session.add(Event(name=f'Event {day}', date=datetime(2025, 1, day), user_id=user.id))
+    db.session.commit()
+
+    response = test_client.get('/event_router/events?limit=3')
+    assert response.status_code == 200
+    first = response.get_json()
+    assert [e['name'] for e in first['events']] == ['Event 1', 'Event 2', 'Event 3']
+    assert first['next_cursor']
+
+    response = test_client.get(f"/event_router/events?limit=3&cursor={first['next_cursor']}")
+    second = response.get_json()
+    assert [e['name'] for e in second['events']] == ['Event 4', 'Event 5']
+    assert second['next_cursor'] is None
+
+    assert test_client.get('/event_router/events?cursor=bogus').status_code == 400
+    assert test_client.get('/event_router/events?limit=0').status_code == 400
+
+
+def test_checklist_cache_invalidated_by_task_writes(test_client, init_database):
+    """
+    GIVEN a cached checklist page and dashboard
+    WHEN a task is added through the API
+    THEN check that both pages show the new task on the next request
+    """
+    do_login(test_client)
+    cache.clear()
+    user = db.session.scalars(sqla.select(User).where(User.email == 'test@example.com')).first()
+    event = Event(name='Cached Event', date=datetime(2025, 3, 1), user_id=user.id)
+    db.session.add(event)
+    db.session.commit()
+    event_id = event.id
+
+    response = test_client.get(f'/task_router/checklist_detail/{event_id}')
+    assert response.status_code == 200
+    assert b'Pack the tent' not in response.data
+    before = cache.stats()
+    test_client.get(f'/task_router/checklist_detail/{event_id}')
+    assert cache.stats()['hits'] == before['hits'] + 1
+
+    response = test_client.post('/task_router/add_task',
+                                json={'description': 'Pack the tent', 'event_id': event_id})
+    assert response.get_json()['success']
+
+    response = test_client.get(f'/task_router/checklist_detail/{event_id}')
+    assert b'Pack the tent' in response.data
+    response = test_client.get('/index')
+    assert b'width: 0.0%' in response.data
+
+    task = db.session.scalars(sqla.select(Task).where(Task.event_id == event_id)).first()
+    test_client.post(f'/task_router/update_task/{task.id}', json={'completed': True})
+    response = test_client.get('/index')
+    assert b'width: 100.0%' in response.data
+
+
+def test_checklist_query_count_independent_of_tasks(test_client, init_database):
+    """
+    GIVEN events with few and many assigned tasks
+    WHEN their checklist pages are rendered from an empty cache
+    THEN check that the number of SQL statements is the same
+    """
+    do_login(test_client)
+    user = db.session.scalars(sqla.select(User).where(User.email == 'test@example.com')).first()
+    helper = new_user(uname='helper', uemail='helper@example.com', passwd='helperpass')
+    db.session.add(helper)
+    db.session.commit()
+
+    event_ids = []
+    for n_tasks in (2, 30):
+        event = Event(name=f'{n_tasks} tasks', date=datetime(2025, 4, 1), user_id=user.id)
+        event.participants.extend([user, helper])
+        db.session.add(event)
+        db.session.flush()
+        for i in range(n_tasks):
+            task = Task(description=f'Task {i}', priority=1 + i % 3, event_id=event.id,
+                        due_date=datetime(2025, 3, 1) + timedelta(days=i))
+            task.assigned_users.extend([user, helper])
+            db.session.add(task)
+        event_ids.append(event.id)
+    db.session.commit()
+
+    counts = []
+    for event_id in event_ids:
+        cache.clear()
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        sqla.event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            response = test_client.get(f'/task_router/checklist_detail/{event_id}')
+        finally:
+            sqla.event.remove(db.engine, 'before_cursor_execute', listener)
+        assert response.status_code == 200
+        assert b'helper' in response.data
+        counts.append(len(statements))
+
+    assert counts[0] == counts[1]
+
+
+def test_calendar_feed_conditional_requests(test_client, init_database):
+    """
+    GIVEN a user with assigned, dated tasks
+    WHEN '/calendar.ics' is polled with the returned validators
+    THEN check that unchanged feeds return 304 and task edits produce a new feed
+    """
+    do_login(test_client)
+    user = db.session.scalars(sqla.select(User).where(User.email == 'test@example.com')).first()
+    event = Event(name='Trip, 2025', date=datetime(2025, 6, 1), user_id=user.id)
+    db.session.add(event)
+    db.session.flush()
+    early = Task(description='Book hotel', priority=1, event_id=event.id, due_date=datetime(2025, 5, 1))
+    late = Task(description='Pack bags', priority=2, event_id=event.id, due_date=datetime(2025, 5, 30))
+    undated = Task(description='Someday', priority=3, event_id=event.id)
+    for task in (early, late, undated):
+        task.assigned_users.append(user)
+        db.session.add(task)
+    db.session.commit()
+
+    response = test_client.get('/calendar.ics')
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    assert body.startswith('BEGIN:VCALENDAR\r\n')
+    assert body.count('BEGIN:VEVENT') == 2
+    assert 'SUMMARY:Book hotel' in body
+    assert 'DESCRIPTION:Trip\\, 2025' in body
+    etag = response.headers['ETag']
+
+    response = test_client.get('/calendar.ics', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    # Completion is not part of the feed, so it keeps the version
+    test_client.post(f'/task_router/update_task/{early.id}', json={'completed': True})
+    response = test_client.get('/calendar.ics', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    test_client.post(f'/task_router/edit_task/{early.id}', json={'description': 'Book hostel'})
+    response = test_client.get('/calendar.ics', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'SUMMARY:Book hostel' in response.get_data(as_text=True)
+
+    response = test_client.get('/calendar.ics?from=2025-05-15&to=2025-06-01')
+    body = response.get_data(as_text=True)
+    assert body.count('BEGIN:VEVENT') == 1
+    assert 'Pack bags' in body
+    assert test_client.get('/calendar.ics?from=nope').status_code == 400
+
+
+def test_calendar_subscription_tokens(test_client, init_database):
+    """
+    GIVEN a user and event subscription URL
+    WHEN the token URLs are polled without a session
+    THEN check that stored feeds are served, invalidated by task edits and revoked on rotation
+    """
+    do_login(test_client)
+    user = db.session.scalars(sqla.select(User).where(User.email == 'test@example.com')).first()
+    event = Event(name='Festival', date=datetime(2025, 7, 1), user_id=user.id)
+    db.session.add(event)
+    db.session.flush()
+    task = Task(description='Buy tickets', priority=1, event_id=event.id, due_date=datetime(2025, 6, 1))
+    task.assigned_users.append(user)
+    db.session.add(task)
+    db.session.commit()
+    event_id, task_id = event.id, task.id
+
+    user_url = test_client.get('/calendar/subscription').get_json()['url']
+    event_url = test_client.get(f'/calendar/subscription?event_id={event_id}').get_json()['url']
+    assert test_client.get('/calendar/subscription?event_id=9999').status_code == 404
+    test_client.get('/user/logout')
+
+    response = test_client.get(user_url)
+    assert response.status_code == 200
+    assert 'SUMMARY:Buy tickets' in response.get_data(as_text=True)
+    etag = response.headers['ETag']
+    assert db.session.scalar(sqla.select(CalendarFeed.body).where(CalendarFeed.user_id == user.id))
+    assert test_client.get(user_url, headers={'If-None-Match': etag}).status_code == 304
+    assert 'X-WR-CALNAME:Festival' in test_client.get(event_url).get_data(as_text=True)
+
+    do_login(test_client)
+    test_client.post(f'/task_router/edit_task/{task_id}', json={'description': 'Buy VIP tickets'})
+    test_client.get('/user/logout')
+    response = test_client.get(user_url, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'SUMMARY:Buy VIP tickets' in response.get_data(as_text=True)
+    assert 'SUMMARY:Buy VIP tickets' in test_client.get(event_url).get_data(as_text=True)
+
+    do_login(test_client)
+    new_url = test_client.post('/calendar/subscription').get_json()['url']
+    assert new_url != user_url
+    assert test_client.get(user_url).status_code == 404
+    assert test_client.get(new_url).status_code == 200
+
+    # A participant sees the shared event URL but cannot revoke it
+    guest = new_user(uname='guest', uemail='guest@example.com', passwd='guestpass')
+    db.session.add(guest)
+    db.session.commit()
+    db.session.execute(event_participants.insert().values(event_id=event_id, user_id=guest.id))
+    db.session.commit()
+    test_client.get('/user/logout')
+    do_login(test_client, 'guest@example.com', 'guestpass')
+    subscription = f'/calendar/subscription?event_id={event_id}'
+    assert test_client.get(subscription).get_json()['url'] == event_url
+    assert test_client.post(subscription).status_code == 403
+    assert test_client.get(event_url).status_code == 200
+    test_client.get('/user/logout')
+    do_login(test_client)
+    assert test_client.post(subscription).get_json()['url'] != event_url
+
+
+def test_friendship_service_and_cache(test_client, init_database):
+    """
+    GIVEN a logged in user and two other users
+    WHEN friends are added and removed through the API
+    THEN check that bulk and single membership checks follow the cached friend-id set
+    """
+    from src.database.friendships import friend_ids, friend_ids_key, friends_among, is_friend
+
+    do_login(test_client)
+    cache.clear()
+    user = db.session.scalars(sqla.select(User).where(User.email == 'test@example.com')).first()
+    alice = new_user(uname='alice', uemail='alice@example.com', passwd='alicepass')
+    bob = new_user(uname='bob', uemail='bob@example.com', passwd='bobpass')
+    db.session.add_all([alice, bob])
+    db.session.commit()
+
+    assert friend_ids(user.id) == frozenset()
+    response = test_client.post('/add_friend', json={'email': 'alice@example.com'})
+    assert response.get_json()['success']
+    assert test_client.post('/add_friend', json={'email': 'alice@example.com'}).status_code == 400
+
+    # The duplicate check in /add_friend filled the cache after the first add invalidated it
+    assert cache.get(friend_ids_key(user.id)) == {alice.id}
+    assert friend_ids(user.id) == {alice.id}
+    assert is_friend(user.id, alice.id)
+    assert not is_friend(user.id, bob.id)
+    assert friends_among(user.id, [alice.id, bob.id, 9999]) == {alice.id}
+    assert not is_friend(alice.id, user.id)  # friendships are directed
+
+    response = test_client.post('/remove_friend', json={'email': 'alice@example.com'})
+    assert response.get_json()['success']
+    assert friend_ids(user.id) == frozenset()
+    assert friends_among(user.id, [alice.id]) == set()
+
+
+def test_update_event_participants_batched(test_client, init_database):
+    """
+    GIVEN an event owner with several friends and one stranger
+    WHEN participants are added and removed in one request
+    THEN check the per-id results and that the statement count does not grow with the batch
+    """
+    do_login(test_client)
+    cache.clear()
+    user = db.session.scalars(sqla.select(User).where(User.email == 'test@example.com')).first()
+    friends = [new_user(uname=f'friend{i}', uemail=f'friend{i}@example.com', passwd='pass')
+               for i in range(12)]
+    stranger = new_user(uname='stranger', uemail='stranger@example.com', passwd='pass')
+    db.session.add_all(friends + [stranger])
+    for friend in friends:
+        user.add_friend(friend)
+    event = Event(name='Conference', date=datetime(2025, 9, 1), user_id=user.id)
+    event.participants.append(friends[0])
+    db.session.add(event)
+    db.session.commit()
+    event_id = event.id
+    friend_ids = [friend.id for friend in friends]
+
+    response = test_client.post(f'/event_router/update_event_participants/{event_id}', json={
+        'add': [str(fid) for fid in friend_ids[:3]] + [stranger.id, 99999, 'abc'],
+        'remove': [friend_ids[3]],
+    })
+    data = response.get_json()
+    assert data['success']
+    assert data['results']['add'] == {
+        str(friend_ids[0]): 'already_participant',
+        str(friend_ids[1]): 'added',
+        str(friend_ids[2]): 'added',
+        str(stranger.id): 'not_friend',
+        '99999': 'not_found',
+        'abc': 'invalid_id',
+    }
+    assert data['results']['remove'] == {str(friend_ids[3]): 'not_participant'}
+    participant_ids = set(db.session.scalars(
+        sqla.select(User.id).join(User.participating_events).where(Event.id == event_id)).all())
+    assert participant_ids == set(friend_ids[:3])
+
+    def statements_for(payload):
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        sqla.event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            response = test_client.post(f'/event_router/update_event_participants/{event_id}', json=payload)
+        finally:
+            sqla.event.remove(db.engine, 'before_cursor_execute', listener)
+        assert response.get_json()['success']
+        return len(statements)
+
+    g.pop('_login_user', None)
+    small = statements_for({'add': friend_ids[3:4], 'remove': friend_ids[:1]})
+    g.pop('_login_user', None)
+    large = statements_for({'add': friend_ids[4:], 'remove': friend_ids[1:3]})
+    assert small == large
+
+
+def test_batch_task_operations(test_client, init_database):
+    """
+    GIVEN an event with existing tasks
+    WHEN a batch of create/edit/complete/delete operations is posted
+    THEN check that all of them apply in one transaction, or none when one is invalid
+    """
+    from src.database.models import find_counter_drift
+
+    do_login(test_client)
+    user = db.session.scalars(sqla.select(User).where(User.email == 'test@example.com')).first()
+    event = Event(name='Move house', date=datetime(2025, 7, 1), user_id=user.id)
+    db.session.add(event)
+    db.session.flush()
+    keep = Task(description='Pack books', priority=1, event_id=event.id)
+    drop = Task(description='Old task', priority=2, completed=True, event_id=event.id)
+    db.session.add_all([keep, drop])
+    db.session.commit()
+    event_id, keep_id, drop_id = event.id, keep.id, drop.id
+
+    invalid = test_client.post(f'/task_router/batch/{event_id}', json={'operations': [
+        {'op': 'create', 'description': 'Hire van'},
+        {'op': 'edit', 'task_id': keep_id, 'priority': 7},
+        {'op': 'delete', 'task_id': 99999},
+    ]})
+    assert invalid.status_code == 400
+    assert [r['status'] for r in invalid.get_json()['results']] == ['not_applied', 'error', 'error']
+    assert db.session.scalar(sqla.select(sqla.func.count(Task.id)).where(Task.event_id == event_id)) == 2
+
+    response = test_client.post(f'/task_router/batch/{event_id}', json={'operations': [
+        {'op': 'create', 'description': 'Hire van', 'priority': 3, 'due_date': '2025-06-20'},
+        {'op': 'create', 'description': 'Cancel internet', 'completed': True},
+        {'op': 'edit', 'task_id': keep_id, 'description': 'Pack all books', 'note': 'Two boxes'},
+        {'op': 'complete', 'task_id': keep_id},
+        {'op': 'delete', 'task_id': str(drop_id)},
+    ]})
+    data = response.get_json()
+    assert response.status_code == 200 and data['success']
+    assert all(r['status'] == 'applied' for r in data['results'])
+    created_id = data['results'][0]['task_id']
+
+    db.session.expire_all()
+    descriptions = set(db.session.scalars(sqla.select(Task.description).where(Task.event_id == event_id)))
+    assert descriptions == {'Pack all books', 'Hire van', 'Cancel internet'}
+    kept = db.session.get(Task, keep_id)
+    assert (kept.description, kept.note, kept.completed) == ('Pack all books', 'Two boxes', True)
+    assert db.session.get(Task, created_id).due_date == datetime(2025, 6, 20)
+    event = db.session.get(Event, event_id)
+    assert (event.task_count, event.completed_count) == (3, 2)
+    assert find_counter_drift() == []
+
+    assert test_client.post(f'/task_router/batch/{event_id}', json={'operations': []}).status_code == 400
+    assert test_client.post('/task_router/batch/99999', json={'operations': [{'op': 'delete', 'task_id': 1}]}).status_code == 404
+
+
+def test_bulk_assign_is_idempotent(test_client, init_database):
+    """
+    GIVEN an event with several tasks and a team of users
+    WHEN the team is assigned to all tasks twice and then partly unassigned
+    THEN check that repeats are ignored and each write is a single statement
+    """
+    do_login(test_client)
+    user = db.session.scalars(sqla.select(User).where(User.email == 'test@example.com')).first()
+    team = [new_user(uname=f'member{i}', uemail=f'member{i}@example.com', passwd='pass') for i in range(5)]
+    event = Event(name='Festival', date=datetime(2025, 8, 1), user_id=user.id)
+    db.session.add_all(team + [event])
+    db.session.flush()
+    tasks = [Task(description=f'Stall {i}', priority=2, event_id=event.id) for i in range(8)]
+    db.session.add_all(tasks)
+    db.session.commit()
+    task_ids = [task.id for task in tasks]
+    team_ids = [member.id for member in team]
+
+    def assignment_count():
+        return db.session.scalar(sqla.select(sqla.func.count()).select_from(task_assignments))
+
+    # A single-task assignment first, so the bulk call has to skip an existing row
+    assert test_client.post(f'/task_router/assign_users_to_task/{task_ids[0]}',
+                            json={'user_ids': team_ids[:2]}).get_json()['success']
+    assert test_client.post(f'/task_router/assign_users_to_task/{task_ids[0]}',
+                            json={'user_ids': team_ids[:2]}).get_json()['success']
+    assert assignment_count() == 2
+
+    inserts = []
+    listener = lambda *args: inserts.append(args[2]) if args[2].startswith('INSERT') else None
+    sqla.event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        response = test_client.post('/task_router/bulk_assign',
+                                    json={'task_ids': task_ids + [99999], 'user_ids': team_ids})
+    finally:
+        sqla.event.remove(db.engine, 'before_cursor_execute', listener)
+    data = response.get_json()
+    assert data['success'] and data['changed'] == 38 and data['missing_task_ids'] == [99999]
+    assert len(inserts) == 1
+    assert assignment_count() == 40
+
+    again = test_client.post('/task_router/bulk_assign', json={'task_ids': task_ids, 'user_ids': team_ids})
+    assert again.get_json()['changed'] == 0
+
+    removed = test_client.post('/task_router/bulk_unassign', json={'task_ids': task_ids[:4], 'user_ids': team_ids[:1]})
+    assert removed.get_json()['changed'] == 4
+    assert assignment_count() == 36
+
+
+def test_delete_event_cascades_and_cleans_up_images(test_client, init_database):
+    """
+    GIVEN an event with participants, assigned tasks and uploaded task images
+    WHEN the event is deleted
+    THEN check that the database cascades the rows and the images are removed in the background
+    """
+    from src.database.models import event_participants
+    from src.uploads import cleanup_worker
+
+    do_login(test_client)
+    user = db.session.scalars(sqla.select(User).where(User.email == 'test@example.com')).first()
+    helper = new_user(uname='mover', uemail='mover@example.com', passwd='moverpass')
+    event = Event(name='Clear out', date=datetime(2025, 10, 1), user_id=user.id)
+    event.participants.append(helper)
+    db.session.add_all([helper, event])
+    db.session.flush()
+
+    image_links = [f'task_images/test_delete_event_{i}.jpg' for i in range(3)]
+    image_paths = [os.path.join(test_client.application.static_folder, link) for link in image_links]
+    for path in image_paths:
+        with open(path, 'wb') as f:
+            f.write(b'\xff\xd8 test image')
+    tasks = [Task(description=f'Box {i}', priority=1, event_id=event.id, image_link=link)
+             for i, link in enumerate(image_links)]
+    tasks.append(Task(description='No photo', priority=1, event_id=event.id))
+    for task in tasks:
+        task.assigned_users.append(helper)
+    db.session.add_all(tasks)
+    db.session.commit()
+    event_id = event.id
+
+    try:
+        response = test_client.post(f'/event_router/delete_event/{event_id}')
+        assert response.status_code == 302
+        cleanup_worker.join()
+        assert not any(os.path.exists(path) for path in image_paths)
+    finally:
+        for path in image_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    assert db.session.get(Event, event_id) is None
+    assert db.session.scalar(sqla.select(sqla.func.count(Task.id)).where(Task.event_id == event_id)) == 0
+    assert db.session.scalar(sqla.select(sqla.func.count()).select_from(task_assignments)) == 0
+    assert db.session.scalar(sqla.select(sqla.func.count()).select_from(event_participants)
+                             .where(event_participants.c.event_id == event_id)) == 0
+
+
+def test_complete_task_with_image_upload_limits(test_client, init_database):
+    """
+    GIVEN a task that needs a photo of an item
+    WHEN oversized, invalid and previously verified photos are uploaded
+    THEN check the limit is enforced and a cached verification completes the task without any model call
+    """
+    from io import BytesIO
+    from PIL import Image
+    from src.database.verification_cache import image_digest, store_caption, store_verdict
+
+    do_login(test_client)
+    user = db.session.scalars(sqla.select(User).where(User.email == 'test@example.com')).first()
+    event = Event(name='Picnic', date=datetime(2025, 10, 1), user_id=user.id)
+    db.session.add(event)
+    db.session.flush()
+    task = Task(description='Bring a mug', priority=1, event_id=event.id, item='Mug')
+    db.session.add(task)
+    db.session.commit()
+    url = f'/task_router/complete_task_with_image/{task.id}'
+
+    photo = BytesIO()
+    Image.new('RGB', (64, 48), (180, 40, 40)).save(photo, 'JPEG')
+    photo = photo.getvalue()
+
+    config = test_client.application.config
+    limit = config['MAX_IMAGE_UPLOAD_BYTES']
+    config['MAX_IMAGE_UPLOAD_BYTES'] = 1024
+    try:
+        response = test_client.post(url, data={'file': (BytesIO(b'\xff' * 4096), 'big.jpg')})
+        assert response.status_code == 413
+    finally:
+        config['MAX_IMAGE_UPLOAD_BYTES'] = limit
+
+    response = test_client.post(url, data={'file': (BytesIO(b'not an image'), 'mug.jpg')})
+    assert response.status_code == 400
+    assert 'not a valid image' in response.get_json()['error']
+
+    store_caption(image_digest(photo), 'a red mug on a table')
+    store_verdict('mug', 'a red mug on a table', True)
+    db.session.commit()
+    saved = os.path.join(test_client.application.static_folder, 'task_images', 'test_verify_mug.jpg')
+    try:
+        response = test_client.post(url, data={'file': (BytesIO(photo), 'test_verify_mug.jpg')})
+        assert response.status_code == 200
+        assert response.get_json()['caption'] == 'a red mug on a table'
+        with open(saved, 'rb') as f:
+            assert f.read() == photo
+    finally:
+        if os.path.exists(saved):
+            os.remove(saved)
+    assert db.session.get(Task, task.id).completed
+
+
+def test_verification_jobs(test_client, init_database, tmp_path):
+    """
+    GIVEN a task that needs a photo of an item
+    WHEN photos are submitted as verification jobs and a worker runs them
+    THEN check the job id comes back at once, the result is visible by polling and over SSE,
+         and the task is updated only when the job finishes
+    """
+    import json
+    from io import BytesIO
+    from PIL import Image
+    from src.database.models import VerificationJob
+    from src.database.verification_cache import image_digest, store_caption, store_verdict
+    from src.verification_jobs import claim_job, requeue_stale_jobs, run_job
+
+    config = test_client.application.config
+    config['VERIFY_JOB_DIR'] = str(tmp_path)
+    do_login(test_client)
+    user = db.session.scalars(sqla.select(User).where(User.email == 'test@example.com')).first()
+    event = Event(name='Picnic', date=datetime(2025, 10, 1), user_id=user.id)
+    db.session.add(event)
+    db.session.flush()
+    task = Task(description='Bring a mug', priority=1, event_id=event.id, item='Mug')
+    db.session.add(task)
+    db.session.commit()
+    task_id = task.id
+
+    photo = BytesIO()
+    Image.new('RGB', (64, 48), (40, 40, 180)).save(photo, 'JPEG')
+    photo = photo.getvalue()
+    store_caption(image_digest(photo), 'a blue mug on a desk')
+    store_verdict('mug', 'a blue mug on a desk', True)
+    db.session.commit()
+    saved = os.path.join(test_client.application.static_folder, 'task_images', 'test_job_mug.jpg')
+
+    try:
+        response = test_client.post(f'/task_router/verify_jobs/{task_id}',
+                                    data={'file': (BytesIO(photo), 'test_job_mug.jpg')})
+        assert response.status_code == 202
+        data = response.get_json()
+        assert data['status'] == 'queued'
+        job_id = data['job_id']
+        assert os.path.exists(os.path.join(tmp_path, job_id))
+        assert not db.session.get(Task, task_id).completed
+
+        # A second claim of the same job loses
+        assert claim_job(job_id) == job_id
+        assert claim_job(job_id) is None
+        run_job(job_id)
+
+        status = test_client.get(data['status_url']).get_json()
+        assert status['status'] == 'done'
+        assert status['related'] is True
+        assert status['caption'] == 'a blue mug on a desk'
+
+        # Server-Sent Events are opt-in; the checklist polls the status URL by default
+        assert 'events_url' not in data
+        events_url = f'{data["status_url"]}/events'
+        assert test_client.get(events_url).status_code == 404
+        config['VERIFY_JOB_EVENTS'] = True
+        response = test_client.get(events_url)
+        assert response.mimetype == 'text/event-stream'
+        events = [block for block in response.get_data(as_text=True).split('\n\n') if block]
+        response.close()
+        assert len(events) == 1
+        assert json.loads(events[0].split('data: ', 1)[1])['status'] == 'done'
+        config['VERIFY_JOB_MAX_STREAMS'] = 0
+        assert test_client.get(events_url).status_code == 503
+
+        task = db.session.get(Task, task_id)
+        assert task.completed
+        assert task.image_link == 'task_images/test_job_mug.jpg'
+        assert os.path.exists(saved)
+        assert not os.path.exists(os.path.join(tmp_path, job_id))
+    finally:
+        config['VERIFY_JOB_EVENTS'] = False
+        config['VERIFY_JOB_MAX_STREAMS'] = TestConfig.VERIFY_JOB_MAX_STREAMS
+        if os.path.exists(saved):
+            os.remove(saved)
+
+    # A bad upload fails the job; a job left running by a dead process is picked up again
+    response = test_client.post(f'/task_router/verify_jobs/{task_id}',
+                                data={'file': (BytesIO(b'not an image'), 'mug.jpg')})
+    bad_id = response.get_json()['job_id']
+    db.session.execute(sqla.update(VerificationJob).where(VerificationJob.id == bad_id)
+                       .values(status='running', updated_at=datetime.utcnow() - timedelta(hours=1)))
+    db.session.commit()
+    assert requeue_stale_jobs(300) == 1
+    assert claim_job() == bad_id
+    run_job(bad_id)
+    status = test_client.get(f'/task_router/verify_jobs/{bad_id}').get_json()
+    assert status['status'] == 'failed'
+    assert 'not a valid image' in status['message']
+    assert test_client.get('/task_router/verify_jobs/unknown').status_code == 404
+
+
+def test_verification_workers_only_start_for_requests():
+    """
+    GIVEN an app configured to run verification workers in its web processes
+    WHEN it is created, as every CLI command does
+    THEN check no worker starts until the first request, and 'flask verify work' exists
+    """
+    from src.verification_jobs import job_runner
+
+    class WorkerConfig(TestConfig):
+        TESTING = False
+        VERIFY_JOB_WORKERS = 2
+
+    app = create_app(config_class=WorkerConfig)
+    assert not job_runner.running
+    assert 'work' in app.cli.commands['verify'].commands
+
+
+def test_chat_with_stub_llm(test_client, init_database):
+    """
+    GIVEN the app's LLM swapped for the fixture-driven stub backend
+    WHEN a guest and a logged-in user ask the chatbot for a checklist
+    THEN check the guest gets the stub's text and the user's tasks are saved from its JSON
+    """
+    from src.llm import LLMClient, StubBackend
+
+    app = test_client.application
+    live = app.extensions['llm']
+    app.extensions['llm'] = LLMClient(StubBackend.from_file(app.config['LLM_STUB_FIXTURES'], sleep=lambda s: None))
+    try:
+        test_client.get('/user/logout')
+        response = test_client.post('/chatbot_router/chat', json={'message': 'a beach trip'})
+        assert response.status_code == 200
+        assert 'Pack sunscreen' in response.get_json()['response']
+        # The same request, typed differently, is answered from the prompt cache
+        response = test_client.post('/chatbot_router/chat', json={'message': 'A  Beach trip '})
+        assert 'Pack sunscreen' in response.get_json()['response']
+        assert app.extensions['llm'].calls == 1
+
+        do_login(test_client)
+        user = db.session.scalars(sqla.select(User).where(User.email == 'test@example.com')).first()
+        event = Event(name='Beach trip', date=datetime(2025, 10, 1), user_id=user.id)
+        db.session.add(event)
+        db.session.commit()
+        response = test_client.post('/chatbot_router/chat', json={'message': 'a beach trip', 'event_id': event.id})
+        assert response.status_code == 200
+        assert db.session.scalar(sqla.select(sqla.func.count(Task.id)).where(Task.event_id == event.id)) == 8
+
+        # Prose around the JSON is skipped rather than failing the request
+        app.extensions['llm'] = LLMClient(StubBackend({"default": {"response": (
+            'Here are [2] tasks:\n```json\n[{{"task": "Rent a car", "priority": "high"}},'
+            ' {{"task": "Buy water", "item": "none"}}]\n```\nHave fun!')}}, sleep=lambda s: None))
+        response = test_client.post('/chatbot_router/chat', json={'message': 'a desert trip', 'event_id': event.id})
+        assert response.status_code == 200
+        db.session.refresh(event)
+        assert event.task_count == 10
+        rent = db.session.scalars(sqla.select(Task).where(Task.description == 'Rent a car')).one()
+        assert (rent.priority, rent.item) == (1, None)
+    finally:
+        app.extensions['llm'] = live
+
+
+def test_streamed_checklist(test_client, init_database):
+    """
+    GIVEN the app's LLM swapped for the fixture-driven stub backend
+    WHEN a logged-in user asks for a checklist as Server-Sent Events
+    THEN check each task is saved and sent as its own event before the final 'done' event
+    """
+    import json
+    from src.llm import LLMClient, StubBackend
+
+    app = test_client.application
+    live = app.extensions['llm']
+    app.extensions['llm'] = LLMClient(StubBackend.from_file(app.config['LLM_STUB_FIXTURES'], sleep=lambda s: None))
+    try:
+        do_login(test_client)
+        user = db.session.scalars(sqla.select(User).where(User.email == 'test@example.com')).first()
+        event = Event(name='Road trip', date=datetime(2025, 10, 1), user_id=user.id)
+        db.session.add(event)
+        db.session.commit()
+        response = test_client.post('/chatbot_router/create_event_and_tasks',
+                                    json={'userInput': 'safety', 'event_id': event.id, 'question_index': 2,
+                                          'conversation_history': ['User: a road trip', 'Bot: Who is coming?']},
+                                    headers={'Accept': 'text/event-stream'})
+        assert response.mimetype == 'text/event-stream'
+        events = [(block.split('\n')[0][len('event: '):], json.loads(block.split('\n')[1][len('data: '):]))
+                  for block in response.get_data(as_text=True).strip().split('\n\n')]
+        assert [name for name, _ in events] == ['task'] * 8 + ['done']
+        assert events[2][1]['item'] == 'snacks'
+        assert db.session.get(Task, events[2][1]['id']).description == 'Buy snacks'
+        assert events[-1][1] == {'eventId': event.id, 'message': 'Tasks created successfully!'}
+    finally:
+        app.extensions['llm'] = live
+
+
+def test_streamed_checklist_failure_saves_nothing(test_client, init_database):
+    """
+    GIVEN a model whose streamed checklist breaks off after some tasks were saved
+    WHEN a logged-in user asks for the checklist and then retries
+    THEN check the partial checklist is removed again, so the retry does not duplicate it
+    """
+    from src.llm import LLMClient, StubBackend
+
+    class BrokenStream:
+        def stream(self, prompt, timeout):
+            yield '[{"task": "Pack tent", "priority": 1, "item": "tent"},'
+            yield ' {"task": "Buy food", "priority": 2, "item": "none"}, {"ta'
+            raise ConnectionError("stream reset")
+
+    def ask(event_id):
+        response = test_client.post('/chatbot_router/create_event_and_tasks',
+                                    json={'userInput': 'comfort', 'event_id': event_id, 'question_index': 2,
+                                          'conversation_history': ['User: camping', 'Bot: Who is coming?']},
+                                    headers={'Accept': 'text/event-stream'})
+        return [block.split('\n')[0][len('event: '):] for block in response.get_data(as_text=True).strip().split('\n\n')]
+
+    app = test_client.application
+    live = app.extensions['llm']
+    app.extensions['llm'] = LLMClient(BrokenStream(), max_retries=0)
+    try:
+        do_login(test_client)
+        user = db.session.scalars(sqla.select(User).where(User.email == 'test@example.com')).first()
+        event = Event(name='Camping', date=datetime(2025, 10, 1), user_id=user.id)
+        db.session.add(event)
+        db.session.commit()
+        event_id = event.id
+
+        assert ask(event_id) == ['task', 'task', 'error']
+        assert db.session.scalar(sqla.select(sqla.func.count(Task.id)).where(Task.event_id == event_id)) == 0
+        assert db.session.get(Event, event_id).task_count == 0
+
+        app.extensions['llm'] = LLMClient(StubBackend.from_file(app.config['LLM_STUB_FIXTURES'], sleep=lambda s: None))
+        assert ask(event_id) == ['task'] * 8 + ['done']
+        assert db.session.scalar(sqla.select(sqla.func.count(Task.id)).where(Task.event_id == event_id)) == 8
+        assert db.session.get(Event, event_id).task_count == 8
+    finally:
+        app.extensions['llm'] = live
+
+
+def test_conversation_kept_server_side(test_client, init_database):
+    """
+    GIVEN the app's LLM swapped for the fixture-driven stub backend
+    WHEN a user answers the clarifying questions sending only the conversation id
+    THEN check the prompts carry every earlier answer and the conversation is removed once the tasks are saved
+    """
+    from src.database.models import Conversation
+    from src.llm import LLMClient, StubBackend
+
+    prompts = []
+
+    class RecordingStub(StubBackend):
+        def generate(self, prompt, timeout):
+            prompts.append(prompt)
+            return super().generate(prompt, timeout)
+
+    app = test_client.application
+    live = app.extensions['llm']
+    app.extensions['llm'] = LLMClient(RecordingStub.from_file(app.config['LLM_STUB_FIXTURES'], sleep=lambda s: None))
+    try:
+        do_login(test_client)
+        user = db.session.scalars(sqla.select(User).where(User.email == 'test@example.com')).first()
+        event = Event(name='Ski weekend', date=datetime(2025, 12, 1), user_id=user.id)
+        db.session.add(event)
+        db.session.commit()
+        url = '/chatbot_router/create_event_and_tasks'
+
+        response = test_client.post(url, json={'userInput': 'a ski weekend in the Alps', 'event_id': event.id})
+        data = response.get_json()
+        assert data['question_index'] == 1
+        conversation_id = data['conversation_id']
+
+        data = test_client.post(url, json={'userInput': 'six friends, two beginners', 'event_id': event.id,
+                                           'conversation_id': conversation_id}).get_json()
+        assert data['question_index'] == 2 and data['conversation_id'] == conversation_id
+        assert 'User: six friends, two beginners' in prompts[-1]
+
+        response = test_client.post(url, json={'userInput': 'safety', 'event_id': event.id,
+                                               'conversation_id': conversation_id})
+        assert response.get_json()['message'] == 'Tasks created successfully!'
+        assert 'User: a ski weekend in the Alps' in prompts[-1] and 'User: safety' in prompts[-1]
+        assert db.session.get(Conversation, conversation_id) is None
+
+        response = test_client.post(url, json={'userInput': 'again', 'event_id': event.id,
+                                               'conversation_id': conversation_id})
+        assert response.status_code == 404
+    finally:
+        app.extensions['llm'] = live
+
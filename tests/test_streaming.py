@@ -0,0 +1,41 @@
+import json
+import unittest
+from src.streaming import JSONArrayParser, extract_json_array, iter_json_array
+
+
+class TestJSONArrayParser(unittest.TestCase):
+    def test_elements_arrive_as_they_complete(self):
+        """Test each object is returned by the feed() that completes it, however the text is split"""
+        parser = JSONArrayParser()
+        self.assertEqual(parser.feed('```json\n[{"task": "Book a'), [])
+        self.assertEqual(parser.feed(' hotel, [cheap]", "priority": 1}'), [{"task": "Book a hotel, [cheap]", "priority": 1}])
+        self.assertEqual(parser.feed(', {"task": "Say \\"hi\\"", "tags": ["a", {"b": 2}]}, 3'), [{"task": 'Say "hi"', "tags": ["a", {"b": 2}]}])
+        self.assertEqual(parser.feed(']\n```'), [3])
+        self.assertTrue(parser.finished)
+        parser.close()
+
+    def test_character_at_a_time(self):
+        """Test splitting the text into single characters gives the same elements as json.loads"""
+        text = json.dumps([{"task": "Pack {sunscreen}", "priority": 2, "item": "sunscreen"}, {"task": "\\\\", "priority": 3}])
+        self.assertEqual(list(iter_json_array(text)), json.loads(text))
+
+    def test_malformed_output(self):
+        """Test a truncated array, a bad element or prose without an array raise JSONDecodeError"""
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_array(['[{"task": "Book hotel"}, {"task": ']))
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_array(['[{"task": Book hotel}]']))
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_array(['Sorry, I cannot help with that.']))
+
+
+    def test_array_wrapped_in_prose(self):
+        """Test of_objects skips bracketed prose and finds the checklist wherever the model put it"""
+        text = 'Sure! Here are [8] tasks for your trip:\n```json\n[{"task": "Book hotel", "priority": 1}]\n```\nEnjoy [the trip]!'
+        self.assertEqual(extract_json_array(text), [{"task": "Book hotel", "priority": 1}])
+        self.assertEqual(extract_json_array('No tasks needed: []'), [])
+        # Without of_objects the first bracket in the prose is taken for the array
+        self.assertEqual(list(iter_json_array([text])), [8])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=1)